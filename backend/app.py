@@ -1,43 +1,191 @@
 import os
-from flask import Flask, request, jsonify
+import json
+import base64
+import csv
+import io
+import uuid
+import weakref
+import logging
+from flask import Flask, Blueprint, current_app, request, jsonify, abort, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
-import jwt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from functools import wraps
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 import click 
 from dotenv import load_dotenv # Import the dotenv package
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from notifications import create_transport
+from emergency import SlidingWindowEvaluator
+from logging_setup import configure_logging
 
 load_dotenv() # Load environment variables from .env file
 
-# --- App Initialization ---
-app = Flask(__name__)
-CORS(app)
+basedir = os.path.abspath(os.path.dirname(__file__))
+logger = logging.getLogger('driveguard')
 
 # --- Configuration ---
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_default_secret_key_here')
-basedir = os.path.abspath(os.path.dirname(__file__))
+def env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def default_pool_size():
+    """Connections one worker process needs for the gunicorn worker model it runs under"""
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+    if worker_class == 'gevent':
+        return 10  # Greenlets far outnumber useful connections; the rest queue for DB_POOL_TIMEOUT
+    threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+    return threads + 2  # Request threads plus the reward and notification workers
+
+def engine_options(database_uri):
+    """Pool settings from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING)"""
+    options = {
+        # Recycling below the server's idle timeout avoids stale connections without
+        # the extra round trip pool_pre_ping costs on every checkout
+        "pool_recycle": int(os.environ.get('DB_POOL_RECYCLE', 300)),
+        "pool_pre_ping": env_flag('DB_POOL_PRE_PING', False),
+    }
+    if database_uri.startswith('sqlite') and (':memory:' in database_uri or database_uri in ('sqlite://', 'sqlite:///')):
+        return options  # Single shared connection; pool sizing does not apply
+
+    pool_size = int(os.environ.get('DB_POOL_SIZE', 0)) or default_pool_size()
+    options.update({
+        "pool_size": pool_size,
+        "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', pool_size)),
+        "pool_timeout": float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    })
+    if database_uri.startswith('sqlite'):
+        # The busy timeout is also set per connection in configure_sqlite()
+        options["connect_args"] = {"timeout": int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000}
+    return options
+
+def load_config(app):
+    """Read settings from the environment into app.config"""
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_default_secret_key_here')
+
+    # --- Dynamic Database Configuration ---
+    # This will now automatically read from your .env file
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///' + os.path.join(basedir, 'instance', 'driveguard.db')
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    # Local SQLite fallback: WAL lets readers run alongside a writer; writers wait this long for the lock
+    app.config['SQLITE_WAL'] = env_flag('SQLITE_WAL', True)
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # How stale the leaderboard ranking snapshot may get before it is rebuilt
+    app.config['LEADERBOARD_REFRESH_SECONDS'] = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 60))
+    # Reward evaluation after a trip write: 'thread' (background pool in this process),
+    # 'queue' (left for `flask process-reward-jobs`) or 'inline' (before responding)
+    app.config['REWARD_PROCESSING'] = os.environ.get('REWARD_PROCESSING', 'thread')
+    app.config['REWARD_WORKER_THREADS'] = int(os.environ.get('REWARD_WORKER_THREADS', 2))
+    # 'thread' mode: how often each process re-dispatches retried and orphaned jobs (0 disables)
+    app.config['REWARD_SWEEP_SECONDS'] = float(os.environ.get('REWARD_SWEEP_SECONDS', 60))
+    # Emergency e-mail delivery: concurrent senders, attempts per contact and retry backoff
+    app.config['NOTIFY_WORKER_THREADS'] = int(os.environ.get('NOTIFY_WORKER_THREADS', 4))
+    app.config['NOTIFY_MAX_ATTEMPTS'] = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 3))
+    app.config['NOTIFY_RETRY_BASE_SECONDS'] = float(os.environ.get('NOTIFY_RETRY_BASE_SECONDS', 2))
+    # Emergency trigger: weighted alerts within the last N minutes (0 = whole trip) reaching the threshold
+    app.config['EMERGENCY_ALERT_THRESHOLD'] = float(os.environ.get('EMERGENCY_ALERT_THRESHOLD', 6))
+    app.config['EMERGENCY_WINDOW_MINUTES'] = float(os.environ.get('EMERGENCY_WINDOW_MINUTES', 10))
+    app.config['EMERGENCY_YAWN_WEIGHT'] = float(os.environ.get('EMERGENCY_YAWN_WEIGHT', 1))
+    app.config['EMERGENCY_DROWSY_WEIGHT'] = float(os.environ.get('EMERGENCY_DROWSY_WEIGHT', 1))
+    # Verified tokens are remembered per process for this long (0 disables the cache)
+    app.config['AUTH_CACHE_TTL_SECONDS'] = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', 30))
+    app.config['AUTH_CACHE_SIZE'] = int(os.environ.get('AUTH_CACHE_SIZE', 4096))
+    # Per-request query counts, DB time and slow request logging (see instrumentation.py)
+    app.config['INSTRUMENTATION_ENABLED'] = env_flag('INSTRUMENTATION_ENABLED', False)
+    app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 500))
+    # Lets a Prometheus scraper read /api/admin/metrics with `Authorization: Bearer <token>`
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Structured logs (see logging_setup.py): 'json' or 'text' lines, and the share of
+    # per-alert info records kept under load (1 keeps all)
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'json')
+    app.config['LOG_SAMPLE_RATE'] = float(os.environ.get('LOG_SAMPLE_RATE', 1))
+    # Largest landmark recording /api/admin/drowsiness/score accepts
+    app.config['LANDMARK_UPLOAD_MAX_MB'] = float(os.environ.get('LANDMARK_UPLOAD_MAX_MB', 64))
 
-# --- Dynamic Database Configuration ---
-# This will now automatically read from your .env file
-database_url = os.environ.get('DATABASE_URL')
-if database_url:
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///' + os.path.join(basedir, 'instance', 'driveguard.db')
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    "pool_pre_ping": True,
-    "pool_recycle": 300
-}
 # --- Database Setup ---
-db = SQLAlchemy(app)
+db = SQLAlchemy()
+# Every route and CLI command lives on this blueprint; create_app() registers it
+api = Blueprint('api', __name__, cli_group=None)
 
-if not os.path.exists(os.path.join(basedir, 'instance')):
-    os.makedirs(os.path.join(basedir, 'instance'))
+# --- App Initialization ---
+_apps = weakref.WeakSet()  # Apps created in this process, for the fork hook
+_default_app = None
+_default_app_lock = threading.Lock()
+
+def create_app(config=None):
+    """Build a configured app. `config` overrides the environment settings,
+    e.g. SQLALCHEMY_DATABASE_URI or SQLALCHEMY_ENGINE_OPTIONS for the engine"""
+    from flask_cors import CORS
+
+    app = Flask(__name__)
+    load_config(app)
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'])
+    CORS(app)
+    configure_logging(app)
+
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///' + os.path.join(basedir, 'instance')):
+        os.makedirs(os.path.join(basedir, 'instance'), exist_ok=True)
+
+    db.init_app(app)
+    app.register_blueprint(api)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                configure_sqlite(engine, app.config['SQLITE_WAL'], app.config['SQLITE_BUSY_TIMEOUT_MS'])
+        if app.config['INSTRUMENTATION_ENABLED']:
+            import instrumentation
+            instrumentation.init_app(app, db.engines.values())
+    _apps.add(app)
+    return app
+
+def configure_sqlite(engine, wal, busy_timeout_ms):
+    """Apply the WAL journal and busy timeout to every new SQLite connection"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+        if wal and engine.url.database not in (None, '', ':memory:'):
+            cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.execute('PRAGMA synchronous = NORMAL')  # Safe with WAL, far fewer fsyncs
+        cursor.close()
+
+def _dispose_engines_after_fork():
+    """Forked workers (gunicorn --preload) must not reuse the parent's pooled connections"""
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+def __getattr__(name):
+    """`app` is built on first access, so `gunicorn app:app` and `from app import app`
+    keep working while importing the module alone stays cheap"""
+    global _default_app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_app_lock:
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
 
 # --- Database Models ---
 class User(db.Model):
@@ -54,8 +202,18 @@ class User(db.Model):
     user_challenges = db.relationship('UserChallenge', backref='user', lazy=True, cascade="all, delete-orphan")
     redemptions = db.relationship('Redemption', backref='user', lazy=True, cascade="all, delete-orphan")
     streak = db.relationship('UserStreak', backref='user', uselist=False, cascade="all, delete-orphan")
+    trip_stats = db.relationship('UserTripStats', backref='user', uselist=False, cascade="all, delete-orphan")
+    leaderboard_entry = db.relationship('LeaderboardEntry', backref='user', uselist=False, cascade="all, delete-orphan")
+    reward_jobs = db.relationship('RewardJob', backref='user', lazy=True, cascade="all, delete-orphan")
+    notification_deliveries = db.relationship('NotificationDelivery', backref='user', lazy=True, cascade="all, delete-orphan")
+    daily_stats = db.relationship('UserDailyStats', backref='user', lazy=True, cascade="all, delete-orphan")
+    trip_uploads = db.relationship('TripUpload', backref='user', lazy=True, cascade="all, delete-orphan")
 
 class Trip(db.Model):
+    __table_args__ = (
+        db.Index('ix_trip_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_trip_timestamp', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     start_location = db.Column(db.String(200), nullable=False)
@@ -64,6 +222,38 @@ class Trip(db.Model):
     yawn_count = db.Column(db.Integer, default=0)
     alert_count = db.Column(db.Integer, default=0)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    alert_events = db.relationship('AlertEvent', backref='trip', lazy=True, cascade="all, delete-orphan")
+    upload = db.relationship('TripUpload', backref='trip', uselist=False, cascade="all, delete-orphan")
+
+class AlertEvent(db.Model):
+    """A single drowsiness/yawn alert reported by the client during a trip"""
+    __table_args__ = (
+        # Client retries of the same event are ignored
+        db.UniqueConstraint('trip_id', 'idempotency_key', name='uq_alert_event_trip_key'),
+        # Windowed counts and timelines per trip, and per-user history
+        db.Index('ix_alert_event_trip_occurred', 'trip_id', 'occurred_at'),
+        db.Index('ix_alert_event_user_occurred', 'user_id', 'occurred_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    trip_id = db.Column(db.Integer, db.ForeignKey('trip.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    alert_type = db.Column(db.String(20), nullable=False, default='drowsy')  # 'yawn' or 'drowsy'
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Client timestamp
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    idempotency_key = db.Column(db.String(64), nullable=True)
+
+class TripUpload(db.Model):
+    """Client-generated id of a trip uploaded through /api/trips/sync, so retries merge into one trip"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'client_id', name='uq_trip_upload_user_client'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    trip_id = db.Column(db.Integer, db.ForeignKey('trip.id'), nullable=False, unique=True)
+    client_id = db.Column(db.String(36), nullable=False)  # Canonical UUID string
+    points_awarded = db.Column(db.Integer, nullable=False, default=0)  # So a merge only adds the difference
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Achievement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -74,6 +264,9 @@ class Achievement(db.Model):
     criteria_value = db.Column(db.Integer, nullable=False)  # Threshold value
 
 class UserAchievement(db.Model):
+    __table_args__ = (
+        db.Index('uq_user_achievement_user_achievement', 'user_id', 'achievement_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     achievement_id = db.Column(db.Integer, db.ForeignKey('achievement.id'), nullable=False)
@@ -81,6 +274,9 @@ class UserAchievement(db.Model):
     achievement = db.relationship('Achievement', backref='user_achievements')
 
 class EmergencyContact(db.Model):
+    __table_args__ = (
+        db.Index('ix_emergency_contact_user', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -101,6 +297,9 @@ class Badge(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class UserBadge(db.Model):
+    __table_args__ = (
+        db.Index('uq_user_badge_user_badge', 'user_id', 'badge_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     badge_id = db.Column(db.Integer, db.ForeignKey('badge.id'), nullable=False)
@@ -108,6 +307,9 @@ class UserBadge(db.Model):
     badge = db.relationship('Badge', backref='user_badges')
 
 class Challenge(db.Model):
+    __table_args__ = (
+        db.Index('ix_challenge_active_dates', 'is_active', 'start_date', 'end_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(200), nullable=False)
@@ -121,6 +323,9 @@ class Challenge(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class UserChallenge(db.Model):
+    __table_args__ = (
+        db.Index('uq_user_challenge_user_challenge', 'user_id', 'challenge_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     challenge_id = db.Column(db.Integer, db.ForeignKey('challenge.id'), nullable=False)
@@ -141,6 +346,9 @@ class StoreItem(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Redemption(db.Model):
+    __table_args__ = (
+        db.Index('ix_redemption_user_redeemed', 'user_id', 'redeemed_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     store_item_id = db.Column(db.Integer, db.ForeignKey('store_item.id'), nullable=False)
@@ -157,30 +365,257 @@ class UserStreak(db.Model):
     last_trip_date = db.Column(db.Date, nullable=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class UserTripStats(db.Model):
+    """Per-user trip rollup, kept in step with every trip write so reads are O(1)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    trip_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Integer, nullable=False, default=0)
+    total_alerts = db.Column(db.Integer, nullable=False, default=0)
+    total_yawns = db.Column(db.Integer, nullable=False, default=0)
+    scored_trip_count = db.Column(db.Integer, nullable=False, default=0)  # Trips with duration > 0
+    safety_score_sum = db.Column(db.Integer, nullable=False, default=0)  # Sum of scores of scored trips
+    zero_alert_trips = db.Column(db.Integer, nullable=False, default=0)
+    high_safety_trips = db.Column(db.Integer, nullable=False, default=0)  # Safety score >= 95
+    last_trip_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserDailyStats(db.Model):
+    """Per-user trip totals for one UTC day, kept in step with every trip write"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_user_daily_stats_user_day'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    trip_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Integer, nullable=False, default=0)
+    total_alerts = db.Column(db.Integer, nullable=False, default=0)
+    total_yawns = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyStats(db.Model):
+    """System-wide trip totals for one UTC day (admin dashboard)"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, unique=True)
+    trip_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Integer, nullable=False, default=0)
+    total_alerts = db.Column(db.Integer, nullable=False, default=0)
+    total_yawns = db.Column(db.Integer, nullable=False, default=0)
+
+class LeaderboardEntry(db.Model):
+    """Materialized ranking snapshot, rebuilt by refresh_leaderboard()"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    email = db.Column(db.String(120), nullable=False)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    avg_safety_score = db.Column(db.Float, nullable=False, default=0)
+    total_trips = db.Column(db.Integer, nullable=False, default=0)
+    points_rank = db.Column(db.Integer, nullable=False, index=True)  # 1-based position by points
+    safety_rank = db.Column(db.Integer, nullable=False, index=True)  # 1-based position by avg safety score
+    refreshed_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RewardJob(db.Model):
+    """Queued reward evaluation for a trip write, processed off the request thread"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    trip_id = db.Column(db.Integer, nullable=True)  # Informational only, the trip may be deleted later
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # 'pending', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.Text, nullable=True)  # JSON: new_achievements, new_badges, completed_challenges
+    error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class NotificationDelivery(db.Model):
+    """One emergency e-mail to one contact for one trip, with its delivery status"""
+    __table_args__ = (
+        # At most one notification per contact per trip
+        db.UniqueConstraint('trip_id', 'contact_id', 'channel', name='uq_notification_trip_contact_channel'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    trip_id = db.Column(db.Integer, nullable=False)  # Kept after the trip or contact is deleted
+    contact_id = db.Column(db.Integer, nullable=False)
+    channel = db.Column(db.String(20), nullable=False, default='email')
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)  # Refreshed by the sender on every attempt
+    sent_at = db.Column(db.DateTime, nullable=True)
+
 # --- Database Initialization Command ---
-@app.cli.command("init-db")
+def seed_default_achievements():
+    """Create the default achievements if there are none yet. Returns True when created"""
+    if Achievement.query.count() > 0:
+        return False
+    achievements = [
+        Achievement(name="Road Warrior", description="Complete your first trip", icon="🛣️", criteria_type="first_trip", criteria_value=1),
+        Achievement(name="Guardian Angel", description="Complete 5 trips with 0 alerts", icon="👼", criteria_type="zero_alerts", criteria_value=5),
+        Achievement(name="Long Hauler", description="Drive for 2+ hours in one trip", icon="🚛", criteria_type="long_trip", criteria_value=7200),
+        Achievement(name="Weekly Champion", description="Complete 7 trips in 7 days", icon="🏆", criteria_type="weekly_trips", criteria_value=7),
+        Achievement(name="Centurion", description="Reach 100 total trips", icon="💯", criteria_type="total_trips", criteria_value=100),
+        Achievement(name="Eagle Eye", description="Complete 10 consecutive trips with 0 alerts", icon="🦅", criteria_type="consecutive_zero_alerts", criteria_value=10),
+        Achievement(name="Perfect Score", description="Achieve 100 safety score 5 times", icon="⭐", criteria_type="perfect_scores", criteria_value=5),
+    ]
+    for achievement in achievements:
+        db.session.add(achievement)
+    db.session.commit()
+    return True
+
+@api.cli.command("init-db")
 def init_db_command():
     """Clear the existing data and create new tables."""
     db.create_all()
     
     # Initialize default achievements if they don't exist
-    if Achievement.query.count() == 0:
-        achievements = [
-            Achievement(name="Road Warrior", description="Complete your first trip", icon="🛣️", criteria_type="first_trip", criteria_value=1),
-            Achievement(name="Guardian Angel", description="Complete 5 trips with 0 alerts", icon="👼", criteria_type="zero_alerts", criteria_value=5),
-            Achievement(name="Long Hauler", description="Drive for 2+ hours in one trip", icon="🚛", criteria_type="long_trip", criteria_value=7200),
-            Achievement(name="Weekly Champion", description="Complete 7 trips in 7 days", icon="🏆", criteria_type="weekly_trips", criteria_value=7),
-            Achievement(name="Centurion", description="Reach 100 total trips", icon="💯", criteria_type="total_trips", criteria_value=100),
-            Achievement(name="Eagle Eye", description="Complete 10 consecutive trips with 0 alerts", icon="🦅", criteria_type="consecutive_zero_alerts", criteria_value=10),
-            Achievement(name="Perfect Score", description="Achieve 100 safety score 5 times", icon="⭐", criteria_type="perfect_scores", criteria_value=5),
-        ]
-        for achievement in achievements:
-            db.session.add(achievement)
-        db.session.commit()
+    if seed_default_achievements():
         click.echo("Default achievements created.")
     
     click.echo("Database initialized.")
 
+@api.cli.command("rebuild-trip-stats")
+def rebuild_trip_stats_command():
+    """Recompute every user's trip rollup from the trip table."""
+    db.create_all()
+    user_ids = [row[0] for row in db.session.query(User.id).all()]
+    for user_id in user_ids:
+        rebuild_user_trip_stats(user_id)
+    db.session.commit()
+    click.echo(f"Rebuilt trip stats for {len(user_ids)} users.")
+
+@api.cli.command("rebuild-daily-stats")
+def rebuild_daily_stats_command():
+    """Recompute the per-user and system-wide daily rollups from the trip table."""
+    db.create_all()
+    days = rebuild_daily_stats()
+    db.session.commit()
+    click.echo(f"Rebuilt daily stats for {days} days.")
+
+@api.cli.command("process-reward-jobs")
+@click.option('--loop', is_flag=True, help='Keep polling for new jobs instead of exiting when the queue is empty.')
+@click.option('--interval', default=2.0, help='Seconds between polls with --loop.')
+@click.option('--batch-size', default=100, help='Jobs claimed per poll.')
+def process_reward_jobs_command(loop, interval, batch_size):
+    """Process queued reward evaluations."""
+    db.create_all()
+    processed = 0
+    while True:
+        requeue_stale_reward_jobs()
+        job_ids = pending_reward_job_ids(batch_size)
+        for job_id in job_ids:
+            if process_reward_job(job_id):
+                processed += 1
+
+        if not job_ids:
+            if not loop:
+                break
+            time.sleep(interval)
+    click.echo(f"Processed {processed} reward jobs.")
+
+@api.cli.command("deliver-notifications")
+def deliver_notifications_command():
+    """Send emergency e-mails still pending (e.g. queued before a restart)."""
+    # 'sending' rows no sender has touched for a while were interrupted mid-delivery;
+    # fresher ones belong to a live worker's sender pool and are left alone
+    stale = db.and_(
+        NotificationDelivery.status == 'sending',
+        db.or_(NotificationDelivery.claimed_at.is_(None),
+               NotificationDelivery.claimed_at < datetime.utcnow() - NOTIFICATION_STALE_AFTER)
+    )
+    delivery_ids = [row[0] for row in db.session.query(NotificationDelivery.id).filter(
+        db.or_(NotificationDelivery.status == 'pending', stale)
+    ).order_by(NotificationDelivery.id).all()]
+    
+    if delivery_ids:
+        NotificationDelivery.query.filter(NotificationDelivery.id.in_(delivery_ids), stale).update(
+            {NotificationDelivery.status: 'pending'}, synchronize_session=False
+        )
+        db.session.commit()
+    
+    results = [deliver_notification(delivery_id) for delivery_id in delivery_ids]
+    click.echo(f"Sent {results.count('sent')} of {len(delivery_ids)} pending notifications.")
+
+@api.cli.command("export-trips")
+@click.argument('output', type=click.File('w', encoding='utf-8', lazy=False), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv')
+@click.option('--user-id', type=int, help='Only this user\'s trips.')
+@click.option('--email', help='Only the trips of the user with this e-mail.')
+@click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), help='First day to include.')
+@click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), help='Last day to include.')
+def export_trips_command(output, fmt, user_id, email, date_from, date_to):
+    """Write trips as CSV or NDJSON to OUTPUT (default: stdout)."""
+    rows = export_trip_rows(user_id, email, date_from, date_to + timedelta(days=1) if date_to else None)
+    for chunk in format_trip_export(rows, fmt):
+        output.write(chunk)
+
+@api.cli.command("import-trips")
+@click.argument('source', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Defaults to the file extension, else csv.')
+@click.option('--dry-run', is_flag=True, help='Validate every row without writing anything.')
+def import_trips_command(source, fmt, dry_run):
+    """Bulk-load trips from a CSV or NDJSON file (e.g. one written by export-trips)."""
+    fmt = fmt or ('ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+    started = time.perf_counter()
+    result = TripImporter(dry_run=dry_run).run(read_trip_import(source, fmt))
+    for error in result['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    action = 'Validated' if dry_run else 'Imported'
+    click.echo(f"{action} {result['imported']} trips for {result['users']} users, "
+               f"rejected {result['rejected']} rows in {time.perf_counter() - started:.1f}s.")
+
+@api.cli.command("score-landmarks")
+@click.argument('recordings', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--width', type=int, default=640, show_default=True, help='Video width the landmarks were taken from.')
+@click.option('--height', type=int, default=480, show_default=True)
+@click.option('--fps', type=float, help='Frame rate, to report alert times in seconds.')
+@click.option('--ear-threshold', type=float)
+@click.option('--ear-consec-frames', type=int)
+@click.option('--mar-threshold', type=float)
+@click.option('--yawn-consec-frames', type=int)
+@click.option('--json', 'as_json', is_flag=True, help='Print the full summaries as JSON lines.')
+def score_landmarks_command(recordings, width, height, fps, as_json, **thresholds):
+    """Score landmark recordings (.npy/.npz) with the frontend's drowsiness rules."""
+    import drowsiness
+    settings = drowsiness.Settings(**{name: value for name, value in thresholds.items() if value is not None})
+    for path in recordings:
+        started = time.perf_counter()
+        summary = drowsiness.summarize(
+            drowsiness.score_frames(drowsiness.load_recording(path), settings, width, height), settings, fps
+        )
+        elapsed = time.perf_counter() - started
+        if as_json:
+            click.echo(json.dumps({'recording': path, **summary}))
+        else:
+            click.echo(f"{path}: {summary['frames']} frames ({summary['face_frames']} with a face), "
+                       f"{summary['drowsy_alerts']} drowsiness alerts, {summary['yawns']} yawns "
+                       f"in {elapsed * 1000:.0f} ms")
+
+@api.cli.command("refresh-leaderboard")
+def refresh_leaderboard_command():
+    """Rebuild the leaderboard ranking snapshot now."""
+    if refresh_leaderboard():
+        click.echo("Leaderboard snapshot refreshed.")
+    else:
+        click.echo("Leaderboard refresh failed (concurrent refresh?), try again.")
+
+
+# --- Pagination Helpers ---
+def encode_cursor(values):
+    """Opaque keyset cursor for the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on a malformed cursor"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise ValueError('Invalid cursor')
 
 # --- Helper Functions for Gamification ---
 def calculate_trip_points(duration_seconds, alert_count, yawn_count):
@@ -198,196 +633,733 @@ def calculate_trip_points(duration_seconds, alert_count, yawn_count):
     # Calculate safety score for this trip
     # Use a more balanced formula: deduct points per alert/yawn regardless of duration
     if duration_seconds > 0:
-        # Deduct 3 points per alert, 1 point per yawn
-        penalty_points = (alert_count * 3) + (yawn_count * 1)
-        safety_score = max(0, min(100, round(100 - penalty_points)))
+        safety_score = calculate_safety_score(alert_count, yawn_count)
     else:
         safety_score = 100
-    
+
     # Bonus for high safety score
     if safety_score > 90:
         points += 5
-    
+
     return points, safety_score
 
-def check_and_award_achievements(user_id):
-    """Check if user has earned any new achievements"""
-    user = User.query.get(user_id)
-    trips = Trip.query.filter_by(user_id=user_id).order_by(Trip.timestamp.desc()).all()
+def calculate_safety_score(alert_count, yawn_count):
+    """Safety score (0-100) for a single trip"""
+    # Deduct 3 points per alert, 1 point per yawn
+    penalty_points = (alert_count * 3) + (yawn_count * 1)
+    return max(0, min(100, round(100 - penalty_points)))
+
+def safety_score_expression():
+    """SQL expression computing calculate_safety_score() for each Trip row"""
+    penalty = db.func.coalesce(Trip.alert_count, 0) * 3 + db.func.coalesce(Trip.yawn_count, 0)
+    return db.case((penalty >= 100, 0), (penalty <= 0, 100), else_=100 - penalty)
+
+def trip_stats_snapshot(trip):
+    """Capture the trip fields that feed the per-user rollup"""
+    return (trip.duration_seconds or 0, trip.alert_count or 0, trip.yawn_count or 0)
+
+def rebuild_user_trip_stats(user_id):
+    """Recompute a user's rollup from their trips with one aggregate query (caller commits)"""
+    db.session.flush()
+    score = safety_score_expression()
+    scored = Trip.duration_seconds > 0
+    row = db.session.query(
+        db.func.count(Trip.id),
+        db.func.coalesce(db.func.sum(Trip.duration_seconds), 0),
+        db.func.coalesce(db.func.sum(Trip.alert_count), 0),
+        db.func.coalesce(db.func.sum(Trip.yawn_count), 0),
+        db.func.coalesce(db.func.sum(db.case((scored, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((scored, score), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((db.func.coalesce(Trip.alert_count, 0) == 0, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((score >= 95, 1), else_=0)), 0),
+        db.func.max(Trip.timestamp)
+    ).filter(Trip.user_id == user_id).one()
+
+    stats = UserTripStats.query.filter_by(user_id=user_id).first()
+    if not stats:
+        stats = UserTripStats(user_id=user_id)
+        db.session.add(stats)
+
+    (stats.trip_count, stats.total_duration, stats.total_alerts, stats.total_yawns,
+     stats.scored_trip_count, stats.safety_score_sum, stats.zero_alert_trips,
+     stats.high_safety_trips, stats.last_trip_at) = row
+    stats.updated_at = datetime.utcnow()
+    return stats
+
+def update_user_trip_stats(user_id, before=None, after=None, trip_timestamp=None, day=None):
+    """Apply a trip insert (after only), update (both) or delete (before only) to the rollup.
+
+    `before`/`after` are trip_stats_snapshot() tuples. The increments are issued as a
+    single atomic UPDATE so concurrent writers cannot lose counts. `day` (the trip's
+    UTC date) also applies the change to the daily rollups. Caller commits.
+    """
+    deltas = dict.fromkeys([
+        'trip_count', 'total_duration', 'total_alerts', 'total_yawns', 'scored_trip_count',
+        'safety_score_sum', 'zero_alert_trips', 'high_safety_trips'
+    ], 0)
+    for snapshot, sign in ((before, -1), (after, 1)):
+        if snapshot is None:
+            continue
+        duration, alerts, yawns = snapshot
+        score = calculate_safety_score(alerts, yawns)
+        deltas['trip_count'] += sign
+        deltas['total_duration'] += sign * duration
+        deltas['total_alerts'] += sign * alerts
+        deltas['total_yawns'] += sign * yawns
+        if duration > 0:
+            deltas['scored_trip_count'] += sign
+            deltas['safety_score_sum'] += sign * score
+        if alerts == 0:
+            deltas['zero_alert_trips'] += sign
+        if score >= 95:
+            deltas['high_safety_trips'] += sign
+
+    values = {
+        getattr(UserTripStats, name): getattr(UserTripStats, name) + delta
+        for name, delta in deltas.items() if delta
+    }
+    values[UserTripStats.updated_at] = datetime.utcnow()
+
+    db.session.flush()
+    if after is not None and before is None and trip_timestamp is not None:
+        # New trip: advance last_trip_at if this trip is the most recent
+        values[UserTripStats.last_trip_at] = db.case(
+            (UserTripStats.last_trip_at == None, trip_timestamp),
+            (UserTripStats.last_trip_at < trip_timestamp, trip_timestamp),
+            else_=UserTripStats.last_trip_at
+        )
+    elif after is None and before is not None:
+        # Deleted trip: fall back to the user's latest remaining trip
+        values[UserTripStats.last_trip_at] = db.session.query(db.func.max(Trip.timestamp)).filter(
+            Trip.user_id == user_id
+        ).scalar_subquery()
+
+    updated = UserTripStats.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+    if not updated:
+        # First write for a user that predates the rollup table
+        rebuild_user_trip_stats(user_id)
+    
+    if day is not None:
+        daily_deltas = {name: deltas[name] for name in ('trip_count', 'total_duration', 'total_alerts', 'total_yawns')}
+        apply_daily_deltas(UserDailyStats, {'user_id': user_id, 'day': day}, daily_deltas)
+        apply_daily_deltas(DailyStats, {'day': day}, daily_deltas)
+
+def apply_daily_deltas(model, key, deltas):
+    """Add `deltas` to the daily rollup row identified by `key`, creating it if needed"""
+    values = {getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    if model.query.filter_by(**key).update(values, synchronize_session=False):
+        return
+    try:
+        # Savepoint, so losing a race with a concurrent first write only undoes this insert
+        with db.session.begin_nested():
+            db.session.add(model(**key, **deltas))
+    except IntegrityError:
+        model.query.filter_by(**key).update(values, synchronize_session=False)
+
+def rebuild_daily_stats():
+    """Recompute both daily rollups from the trip table (caller commits). Returns the number of days"""
+    db.session.flush()
+    day = trend_bucket_expression(Trip.timestamp, 'daily')
+    columns = (
+        db.func.count(Trip.id),
+        db.func.coalesce(db.func.sum(Trip.duration_seconds), 0),
+        db.func.coalesce(db.func.sum(Trip.alert_count), 0),
+        db.func.coalesce(db.func.sum(Trip.yawn_count), 0)
+    )
+    totals = ['trip_count', 'total_duration', 'total_alerts', 'total_yawns']
+    
+    db.session.execute(db.delete(UserDailyStats))
+    db.session.execute(db.delete(DailyStats))
+    db.session.execute(db.insert(UserDailyStats).from_select(
+        ['user_id', 'day'] + totals,
+        db.select(Trip.user_id, day, *columns).group_by(Trip.user_id, day)
+    ))
+    db.session.execute(db.insert(DailyStats).from_select(
+        ['day'] + totals,
+        db.select(day, *columns).group_by(day)
+    ))
+    return db.session.query(db.func.count(DailyStats.id)).scalar()
+
+def get_user_trip_stats(user_id):
+    """Return the user's rollup row, building it on first access"""
+    stats = UserTripStats.query.filter_by(user_id=user_id).first()
+    if stats is None:
+        stats = rebuild_user_trip_stats(user_id)
+        db.session.commit()
+    return stats
+
+def average_safety_score(stats, ndigits=None):
+    """Average per-trip safety score from a rollup row (None when no scored trips)"""
+    if not stats or not stats.scored_trip_count:
+        return None
+    return round(stats.safety_score_sum / stats.scored_trip_count, ndigits)
+
+# --- Leaderboard Snapshot ---
+_leaderboard_refreshed_at = None  # Last snapshot time seen by this worker
+
+def refresh_leaderboard():
+    """Rebuild the ranking snapshot from users and their trip rollups in one INSERT ... SELECT"""
+    global _leaderboard_refreshed_at
+
+    now = datetime.utcnow()
+    points = db.func.coalesce(User.points, 0)
+    avg_safety_score = db.case(
+        (UserTripStats.scored_trip_count > 0,
+         db.func.round(UserTripStats.safety_score_sum * 1.0 / UserTripStats.scored_trip_count, 1)),
+        (UserTripStats.trip_count > 0, 100),
+        else_=0
+    )
+    ranked = db.select(
+        User.id,
+        User.email,
+        points,
+        avg_safety_score,
+        db.func.coalesce(UserTripStats.trip_count, 0),
+        db.func.row_number().over(order_by=(points.desc(), User.id)),
+        db.func.row_number().over(order_by=(avg_safety_score.desc(), User.id)),
+        db.literal(now, db.DateTime)
+    ).outerjoin(UserTripStats, UserTripStats.user_id == User.id)
+
+    table = LeaderboardEntry.__table__
+    try:
+        db.session.execute(table.delete())
+        db.session.execute(table.insert().from_select([
+            'user_id', 'email', 'points', 'avg_safety_score', 'total_trips',
+            'points_rank', 'safety_rank', 'refreshed_at'
+        ], ranked))
+        db.session.commit()
+    except Exception:
+        # Another worker refreshed concurrently; its snapshot is just as good
+        db.session.rollback()
+        return False
+
+    _leaderboard_refreshed_at = now
+    return True
+
+def ensure_leaderboard_fresh(force=False):
+    """Refresh the snapshot when it is older than LEADERBOARD_REFRESH_SECONDS"""
+    global _leaderboard_refreshed_at
+
+    max_age = timedelta(seconds=current_app.config['LEADERBOARD_REFRESH_SECONDS'])
+    now = datetime.utcnow()
+    if not force and _leaderboard_refreshed_at and now - _leaderboard_refreshed_at < max_age:
+        return
+
+    # Another worker may have refreshed since we last looked
+    latest = db.session.query(db.func.max(LeaderboardEntry.refreshed_at)).scalar()
+    if force or latest is None or now - latest >= max_age:
+        refresh_leaderboard()
+    else:
+        _leaderboard_refreshed_at = latest
+
+def leaderboard_entry_to_dict(entry, rank, current_user_id):
+    return {
+        'rank': rank,
+        'user_id': entry.user_id,
+        'display_name': entry.email.split('@')[0],
+        'points': entry.points,
+        'avg_safety_score': entry.avg_safety_score,
+        'total_trips': entry.total_trips,
+        'is_current_user': entry.user_id == current_user_id
+    }
+
+def build_emergency_email(user, alert_count, trip_start_location, trip_end_location=None):
+    """Subject and HTML body of the emergency e-mail sent to a user's contacts"""
+    user_name = user.email.split('@')[0]
+    current_time = datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
+    app_link = os.environ.get('APP_URL', 'http://localhost:3000')
+    
+    subject = f"🚨 DriveGuard Alert: {user_name} needs attention"
+    
+    html_content = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f4f4;">
+            <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+                <h1 style="color: #e74c3c; border-bottom: 3px solid #e74c3c; padding-bottom: 10px;">
+                    🚨 Emergency Alert from DriveGuard
+                </h1>
+                
+                <p style="font-size: 16px; color: #333; line-height: 1.6;">
+                    <strong>{user_name}</strong> is showing signs of severe drowsiness while driving.
+                </p>
+                
+                <div style="background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0;">
+                    <h3 style="margin-top: 0; color: #856404;">⚠️ Alert Details:</h3>
+                    <ul style="color: #856404; font-size: 14px;">
+                        <li><strong>Driver:</strong> {user_name}</li>
+                        <li><strong>Alerts Detected:</strong> {alert_count} drowsiness alerts</li>
+                        <li><strong>Time:</strong> {current_time}</li>
+                        <li><strong>Start Location:</strong> {trip_start_location}</li>
+                        {f'<li><strong>Current/End Location:</strong> {trip_end_location}</li>' if trip_end_location else ''}
+                    </ul>
+                </div>
+                
+                <p style="font-size: 16px; color: #333; line-height: 1.6;">
+                    Please try to contact <strong>{user_name}</strong> immediately to ensure they are safe.
+                </p>
+                
+                <div style="text-align: center; margin: 30px 0;">
+                    <a href="{app_link}" style="display: inline-block; padding: 15px 30px; background-color: #4CAF50; color: white; text-decoration: none; border-radius: 5px; font-weight: bold;">
+                        View DriveGuard Dashboard
+                    </a>
+                </div>
+                
+                <p style="font-size: 12px; color: #999; border-top: 1px solid #ddd; padding-top: 15px; margin-top: 30px;">
+                    This is an automated safety alert from DriveGuard. You are receiving this because you were listed as an emergency contact for {user_name}.
+                </p>
+            </div>
+        </body>
+    </html>
+    """
+    
+    return subject, html_content
+
+# --- Emergency Notification Dispatcher ---
+# 'sending' deliveries whose claim is older than this were orphaned (well above a send plus its backoff)
+NOTIFICATION_STALE_AFTER = timedelta(minutes=5)
+
+_notification_transport = None
+_notification_transport_lock = threading.Lock()
+
+def get_notification_transport():
+    """Shared transport (one SendGrid client per process), None when unconfigured"""
+    global _notification_transport
+    with _notification_transport_lock:
+        if _notification_transport is None:
+            _notification_transport = create_transport()
+        return _notification_transport
+
+def queue_emergency_notification(user, trip, alert_count):
+    """Record one pending delivery per e-mail contact and hand them to the sender pool.
+
+    Contacts already notified for this trip are skipped, so retried or repeated
+    threshold crossings never e-mail anyone twice. Returns the number queued.
+    """
+    contacts = EmergencyContact.query.filter_by(user_id=user.id).all()
+    already_notified = {row[0] for row in db.session.query(NotificationDelivery.contact_id).filter_by(
+        trip_id=trip.id, channel='email'
+    )}
+    
+    subject, html_content = build_emergency_email(user, alert_count, trip.start_location, trip.end_location)
+    deliveries = []
+    for contact in contacts:
+        if contact.notification_type in ['email', 'both'] and contact.email and contact.id not in already_notified:
+            delivery = NotificationDelivery(
+                user_id=user.id,
+                trip_id=trip.id,
+                contact_id=contact.id,
+                channel='email',
+                recipient=contact.email,
+                subject=subject,
+                body=html_content
+            )
+            db.session.add(delivery)
+            deliveries.append(delivery)
+    
+    if not deliveries:
+        return 0
     
-    if not trips:
-        return []
+    try:
+        db.session.commit()
+    except Exception:
+        # A concurrent request queued the same contacts first
+        db.session.rollback()
+        return 0
+    
+    flask_app = current_app._get_current_object()
+    executor = get_background_executor('notify-worker', current_app.config['NOTIFY_WORKER_THREADS'])
+    for delivery in deliveries:
+        executor.submit(run_in_app_context, flask_app, deliver_notification, delivery.id)
+    return len(deliveries)
+
+def deliver_notification(delivery_id):
+    """Send one queued e-mail, retrying with exponential backoff. Returns the final status."""
+    claimed = NotificationDelivery.query.filter_by(id=delivery_id, status='pending').update(
+        {NotificationDelivery.status: 'sending', NotificationDelivery.claimed_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    if not claimed:
+        return None
     
-    newly_earned = []
-    all_achievements = Achievement.query.all()
-    earned_achievement_ids = [ua.achievement_id for ua in user.user_achievements]
+    delivery = db.session.get(NotificationDelivery, delivery_id)
+    transport = get_notification_transport()
+    max_attempts = current_app.config['NOTIFY_MAX_ATTEMPTS']
     
-    for achievement in all_achievements:
-        # Skip if already earned
-        if achievement.id in earned_achievement_ids:
-            continue
-        
-        earned = False
-        
-        # Check criteria
-        if achievement.criteria_type == "first_trip":
-            if len(trips) >= 1:
-                earned = True
-        
-        elif achievement.criteria_type == "zero_alerts":
-            zero_alert_trips = [t for t in trips if t.alert_count == 0]
-            if len(zero_alert_trips) >= achievement.criteria_value:
-                earned = True
-        
-        elif achievement.criteria_type == "long_trip":
-            if any(t.duration_seconds >= achievement.criteria_value for t in trips):
-                earned = True
-        
-        elif achievement.criteria_type == "weekly_trips":
-            # Check trips in last 7 days
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            recent_trips = [t for t in trips if t.timestamp >= week_ago]
-            if len(recent_trips) >= achievement.criteria_value:
-                earned = True
-        
-        elif achievement.criteria_type == "total_trips":
-            if len(trips) >= achievement.criteria_value:
-                earned = True
-        
-        elif achievement.criteria_type == "consecutive_zero_alerts":
-            # Check last N trips for zero alerts
-            consecutive_count = 0
-            for trip in trips:
-                if trip.alert_count == 0:
-                    consecutive_count += 1
-                    if consecutive_count >= achievement.criteria_value:
-                        earned = True
-                        break
-                else:
-                    break
-        
-        elif achievement.criteria_type == "perfect_scores":
-            # Count trips with perfect safety score
-            perfect_count = 0
-            for trip in trips:
-                duration_hours = trip.duration_seconds / 3600
-                if duration_hours > 0:
-                    penalty = (trip.alert_count * 5 + trip.yawn_count * 2) / duration_hours
-                    safety_score = max(0, round(100 - penalty))
-                else:
-                    safety_score = 100
-                if safety_score == 100:
-                    perfect_count += 1
-            if perfect_count >= achievement.criteria_value:
-                earned = True
-        
-        # Award achievement
-        if earned:
-            user_achievement = UserAchievement(user_id=user_id, achievement_id=achievement.id)
-            db.session.add(user_achievement)
-            newly_earned.append({
-                'name': achievement.name,
-                'description': achievement.description,
-                'icon': achievement.icon
-            })
+    while True:
+        delivery.attempts += 1
+        delivery.claimed_at = datetime.utcnow()
+        try:
+            if transport is None:
+                raise RuntimeError('No notification transport configured (set SENDGRID_API_KEY)')
+            transport.send(delivery.recipient, delivery.subject, delivery.body)
+            delivery.status = 'sent'
+            delivery.sent_at = datetime.utcnow()
+            delivery.last_error = None
+            db.session.commit()
+            logger.info("Emergency email sent", extra={'delivery_id': delivery.id, 'trip_id': delivery.trip_id, 'recipient': delivery.recipient})
+            return delivery.status
+        except Exception as e:
+            delivery.last_error = str(e)[:500]
+            if transport is None or delivery.attempts >= max_attempts:
+                delivery.status = 'failed'
+                db.session.commit()
+                logger.error("Emergency email failed", extra={'delivery_id': delivery.id, 'trip_id': delivery.trip_id,
+                                                            'recipient': delivery.recipient, 'attempts': delivery.attempts, 'error': str(e)})
+                return delivery.status
+            db.session.commit()
+            time.sleep(current_app.config['NOTIFY_RETRY_BASE_SECONDS'] * (2 ** (delivery.attempts - 1)))
+
+
+# --- Trend Bucketing ---
+TREND_PERIODS = {'daily': '%Y-%m-%d', 'weekly': '%Y-W%W', 'monthly': '%Y-%m'}  # Label formats
+MAX_TREND_BUCKETS = 400
+
+def trend_bucket_expression(column, period):
+    """SQL expression for the first day of the period containing `column` (weeks start Monday)"""
+    if db.engine.dialect.name == 'postgresql':
+        unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}[period]
+        return db.cast(db.func.date_trunc(unit, column), db.Date)
+    # SQLite: 'weekday 0' moves to the coming Sunday (or stays), -6 days lands on its Monday
+    if period == 'daily':
+        return db.func.date(column)
+    if period == 'weekly':
+        return db.func.date(column, 'weekday 0', '-6 days')
+    return db.func.date(column, 'start of month')
+
+def bucket_to_date(value):
+    """Normalise a bucket value from either dialect (date, datetime or 'YYYY-MM-DD')"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+def truncate_to_period(day, period):
+    if period == 'weekly':
+        return day - timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    return day
+
+def shift_bucket(bucket, period, steps):
+    """Start of the period `steps` periods after (or before) `bucket`"""
+    if period == 'daily':
+        return bucket + timedelta(days=steps)
+    if period == 'weekly':
+        return bucket + timedelta(weeks=steps)
+    months = bucket.year * 12 + bucket.month - 1 + steps
+    return date(months // 12, months % 12 + 1, 1)
+
+def count_buckets(first, last, period):
+    if period == 'daily':
+        return (last - first).days + 1
+    if period == 'weekly':
+        return (last - first).days // 7 + 1
+    return (last.year - first.year) * 12 + last.month - first.month + 1
+
+
+# --- Alert Ingestion ---
+MAX_ALERT_BATCH_SIZE = 500
+ALERT_TYPES = ('drowsy', 'yawn')
+
+def parse_iso_datetime(value):
+    """Parse an ISO-8601 timestamp into naive UTC; raises ValueError"""
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_client_timestamp(value):
+    """Parse an ISO-8601 client timestamp into naive UTC, falling back to now"""
+    if not value:
+        return datetime.utcnow()
+    try:
+        return parse_iso_datetime(value)
+    except ValueError:
+        return datetime.utcnow()
+
+def parse_alert_type(value):
+    """A client's alert_type as stored (missing means 'drowsy'); raises ValueError"""
+    alert_type = value or 'drowsy'
+    if alert_type not in ALERT_TYPES:
+        raise ValueError(f"alert_type must be one of {', '.join(ALERT_TYPES)}")
+    return alert_type
+
+def increment_trip_alerts(trip, count):
+    """Atomically add `count` alerts to a trip and its owner's rollup (caller commits).
+
+    Uses UPDATE ... SET alert_count = alert_count + n, which holds the row lock until
+    commit, so concurrent requests never lose increments. Returns (old_count, new_count).
+    """
+    Trip.query.filter_by(id=trip.id).update(
+        {Trip.alert_count: db.func.coalesce(Trip.alert_count, 0) + count},
+        synchronize_session=False
+    )
+    db.session.refresh(trip, ['alert_count'])
+    new_count = trip.alert_count
+    old_count = new_count - count
+    
+    duration, _, yawns = trip_stats_snapshot(trip)
+    update_user_trip_stats(
+        trip.user_id, before=(duration, old_count, yawns), after=(duration, new_count, yawns),
+        day=trip.timestamp.date()
+    )
+    return old_count, new_count
+
+def record_alert_events(trip, events):
+    """Insert alert events for a trip, skipping idempotency keys already stored (caller commits).
+
+    `events` are dicts with alert_type, timestamp and an optional idempotency_key.
+    Returns (accepted rows, duplicates). Raises ValueError, before writing anything,
+    when an event's alert_type is not one of ALERT_TYPES.
+    """
+    alert_types = [parse_alert_type(event.get('alert_type')) for event in events]
+    # Compare keys as they are stored: strings truncated to the column length
+    keys = [str(event['idempotency_key'])[:64] if event.get('idempotency_key') else None for event in events]
+    seen = set()
+    if any(keys):
+        seen = {row[0] for row in db.session.query(AlertEvent.idempotency_key).filter(
+            AlertEvent.trip_id == trip.id,
+            AlertEvent.idempotency_key.in_({key for key in keys if key})
+        )}
     
-    if newly_earned:
-        db.session.commit()
+    now = datetime.utcnow()
+    rows = []
+    duplicates = 0
+    for event, alert_type, key in zip(events, alert_types, keys):
+        if key:
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+        rows.append({
+            'trip_id': trip.id,
+            'user_id': trip.user_id,
+            'alert_type': alert_type,
+            'occurred_at': parse_client_timestamp(event.get('timestamp')),
+            'received_at': now,
+            'idempotency_key': key
+        })
     
-    return newly_earned
+    bulk_insert_alert_events(rows)
+    return rows, duplicates
+
+def bulk_insert_alert_events(rows):
+    """Append alert event rows (dicts of AlertEvent columns) with one executemany INSERT"""
+    if rows:
+        db.session.execute(db.insert(AlertEvent), rows)
 
-def send_emergency_notification(user, alert_count, trip_start_location, trip_end_location=None):
-    """Send emergency email notification to user's emergency contacts"""
+def count_recent_alerts(trip_id, minutes, now=None, alert_type=None):
+    """Number of alerts for a trip that occurred in the last `minutes` (index range scan)"""
+    now = now or datetime.utcnow()
+    query = db.session.query(db.func.count(AlertEvent.id)).filter(
+        AlertEvent.trip_id == trip_id,
+        AlertEvent.occurred_at >= now - timedelta(minutes=minutes)
+    )
+    if alert_type:
+        query = query.filter(AlertEvent.alert_type == alert_type)
+    return query.scalar()
+
+_emergency_evaluator = None
+_emergency_evaluator_lock = threading.Lock()
+
+def get_emergency_evaluator():
+    """Per-process sliding-window evaluator built from the EMERGENCY_* settings"""
+    global _emergency_evaluator
+    with _emergency_evaluator_lock:
+        if _emergency_evaluator is None:
+            _emergency_evaluator = SlidingWindowEvaluator(
+                window_seconds=current_app.config['EMERGENCY_WINDOW_MINUTES'] * 60,
+                threshold=current_app.config['EMERGENCY_ALERT_THRESHOLD'],
+                weights={
+                    'yawn': current_app.config['EMERGENCY_YAWN_WEIGHT'],
+                    'drowsy': current_app.config['EMERGENCY_DROWSY_WEIGHT']
+                },
+                default_weight=current_app.config['EMERGENCY_DROWSY_WEIGHT']
+            )
+        return _emergency_evaluator
+
+def load_alert_window(trip_id, since):
+    """Stored (occurred_at, alert_type) pairs of a trip, for rebuilding an evaluator window"""
+    query = db.session.query(AlertEvent.occurred_at, AlertEvent.alert_type).filter(AlertEvent.trip_id == trip_id)
+    if since is not None:
+        query = query.filter(AlertEvent.occurred_at >= since)
+    return query.all()
+
+def evaluate_emergency(trip, rows, old_count):
+    """Feed newly stored alert rows to the evaluator. Returns (window_score, fired)"""
+    return get_emergency_evaluator().observe(
+        trip.id,
+        [(row['occurred_at'], row['alert_type']) for row in rows],
+        old_count,
+        load_alert_window
+    )
+
+def get_trip_alert_timeline(trip_id, since=None, until=None, limit=1000):
+    """Alert events for a trip in occurrence order"""
+    query = AlertEvent.query.filter(AlertEvent.trip_id == trip_id)
+    if since:
+        query = query.filter(AlertEvent.occurred_at >= since)
+    if until:
+        query = query.filter(AlertEvent.occurred_at < until)
+    return query.order_by(AlertEvent.occurred_at, AlertEvent.id).limit(limit).all()
+
+# --- Offline Trip Sync ---
+MAX_SYNC_TRIPS = 20            # Trips per POST /api/trips/sync
+MAX_SYNC_EVENTS_PER_TRIP = 2000
+
+def parse_sync_trip(data, client_id=None):
+    """Validate one uploaded trip record. Returns (client_id, fields, events); raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('Each trip must be an object')
     try:
-        contacts = EmergencyContact.query.filter_by(user_id=user.id).all()
-        if not contacts:
-            return False
-        
-        sendgrid_api_key = os.environ.get('SENDGRID_API_KEY')
-        sender_email = os.environ.get('SENDGRID_SENDER_EMAIL', 'noreply@driveguard.com')
-        
-        if not sendgrid_api_key:
-            print("⚠️ SendGrid API key not configured")
-            return False
-        
-        # Create email content
-        user_name = user.email.split('@')[0]
-        current_time = datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
-        app_link = os.environ.get('APP_URL', 'http://localhost:3000')
-        
-        subject = f"🚨 DriveGuard Alert: {user_name} needs attention"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f4f4;">
-                <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-                    <h1 style="color: #e74c3c; border-bottom: 3px solid #e74c3c; padding-bottom: 10px;">
-                        🚨 Emergency Alert from DriveGuard
-                    </h1>
-                    
-                    <p style="font-size: 16px; color: #333; line-height: 1.6;">
-                        <strong>{user_name}</strong> is showing signs of severe drowsiness while driving.
-                    </p>
-                    
-                    <div style="background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0;">
-                        <h3 style="margin-top: 0; color: #856404;">⚠️ Alert Details:</h3>
-                        <ul style="color: #856404; font-size: 14px;">
-                            <li><strong>Driver:</strong> {user_name}</li>
-                            <li><strong>Alerts Detected:</strong> {alert_count} drowsiness alerts</li>
-                            <li><strong>Time:</strong> {current_time}</li>
-                            <li><strong>Start Location:</strong> {trip_start_location}</li>
-                            {f'<li><strong>Current/End Location:</strong> {trip_end_location}</li>' if trip_end_location else ''}
-                        </ul>
-                    </div>
-                    
-                    <p style="font-size: 16px; color: #333; line-height: 1.6;">
-                        Please try to contact <strong>{user_name}</strong> immediately to ensure they are safe.
-                    </p>
-                    
-                    <div style="text-align: center; margin: 30px 0;">
-                        <a href="{app_link}" style="display: inline-block; padding: 15px 30px; background-color: #4CAF50; color: white; text-decoration: none; border-radius: 5px; font-weight: bold;">
-                            View DriveGuard Dashboard
-                        </a>
-                    </div>
-                    
-                    <p style="font-size: 12px; color: #999; border-top: 1px solid #ddd; padding-top: 15px; margin-top: 30px;">
-                        This is an automated safety alert from DriveGuard. You are receiving this because you were listed as an emergency contact for {user_name}.
-                    </p>
-                </div>
-            </body>
-        </html>
-        """
-        
-        # Send to all contacts with email notification enabled
-        sg = SendGridAPIClient(sendgrid_api_key)
-        sent_count = 0
-        
-        for contact in contacts:
-            if contact.notification_type in ['email', 'both'] and contact.email:
-                try:
-                    message = Mail(
-                        from_email=sender_email,
-                        to_emails=contact.email,
-                        subject=subject,
-                        html_content=html_content
-                    )
-                    response = sg.send(message)
-                    if response.status_code in [200, 202]:
-                        sent_count += 1
-                        print(f"✅ Emergency email sent to {contact.name} ({contact.email})")
-                except Exception as e:
-                    print(f"❌ Failed to send email to {contact.email}: {e}")
-        
-        return sent_count > 0
+        client_id = str(uuid.UUID(str(client_id or data.get('client_id'))))
+    except ValueError:
+        raise ValueError('client_id must be a UUID')
+    
+    fields = {}
+    for field in ('start_location', 'end_location'):
+        if data.get(field) is not None:
+            value = str(data[field]).strip()
+            if not value or len(value) > 200:
+                raise ValueError(f'{field} must be 1-200 characters')
+            fields[field] = value
+    for field in ('duration_seconds', 'yawn_count'):
+        if data.get(field) is not None:
+            if not isinstance(data[field], int) or data[field] < 0:
+                raise ValueError(f'{field} must be a non-negative integer')
+            fields[field] = data[field]
+    if data.get('started_at'):
+        fields['timestamp'] = parse_iso_datetime(data['started_at'])
+    
+    events = data.get('events') or []
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        raise ValueError('events must be a list of objects')
+    if len(events) > MAX_SYNC_EVENTS_PER_TRIP:
+        raise ValueError(f'At most {MAX_SYNC_EVENTS_PER_TRIP} events per trip')
+    for event in events:
+        event['alert_type'] = parse_alert_type(event.get('alert_type'))
+        if not event.get('idempotency_key'):
+            # Offline clients resend whole outboxes: key unkeyed events by their type and time
+            if not event.get('timestamp'):
+                raise ValueError('Events without an idempotency_key need a timestamp')
+            try:
+                occurred_at = parse_iso_datetime(event['timestamp'])
+            except ValueError:
+                raise ValueError('Event timestamps must be ISO-8601 datetimes')
+            event['idempotency_key'] = f"{event['alert_type']}@{occurred_at.isoformat()}"
+    return client_id, fields, events
+
+def get_or_create_trip_upload(user, client_id, fields):
+    """The user's upload for `client_id`, locked, creating its trip if needed. Returns (upload, created)"""
+    upload = TripUpload.query.filter_by(user_id=user.id, client_id=client_id).with_for_update().first()
+    if upload:
+        return upload, False
+    if 'start_location' not in fields or 'end_location' not in fields:
+        raise ValueError('start_location and end_location are required for a new trip')
+    try:
+        # Savepoint, so losing a race with a concurrent first upload only undoes this insert
+        with db.session.begin_nested():
+            trip = Trip(
+                user_id=user.id,
+                start_location=fields['start_location'],
+                end_location=fields['end_location'],
+                duration_seconds=fields.get('duration_seconds', 0),
+                yawn_count=fields.get('yawn_count', 0),
+                alert_count=0,
+                timestamp=fields.get('timestamp') or datetime.utcnow()
+            )
+            db.session.add(trip)
+            db.session.flush()
+            upload = TripUpload(user_id=user.id, trip_id=trip.id, client_id=client_id)
+            db.session.add(upload)
+    except IntegrityError:
+        upload = TripUpload.query.filter_by(user_id=user.id, client_id=client_id).with_for_update().one()
+        return upload, False
+    return upload, True
+
+def sync_trip(user, client_id, fields, events):
+    """Create or merge one uploaded trip and its alert events (caller commits).
+
+    Counters only grow (duration and yawns take the larger value, alert_count counts
+    stored events), so partial uploads can arrive in any order and retries change
+    nothing. Points are adjusted by the difference to what this trip already earned.
+    Returns (result dict, accepted event rows, alert count before them, reward job or None).
+    """
+    upload, created = get_or_create_trip_upload(user, client_id, fields)
+    trip = upload.trip
+    
+    if created:
+        update_user_trip_stats(
+            user.id, after=trip_stats_snapshot(trip),
+            trip_timestamp=trip.timestamp, day=trip.timestamp.date()
+        )
+        update_user_streak(user.id, trip.timestamp.date())
+        changed = True
+    else:
+        before = trip_stats_snapshot(trip)
+        for field in ('start_location', 'end_location'):
+            if field in fields:
+                setattr(trip, field, fields[field])
+        for field in ('duration_seconds', 'yawn_count'):
+            if fields.get(field, 0) > (getattr(trip, field) or 0):
+                setattr(trip, field, fields[field])
+        changed = trip_stats_snapshot(trip) != before
+        if changed:
+            update_user_trip_stats(user.id, before=before, after=trip_stats_snapshot(trip), day=trip.timestamp.date())
+    
+    rows, duplicates = record_alert_events(trip, events)
+    old_count = trip.alert_count or 0
+    if rows:
+        old_count, _ = increment_trip_alerts(trip, len(rows))
+        changed = True
+    
+    points, safety_score = calculate_trip_points(trip.duration_seconds, trip.alert_count, trip.yawn_count)
+    points_earned = points - upload.points_awarded
+    if points_earned:
+        User.query.filter_by(id=user.id).update(
+            {User.points: db.func.coalesce(User.points, 0) + points_earned}, synchronize_session=False
+        )
+        upload.points_awarded = points
     
-    except Exception as e:
-        print(f"❌ Error sending emergency notifications: {e}")
-        return False
-
+    reward_job = None
+    if changed:
+        upload.updated_at = datetime.utcnow()
+        reward_job = enqueue_reward_job(user.id, trip.id)
+    
+    result = {
+        'client_id': client_id,
+        'trip_id': trip.id,
+        'created': created,
+        'accepted_events': len(rows),
+        'duplicate_events': duplicates,
+        'alert_count': trip.alert_count,
+        'points_earned': points_earned,
+        'safety_score': safety_score,
+        'emergency_notification_sent': False
+    }
+    return result, rows, old_count, reward_job
+
+def notify_synced_alerts(user, trip, rows, old_count):
+    """Emergency evaluation for uploaded events. Returns (window_score, notification sent)"""
+    window_score, fired = evaluate_emergency(trip, rows, old_count)
+    if not fired:
+        return window_score, False
+    # Alerts that were stuck offline for longer than the window are history, not an emergency
+    window = timedelta(minutes=current_app.config['EMERGENCY_WINDOW_MINUTES'])
+    if max(row['occurred_at'] for row in rows) < datetime.utcnow() - window:
+        logger.info("Emergency threshold reached by late alerts, not notifying",
+                    extra={'user_id': user.id, 'trip_id': trip.id, 'window_score': window_score})
+        return window_score, False
+    logger.warning("Emergency threshold reached", extra={'user_id': user.id, 'trip_id': trip.id, 'window_score': window_score})
+    return window_score, queue_emergency_notification(user, trip, trip.alert_count) > 0
 
 # --- Gamification Helper Functions ---
 def update_user_streak(user_id, trip_date):
-    """Update user's driving streak based on trip date"""
+    """Update user's driving streak based on trip date (caller commits)"""
     from datetime import date, timedelta
     
     streak = UserStreak.query.filter_by(user_id=user_id).first()
@@ -420,196 +1392,727 @@ def update_user_streak(user_id, trip_date):
         streak.last_trip_date = trip_date
         streak.updated_at = datetime.utcnow()
     
-    db.session.commit()
     return streak.current_streak
 
-def check_and_award_badges(user_id, trip=None):
-    """Check if user has earned any new badges"""
-    from datetime import time as datetime_time
-    
-    user = User.query.get(user_id)
-    trips = Trip.query.filter_by(user_id=user_id).order_by(Trip.timestamp.desc()).all()
-    
-    if not trips:
-        return []
-    
-    newly_earned = []
-    all_badges = Badge.query.filter_by(is_active=True).all()
-    earned_badge_ids = [ub.badge_id for ub in user.user_badges]
-    
-    for badge in all_badges:
-        # Skip if already earned
-        if badge.id in earned_badge_ids:
+# --- Reward Rule Engine ---
+# Achievement and badge criteria_type -> metric from load_reward_metrics() compared
+# against the rule's criteria_value
+ACHIEVEMENT_METRICS = {
+    'first_trip': 'trip_count',
+    'zero_alerts': 'zero_alert_trips',
+    'long_trip': 'longest_trip',
+    'weekly_trips': 'trips_last_week',
+    'total_trips': 'trip_count',
+    'consecutive_zero_alerts': 'consecutive_zero_alerts',
+    'perfect_scores': 'perfect_scores',
+}
+
+BADGE_METRICS = {
+    'night_trips': 'night_trips',  # 10 PM - 5 AM with zero alerts
+    'long_safe_trip': 'longest_safe_trip',  # Longest trip with safety score >= 90
+    'zero_alert_trips': 'zero_alert_trips',
+    'morning_trips': 'morning_trips',  # 5 AM - 8 AM
+    'streak_days': 'longest_streak',
+    'high_safety_trips': 'high_safety_trips',  # Safety score >= 95
+}
+
+def load_reward_metrics(user_id, stats, challenges, now):
+    """Compute every metric the reward rules need.
+
+    Counters come from the trip rollup; everything that depends on trip history is
+    computed by a single aggregate query, with one extra column per windowed challenge.
+    """
+    def count_where(condition):
+        return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+
+    score = safety_score_expression()
+    hour = db.extract('hour', Trip.timestamp)
+    zero_alerts = db.func.coalesce(Trip.alert_count, 0) == 0
+    last_alert_at = db.session.query(db.func.max(Trip.timestamp)).filter(
+        Trip.user_id == user_id,
+        Trip.alert_count > 0
+    ).scalar_subquery()
+    # Legacy per-hour score used by "Perfect Score": 100 when (5*alerts + 2*yawns) / hours <= 0.5
+    hourly_penalty = db.func.coalesce(Trip.alert_count, 0) * 5 + db.func.coalesce(Trip.yawn_count, 0) * 2
+
+    columns = {
+        'longest_trip': db.func.coalesce(db.func.max(Trip.duration_seconds), 0),
+        'longest_safe_trip': db.func.coalesce(db.func.max(db.case((score >= 90, Trip.duration_seconds))), 0),
+        'trips_last_week': count_where(Trip.timestamp >= now - timedelta(days=7)),
+        'trips_today': count_where(Trip.timestamp >= now.replace(hour=0, minute=0, second=0, microsecond=0)),
+        'consecutive_zero_alerts': count_where(db.or_(last_alert_at == None, Trip.timestamp > last_alert_at)),
+        'perfect_scores': count_where(db.or_(
+            Trip.duration_seconds <= 0,
+            hourly_penalty * 7200 <= Trip.duration_seconds
+        )),
+        'night_trips': count_where(db.and_(db.or_(hour >= 22, hour < 5), zero_alerts)),
+        'morning_trips': count_where(db.and_(hour >= 5, hour < 8)),
+    }
+    for challenge in challenges:
+        if challenge.criteria_type == 'zero_alert_trips':
+            columns[f'challenge_{challenge.id}'] = count_where(db.and_(
+                zero_alerts,
+                Trip.timestamp >= challenge.start_date,
+                Trip.timestamp <= challenge.end_date
+            ))
+
+    row = db.session.query(
+        *[column.label(name) for name, column in columns.items()]
+    ).filter(Trip.user_id == user_id).one()
+
+    metrics = dict(row._mapping)
+    metrics['trip_count'] = stats.trip_count
+    metrics['zero_alert_trips'] = stats.zero_alert_trips
+    metrics['high_safety_trips'] = stats.high_safety_trips
+    streak = UserStreak.query.filter_by(user_id=user_id).first()
+    metrics['longest_streak'] = streak.longest_streak if streak else 0
+    return metrics
+
+def evaluate_user_rewards(user_id):
+    """Evaluate all achievements, active badges and active challenges in one pass.
+
+    Awards, challenge progress and bonus points are added to the session; the caller
+    commits them together. Each kind of write is one executemany statement however many
+    rules fire. Returns (new_achievements, new_badges, completed_challenges).
+    """
+    stats = get_user_trip_stats(user_id)
+    if not stats.trip_count:
+        return [], [], []
+
+    now = datetime.utcnow()
+    achievements = Achievement.query.all()
+    badges = Badge.query.filter_by(is_active=True).all()
+    challenges = Challenge.query.filter(
+        Challenge.is_active == True,
+        Challenge.start_date <= now,
+        Challenge.end_date >= now
+    ).all()
+
+    earned_achievement_ids = {row[0] for row in db.session.query(UserAchievement.achievement_id).filter_by(user_id=user_id)}
+    earned_badge_ids = {row[0] for row in db.session.query(UserBadge.badge_id).filter_by(user_id=user_id)}
+    user_challenges = {}
+    if challenges:
+        user_challenges = {uc.challenge_id: uc for uc in UserChallenge.query.filter(
+            UserChallenge.user_id == user_id,
+            UserChallenge.challenge_id.in_([challenge.id for challenge in challenges])
+        )}
+
+    metrics = load_reward_metrics(user_id, stats, challenges, now)
+    bonus_points = 0
+
+    award_rows = {UserAchievement: [], UserBadge: [], UserChallenge: []}
+
+    newly_earned_achievements = []
+    for achievement in achievements:
+        metric = ACHIEVEMENT_METRICS.get(achievement.criteria_type)
+        if achievement.id in earned_achievement_ids or metric is None:
             continue
-        
-        earned = False
-        
-        # Check badge criteria
-        if badge.criteria_type == 'night_trips':
-            # Count trips between 10 PM - 5 AM with zero alerts
-            night_trips = [t for t in trips 
-                          if (t.timestamp.hour >= 22 or t.timestamp.hour < 5) 
-                          and t.alert_count == 0]
-            if len(night_trips) >= badge.criteria_value:
-                earned = True
-        
-        elif badge.criteria_type == 'long_safe_trip':
-            # Trip longer than criteria_value seconds with safety score > 90
-            for t in trips:
-                if t.duration_seconds >= badge.criteria_value:
-                    penalty = (t.alert_count * 3) + (t.yawn_count * 1)
-                    safety_score = max(0, min(100, 100 - penalty))
-                    if safety_score >= 90:
-                        earned = True
-                        break
-        
-        elif badge.criteria_type == 'zero_alert_trips':
-            zero_alert_trips = [t for t in trips if t.alert_count == 0]
-            if len(zero_alert_trips) >= badge.criteria_value:
-                earned = True
-        
-        elif badge.criteria_type == 'morning_trips':
-            # Count trips between 5 AM - 8 AM
-            morning_trips = [t for t in trips 
-                           if 5 <= t.timestamp.hour < 8]
-            if len(morning_trips) >= badge.criteria_value:
-                earned = True
-        
-        elif badge.criteria_type == 'streak_days':
-            streak = UserStreak.query.filter_by(user_id=user_id).first()
-            if streak and streak.longest_streak >= badge.criteria_value:
-                earned = True
-        
-        elif badge.criteria_type == 'high_safety_trips':
-            # Count trips with safety score >= 95
-            high_safety_count = 0
-            for t in trips:
-                penalty = (t.alert_count * 3) + (t.yawn_count * 1)
-                safety_score = max(0, min(100, 100 - penalty))
-                if safety_score >= 95:
-                    high_safety_count += 1
-            
-            if high_safety_count >= badge.criteria_value:
-                earned = True
-        
-        # Award badge
-        if earned:
-            user_badge = UserBadge(user_id=user_id, badge_id=badge.id)
-            db.session.add(user_badge)
-            
-            # Award bonus points
-            if badge.points_reward > 0:
-                user.points += badge.points_reward
-            
-            newly_earned.append({
+        if metrics[metric] >= achievement.criteria_value:
+            award_rows[UserAchievement].append({'user_id': user_id, 'achievement_id': achievement.id, 'earned_at': now})
+            newly_earned_achievements.append({
+                'name': achievement.name,
+                'description': achievement.description,
+                'icon': achievement.icon
+            })
+
+    newly_earned_badges = []
+    for badge in badges:
+        metric = BADGE_METRICS.get(badge.criteria_type)
+        if badge.id in earned_badge_ids or metric is None:
+            continue
+        if metrics[metric] >= badge.criteria_value:
+            award_rows[UserBadge].append({'user_id': user_id, 'badge_id': badge.id, 'earned_at': now})
+            bonus_points += badge.points_reward or 0
+            newly_earned_badges.append({
                 'name': badge.name,
                 'description': badge.description,
                 'icon': badge.icon,
                 'points_reward': badge.points_reward
             })
-    
-    if newly_earned:
-        db.session.commit()
-    
-    return newly_earned
 
-def update_user_challenges(user_id, trip=None):
-    """Update progress on active challenges"""
-    from datetime import datetime
-    
-    # Get all active challenges
-    now = datetime.utcnow()
-    active_challenges = Challenge.query.filter(
-        Challenge.is_active == True,
-        Challenge.start_date <= now,
-        Challenge.end_date >= now
-    ).all()
-    
     completed_challenges = []
-    
-    for challenge in active_challenges:
-        # Get or create user challenge record
-        user_challenge = UserChallenge.query.filter_by(
-            user_id=user_id,
-            challenge_id=challenge.id
-        ).first()
-        
-        if not user_challenge:
-            user_challenge = UserChallenge(user_id=user_id, challenge_id=challenge.id, progress=0)
-            db.session.add(user_challenge)
-        
-        # Skip if already completed
-        if user_challenge.completed:
+    progress_updates = []
+    for challenge in challenges:
+        user_challenge = user_challenges.get(challenge.id)
+        if user_challenge and user_challenge.completed:
             continue
-        
-        # Update progress based on challenge type
+        old_progress = user_challenge.progress if user_challenge else None
+        progress = old_progress or 0
+
         if challenge.criteria_type == 'zero_alert_trips':
-            # Count trips with zero alerts within challenge period
-            trips = Trip.query.filter(
-                Trip.user_id == user_id,
-                Trip.alert_count == 0,
-                Trip.timestamp >= challenge.start_date,
-                Trip.timestamp <= challenge.end_date
-            ).count()
-            user_challenge.progress = trips
-        
+            # Trips with zero alerts within the challenge period
+            progress = metrics[f'challenge_{challenge.id}']
         elif challenge.criteria_type == 'daily_trip':
-            # Check if user has a trip today
-            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            today_trips = Trip.query.filter(
-                Trip.user_id == user_id,
-                Trip.timestamp >= today_start
-            ).count()
-            user_challenge.progress = min(1, today_trips)
-        
-        elif challenge.criteria_type == 'high_safety_streak':
-            # Check consecutive days with 90+ safety score
-            # This is complex - for now just track days
-            user_challenge.progress = user_challenge.progress  # Placeholder
-        
-        # Check if challenge is completed
-        if user_challenge.progress >= challenge.criteria_value and not user_challenge.completed:
-            user_challenge.completed = True
-            user_challenge.completed_at = datetime.utcnow()
-            
-            # Award points
-            user = User.query.get(user_id)
-            user.points += challenge.points_reward
-            
+            progress = min(1, metrics['trips_today'])
+        # 'high_safety_streak' progress is not tracked yet
+
+        completed = progress >= challenge.criteria_value
+        values = {'progress': progress, 'completed': completed, 'completed_at': now if completed else None}
+        if user_challenge is None:
+            award_rows[UserChallenge].append({'user_id': user_id, 'challenge_id': challenge.id, **values})
+        elif completed or progress != old_progress:
+            progress_updates.append({'id': user_challenge.id, **values})
+
+        if completed:
+            bonus_points += challenge.points_reward
             completed_challenges.append({
                 'name': challenge.name,
                 'description': challenge.description,
                 'points_reward': challenge.points_reward
             })
-    
-    if completed_challenges:
+
+    # A concurrent evaluation that stored the same awards first makes these raise IntegrityError
+    for model, rows in award_rows.items():
+        if rows:
+            db.session.execute(db.insert(model), rows)
+    if progress_updates:
+        db.session.execute(db.update(UserChallenge), progress_updates)
+
+    if bonus_points:
+        user = db.session.get(User, user_id)
+        user.points = (user.points or 0) + bonus_points
+
+    return newly_earned_achievements, newly_earned_badges, completed_challenges
+
+# --- Trip Export / Import ---
+TRIP_EXPORT_COLUMNS = ['id', 'user_id', 'user_email', 'start_location', 'end_location',
+                       'duration_seconds', 'yawn_count', 'alert_count', 'timestamp']
+TRIP_IMPORT_COLUMNS = ['user_id', 'start_location', 'end_location', 'duration_seconds',
+                       'yawn_count', 'alert_count', 'timestamp']
+TRIP_EXPORT_BATCH_SIZE = 2000
+TRIP_IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_IMPORT_ERRORS = 100
+
+def export_trip_rows(user_id=None, email=None, since=None, until=None):
+    """Every trip matching the filters, oldest first, read through a server-side cursor"""
+    query = db.session.query(
+        Trip.id, Trip.user_id, User.email.label('user_email'), Trip.start_location, Trip.end_location,
+        Trip.duration_seconds, Trip.yawn_count, Trip.alert_count, Trip.timestamp
+    ).join(User, User.id == Trip.user_id)
+    if user_id is not None:
+        query = query.filter(Trip.user_id == user_id)
+    if email:
+        query = query.filter(User.email == email)
+    if since is not None:
+        query = query.filter(Trip.timestamp >= since)
+    if until is not None:
+        query = query.filter(Trip.timestamp < until)
+    query = query.order_by(Trip.timestamp, Trip.id)
+    return query.execution_options(stream_results=True, yield_per=TRIP_EXPORT_BATCH_SIZE)
+
+def format_trip_export(rows, fmt):
+    """Yield the export as text chunks of up to TRIP_EXPORT_BATCH_SIZE rows (fmt: csv or ndjson)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(TRIP_EXPORT_COLUMNS)
+    pending = 0
+    for row in rows:
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(TRIP_EXPORT_COLUMNS, values))) + '\n')
+        pending += 1
+        if pending >= TRIP_EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def read_trip_import(stream, fmt):
+    """Yield record dicts, tagged with their `__line__`, from a CSV (with header) or NDJSON text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            record['__line__'] = reader.line_num
+            yield record
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {'__error__': 'invalid JSON'}
+            if not isinstance(record, dict):
+                record = {'__error__': 'expected a JSON object'}
+            record['__line__'] = line_number
+            yield record
+
+class TripImporter:
+    """Validates and bulk-inserts imported trips, then updates rollups and awards once per user.
+
+    Rows name their driver by `user_email` (portable between systems) or `user_id`; the
+    account must already exist. Exported `id` columns are ignored. Rows are inserted with
+    COPY on PostgreSQL and executemany elsewhere, all in one transaction, so a failed import
+    leaves nothing behind and can simply be rerun.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self._users_by_email = {}
+        self._known_user_ids = set()
+        self._batch = []
+        self._points = {}   # user_id -> trip points earned by imported trips
+        self._daily = {}    # (user_id, day) -> [trips, duration, alerts, yawns]
+
+    def run(self, records):
+        pending = []
+        for record in records:
+            pending.append(record)
+            if len(pending) >= TRIP_IMPORT_BATCH_SIZE:
+                self._add_records(pending)
+                pending = []
+        self._add_records(pending)
+        self._flush()
+
+        if self.dry_run:
+            db.session.rollback()
+            return self.summary()
+        self._update_aggregates()
         db.session.commit()
-    
-    return completed_challenges
+        self._evaluate_rewards()
+        refresh_leaderboard()
+        return self.summary()
+
+    def summary(self):
+        return {
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'users': len(self._points),
+            'dry_run': self.dry_run,
+            'errors': self.errors
+        }
+
+    def _reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_IMPORT_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    @staticmethod
+    def _email(record):
+        # NDJSON values may be any JSON type; a non-string e-mail simply matches no user
+        return str(record.get('user_email') or '').strip()
+
+    def _resolve_users(self, records):
+        """Look up the batch's unknown e-mails and user ids with one query each"""
+        emails = {self._email(record) for record in records} - {''}
+        emails -= self._users_by_email.keys()
+        if emails:
+            for user_id, email in db.session.query(User.id, User.email).filter(User.email.in_(emails)):
+                self._users_by_email[email] = user_id
+        ids = set()
+        for record in records:
+            if not self._email(record) and str(record.get('user_id') or '').isdigit():
+                ids.add(int(record['user_id']))
+        ids -= self._known_user_ids
+        if ids:
+            self._known_user_ids.update(row[0] for row in db.session.query(User.id).filter(User.id.in_(ids)))
+
+    def _add_records(self, records):
+        if not records:
+            return
+        self._resolve_users(records)
+        for record in records:
+            line = record.get('__line__')
+            if '__error__' in record:
+                self._reject(line, record['__error__'])
+                continue
+            try:
+                row = self._validate(record)
+            except ValueError as e:
+                self._reject(line, str(e))
+                continue
+            self._batch.append(row)
+            self.imported += 1
+            self._account(row)
+            if len(self._batch) >= TRIP_IMPORT_BATCH_SIZE:
+                self._flush()
+
+    def _validate(self, record):
+        email = self._email(record)
+        if email:
+            user_id = self._users_by_email.get(email)
+            if user_id is None:
+                raise ValueError(f'unknown user_email {email}')
+        else:
+            raw_id = str(record.get('user_id') or '')
+            if not raw_id.isdigit() or int(raw_id) not in self._known_user_ids:
+                raise ValueError(f'unknown user_id {raw_id or "(missing)"}')
+            user_id = int(raw_id)
+
+        row = {'user_id': user_id}
+        for field in ('start_location', 'end_location'):
+            value = str(record.get(field) or '').strip()
+            if not value or len(value) > 200:
+                raise ValueError(f'{field} must be 1-200 characters')
+            row[field] = value
+        for field in ('duration_seconds', 'yawn_count', 'alert_count'):
+            value = record.get(field) or 0
+            if isinstance(value, str):  # CSV cells
+                try:
+                    value = int(value.strip())
+                except ValueError:
+                    value = None
+            elif isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f'{field} must be an integer')
+            row[field] = value
+            if row[field] < 0:
+                raise ValueError(f'{field} must not be negative')
+        if not record.get('timestamp'):
+            raise ValueError('timestamp is required')
+        row['timestamp'] = parse_iso_datetime(record['timestamp'])
+        return row
+
+    def _account(self, row):
+        points, _ = calculate_trip_points(row['duration_seconds'], row['alert_count'], row['yawn_count'])
+        self._points[row['user_id']] = self._points.get(row['user_id'], 0) + points
+        totals = self._daily.setdefault((row['user_id'], row['timestamp'].date()), [0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += row['duration_seconds']
+        totals[2] += row['alert_count']
+        totals[3] += row['yawn_count']
+
+    def _flush(self):
+        if not self._batch or self.dry_run:
+            self._batch = []
+            return
+        if db.engine.dialect.name == 'postgresql':
+            self._copy(self._batch)
+        else:
+            db.session.execute(db.insert(Trip), self._batch)  # executemany
+        self._batch = []
+
+    def _copy(self, rows):
+        """COPY ... FROM STDIN on the session's connection (same transaction)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column].isoformat() if column == 'timestamp' else row[column]
+                             for column in TRIP_IMPORT_COLUMNS])
+        buffer.seek(0)
+        quote = db.engine.dialect.identifier_preparer.quote
+        columns = ', '.join(quote(column) for column in TRIP_IMPORT_COLUMNS)
+        dbapi_connection = db.session.connection().connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {quote(Trip.__tablename__)} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+    def _update_aggregates(self):
+        """Rollups and points for the imported trips, once per user and day"""
+        for user_id, points in self._points.items():
+            rebuild_user_trip_stats(user_id)
+            User.query.filter_by(id=user_id).update(
+                {User.points: db.func.coalesce(User.points, 0) + points}, synchronize_session=False
+            )
+
+        names = ('trip_count', 'total_duration', 'total_alerts', 'total_yawns')
+        system_totals = {}
+        for (user_id, day), totals in self._daily.items():
+            apply_daily_deltas(UserDailyStats, {'user_id': user_id, 'day': day}, dict(zip(names, totals)))
+            day_totals = system_totals.setdefault(day, [0, 0, 0, 0])
+            for index, value in enumerate(totals):
+                day_totals[index] += value
+        for day, totals in system_totals.items():
+            apply_daily_deltas(DailyStats, {'day': day}, dict(zip(names, totals)))
+
+    def _evaluate_rewards(self):
+        """One reward evaluation per imported user instead of one per trip"""
+        for user_id in self._points:
+            try:
+                evaluate_user_rewards(user_id)
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent evaluation awarded the same rows first
+                db.session.rollback()
+
+# --- Background Workers ---
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_background_executor(name, max_workers):
+    """Named thread pool, created lazily so forked gunicorn workers each get their own"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=name)
+            _executors[name] = executor
+        return executor
+
+def run_in_app_context(flask_app, func, *args):
+    """Run func in a fresh app context (and DB session) on a background thread"""
+    with flask_app.app_context():
+        try:
+            return func(*args)
+        finally:
+            db.session.remove()
+
+# --- Background Reward Pipeline ---
+REWARD_JOB_MAX_ATTEMPTS = 3
+REWARD_JOB_STALE_AFTER = timedelta(minutes=5)  # 'running' jobs older than this were orphaned
+
+REWARD_LOCK_STRIPES = 64
+
+# Evaluations for one user never overlap in this process; users share a fixed set of locks
+_reward_user_locks = [threading.Lock() for _ in range(REWARD_LOCK_STRIPES)]
+_reward_sweeper = None
+_reward_sweeper_lock = threading.Lock()
+
+def enqueue_reward_job(user_id, trip_id):
+    """Add a pending reward job to the session; it is committed with the trip write"""
+    job = RewardJob(user_id=user_id, trip_id=trip_id, status='pending')
+    db.session.add(job)
+    return job
+
+def dispatch_reward_job(job_id):
+    """Hand a committed job to the configured processor"""
+    mode = current_app.config['REWARD_PROCESSING']
+    if mode == 'inline':
+        process_reward_job(job_id)
+    elif mode == 'thread':
+        executor = get_background_executor('reward-worker', current_app.config['REWARD_WORKER_THREADS'])
+        executor.submit(run_in_app_context, current_app._get_current_object(), process_reward_job, job_id)
+        start_reward_sweeper()
+    # 'queue': picked up by `flask process-reward-jobs`
+
+def requeue_stale_reward_jobs():
+    """Put 'running' jobs whose worker died mid-evaluation back in the queue"""
+    RewardJob.query.filter(
+        RewardJob.status == 'running',
+        RewardJob.started_at < datetime.utcnow() - REWARD_JOB_STALE_AFTER
+    ).update({RewardJob.status: 'pending'}, synchronize_session=False)
+    db.session.commit()
+
+def pending_reward_job_ids(limit, created_before=None):
+    query = db.session.query(RewardJob.id).filter_by(status='pending')
+    if created_before is not None:
+        query = query.filter(RewardJob.created_at < created_before)
+    return [row[0] for row in query.order_by(RewardJob.id).limit(limit).all()]
+
+def sweep_reward_jobs(batch_size=100):
+    """Re-dispatch jobs no worker is handling: retries after a failure and orphaned jobs.
+
+    Jobs created within the last sweep interval are skipped, as the request that
+    created them has just dispatched them. Claims are atomic, so processes sweeping
+    at the same time never evaluate a job twice. Returns the number dispatched.
+    """
+    requeue_stale_reward_jobs()
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['REWARD_SWEEP_SECONDS'])
+    job_ids = pending_reward_job_ids(batch_size, created_before=cutoff)
+    for job_id in job_ids:
+        dispatch_reward_job(job_id)
+    return len(job_ids)
+
+def run_reward_sweeper(flask_app, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            run_in_app_context(flask_app, sweep_reward_jobs)
+        except Exception:
+            logger.exception("Reward job sweep failed")
+
+def start_reward_sweeper():
+    """Start this process's sweeper thread on first dispatch (after any gunicorn fork)"""
+    global _reward_sweeper
+    interval = current_app.config['REWARD_SWEEP_SECONDS']
+    if interval <= 0 or (_reward_sweeper is not None and _reward_sweeper.is_alive()):
+        return
+    with _reward_sweeper_lock:
+        if _reward_sweeper is None or not _reward_sweeper.is_alive():
+            _reward_sweeper = threading.Thread(
+                target=run_reward_sweeper, args=(current_app._get_current_object(), interval),
+                name='reward-sweeper', daemon=True
+            )
+            _reward_sweeper.start()
+
+def process_reward_job(job_id):
+    """Claim a pending job, evaluate the user's rewards and store the outcome.
+
+    Returns False when the job was already claimed by another worker.
+    """
+    claimed = RewardJob.query.filter_by(id=job_id, status='pending').update({
+        RewardJob.status: 'running',
+        RewardJob.attempts: RewardJob.attempts + 1,
+        RewardJob.started_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return False
+
+    job = db.session.get(RewardJob, job_id)
+    # Serialize evaluations per user in this process so awards are not granted twice
+    with _reward_user_locks[job.user_id % REWARD_LOCK_STRIPES]:
+        try:
+            try:
+                achievements, badges, challenges = evaluate_user_rewards(job.user_id)
+                db.session.flush()
+            except IntegrityError:
+                # Another process awarded the same rows first; re-evaluate against them
+                db.session.rollback()
+                job = db.session.get(RewardJob, job_id)
+                achievements, badges, challenges = evaluate_user_rewards(job.user_id)
+            job.result = json.dumps({
+                'new_achievements': achievements,
+                'new_badges': badges,
+                'completed_challenges': challenges
+            })
+            job.status = 'done'
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(RewardJob, job_id)
+            job.status = 'failed' if job.attempts >= REWARD_JOB_MAX_ATTEMPTS else 'pending'
+            job.error = str(e)[:500]
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+    return True
+
+def reward_job_to_dict(job):
+    result = json.loads(job.result) if job.result else {}
+    return {
+        'id': job.id,
+        'trip_id': job.trip_id,
+        'status': job.status,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'new_achievements': result.get('new_achievements', []),
+        'new_badges': result.get('new_badges', []),
+        'completed_challenges': result.get('completed_challenges', [])
+    }
+
+
+# --- Authentication Cache ---
+class CurrentUser:
+    """Identity of the authenticated user (id, email, is_admin).
+
+    Routes that only need these never touch the database; reading or setting any
+    other attribute loads the full User row once per request and forwards to it.
+    """
+    __slots__ = ('id', 'email', 'is_admin', '_user')
+
+    def __init__(self, id, email, is_admin):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'email', email)
+        object.__setattr__(self, 'is_admin', is_admin)
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def user(self):
+        if self._user is None:
+            user = db.session.get(User, self.id)
+            if user is None:
+                # Deleted on another worker since the token was cached
+                abort(401)
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+
+class AuthCache:
+    """Size-bounded LRU of verified token -> (expiry, id, email, is_admin).
+
+    Entries live at most AUTH_CACHE_TTL_SECONDS and never past the token's own
+    expiry. Invalidation is per process; other workers catch up within the TTL.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return CurrentUser(*entry[1:])
+
+    def put(self, token, token_expiry, user):
+        ttl = current_app.config['AUTH_CACHE_TTL_SECONDS']
+        if ttl <= 0:
+            return
+        expires = min(time.time() + ttl, token_expiry or float('inf'))
+        with self._lock:
+            self._entries[token] = (expires, user.id, user.email, bool(user.is_admin))
+            self._entries.move_to_end(token)
+            while len(self._entries) > current_app.config['AUTH_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in [token for token, entry in self._entries.items() if entry[1] == user_id]:
+                del self._entries[token]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': current_app.config['AUTH_CACHE_SIZE'],
+                'ttl_seconds': current_app.config['AUTH_CACHE_TTL_SECONDS'],
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+auth_cache = AuthCache()
+
+def authenticate_request():
+    """Resolve the x-access-token header. Returns (CurrentUser, None) or (None, error response)"""
+    token = request.headers.get('x-access-token')
+    if not token:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
+    
+    current_user = auth_cache.get(token)
+    if current_user is not None:
+        return current_user, None
+    
+    import jwt  # Deferred: only needed once the token cache misses
+    try:
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+        user = User.query.filter_by(id=data['id']).first()
+        if user is None:
+            return None, (jsonify({'message': 'Token is invalid, user not found!'}), 401)
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired!'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message': 'Token is invalid!'}), 401)
+    except Exception:
+        return None, (jsonify({'message': 'An error occurred while processing the token.'}), 401)
+    
+    auth_cache.put(token, data.get('exp'), user)
+    current_user = CurrentUser(user.id, user.email, bool(user.is_admin))
+    object.__setattr__(current_user, '_user', user)
+    return current_user, None
 
 
 # --- Authentication Decorator ---
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'x-access-token' in request.headers:
-            token = request.headers['x-access-token']
-        
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-        
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['id']).first()
-            if current_user is None:
-                return jsonify({'message': 'Token is invalid, user not found!'}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired!'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Token is invalid!'}), 401
-        except Exception:
-            return jsonify({'message': 'An error occurred while processing the token.'}), 401
+        current_user, error = authenticate_request()
+        if error:
+            return error
         
         return f(current_user, *args, **kwargs)
     return decorated
@@ -618,33 +2121,18 @@ def token_required(f):
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'x-access-token' in request.headers:
-            token = request.headers['x-access-token']
-        
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-        
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['id']).first()
-            if current_user is None:
-                return jsonify({'message': 'Token is invalid, user not found!'}), 401
-            if not current_user.is_admin:
-                return jsonify({'message': 'Admin access required!'}), 403
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired!'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Token is invalid!'}), 401
-        except Exception:
-            return jsonify({'message': 'An error occurred while processing the token.'}), 401
+        current_user, error = authenticate_request()
+        if error:
+            return error
+        if not current_user.is_admin:
+            return jsonify({'message': 'Admin access required!'}), 403
         
         return f(current_user, *args, **kwargs)
     return decorated
 
 
 # --- API Routes ---
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json()
     
@@ -660,7 +2148,7 @@ def register():
     db.session.commit()
     return jsonify({'message': 'New user created!'}), 201
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
 
@@ -672,10 +2160,11 @@ def login():
     if not user or not check_password_hash(user.password, data['password']):
         return jsonify({'message': 'Login failed! Invalid credentials.'}), 401
     
+    import jwt
     token = jwt.encode({
         'id': user.id,
         'exp': datetime.utcnow() + timedelta(hours=24)
-    }, app.config['SECRET_KEY'], algorithm="HS256")
+    }, current_app.config['SECRET_KEY'], algorithm="HS256")
     
     return jsonify({
         'token': token,
@@ -683,7 +2172,7 @@ def login():
         'email': user.email
     })
 
-@app.route('/api/trips', methods=['POST'])
+@api.route('/api/trips', methods=['POST'])
 @token_required
 def save_trip(current_user):
     from datetime import date
@@ -698,7 +2187,11 @@ def save_trip(current_user):
         alert_count=data['alert_count']
     )
     db.session.add(new_trip)
-    db.session.commit()
+    db.session.flush()
+    update_user_trip_stats(
+        current_user.id, after=trip_stats_snapshot(new_trip),
+        trip_timestamp=new_trip.timestamp, day=new_trip.timestamp.date()
+    )
     
     # Calculate and award points
     points_earned, safety_score = calculate_trip_points(
@@ -707,20 +2200,17 @@ def save_trip(current_user):
         data['yawn_count']
     )
     current_user.points += points_earned
-    db.session.commit()
     
     # Update streak
     trip_date = new_trip.timestamp.date()
     current_streak = update_user_streak(current_user.id, trip_date)
     
-    # Check and award achievements
-    newly_earned_achievements = check_and_award_achievements(current_user.id)
+    # Achievements, badges and challenges are evaluated in the background
+    reward_job = enqueue_reward_job(current_user.id, new_trip.id)
     
-    # Check and award badges
-    newly_earned_badges = check_and_award_badges(current_user.id, new_trip)
-    
-    # Update challenges
-    completed_challenges = update_user_challenges(current_user.id, new_trip)
+    # Trip, rollup, points, streak and the reward job are written together
+    db.session.commit()
+    dispatch_reward_job(reward_job.id)
     
     return jsonify({
         'message': 'Trip saved successfully!',
@@ -729,52 +2219,133 @@ def save_trip(current_user):
         'total_points': current_user.points,
         'safety_score': safety_score,
         'current_streak': current_streak,
-        'new_achievements': newly_earned_achievements,
-        'new_badges': newly_earned_badges,
-        'completed_challenges': completed_challenges
-    })
-    newly_earned_achievements = check_and_award_achievements(current_user.id)
-    
-    return jsonify({
-        'message': 'Trip saved successfully!',
-        'trip_id': new_trip.id,  # Return trip_id for alert tracking
-        'points_earned': points_earned,
-        'total_points': current_user.points,
-        'safety_score': safety_score,
-        'new_achievements': newly_earned_achievements
+        'reward_job': {'id': reward_job.id, 'status': reward_job.status}
     })
 
-@app.route('/api/trips', methods=['GET'])
+# Fields a trip history response may select with ?fields=
+TRIP_FIELDS = {
+    'id': Trip.id,
+    'start_location': Trip.start_location,
+    'end_location': Trip.end_location,
+    'duration_seconds': Trip.duration_seconds,
+    'yawn_count': Trip.yawn_count,
+    'alert_count': Trip.alert_count,
+    'timestamp': Trip.timestamp
+}
+MAX_TRIP_PAGE_SIZE = 500
+TRIP_STREAM_BATCH_SIZE = 1000  # Rows fetched per round trip from the server-side cursor
+
+def parse_trip_bound(value):
+    """A from/to query value: a date (midnight) or an ISO datetime, as naive UTC"""
+    if len(value) == 10:
+        return datetime.combine(date.fromisoformat(value), datetime.min.time())
+    return parse_iso_datetime(value)
+
+def trip_row_to_dict(row, fields):
+    data = {}
+    for field in fields:
+        value = getattr(row, field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+@api.route('/api/trips', methods=['GET'])
 @token_required
 def get_trips(current_user):
-    trips = Trip.query.filter_by(user_id=current_user.id).all()
-    output = []
-    for trip in trips:
-        trip_data = {
-            'id': trip.id,
-            'start_location': trip.start_location,
-            'end_location': trip.end_location,
-            'duration_seconds': trip.duration_seconds,
-            'yawn_count': trip.yawn_count,
-            'alert_count': trip.alert_count,
-            'timestamp': trip.timestamp.isoformat()
-        }
-        output.append(trip_data)
+    """Trip history, newest first, one keyset-paginated page at a time.
+
+    Query params: limit (default 50, max 500), cursor (next_cursor from the previous page),
+    order (desc/asc on timestamp then id), from / to (date, inclusive, or ISO datetime),
+    min_alerts, fields (comma-separated subset of TRIP_FIELDS) and format=ndjson, which
+    streams every matching trip as one JSON object per line instead of a page.
+    """
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'message': 'Invalid order, expected asc or desc'}), 400
+    limit = min(MAX_TRIP_PAGE_SIZE, max(1, request.args.get('limit', 50, type=int)))
+    
+    fields = list(TRIP_FIELDS)
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in TRIP_FIELDS]
+        if unknown or not fields:
+            return jsonify({'message': f"Invalid fields, expected any of: {', '.join(TRIP_FIELDS)}"}), 400
+    
+    # The keyset columns are always selected so the cursor can be built
+    columns = {name: TRIP_FIELDS[name] for name in dict.fromkeys(fields + ['timestamp', 'id'])}
+    query = db.session.query(*[column.label(name) for name, column in columns.items()]).filter(
+        Trip.user_id == current_user.id
+    )
+    
+    try:
+        if request.args.get('from'):
+            query = query.filter(Trip.timestamp >= parse_trip_bound(request.args['from']))
+        date_to = request.args.get('to')
+        if date_to and len(date_to) == 10:
+            query = query.filter(Trip.timestamp < parse_trip_bound(date_to) + timedelta(days=1))  # Whole day
+        elif date_to:
+            query = query.filter(Trip.timestamp <= parse_trip_bound(date_to))
+    except ValueError:
+        return jsonify({'message': 'from and to must be dates (YYYY-MM-DD) or ISO datetimes'}), 400
+    
+    min_alerts = request.args.get('min_alerts', type=int)
+    if min_alerts:
+        query = query.filter(Trip.alert_count >= min_alerts)
+    
+    if request.args.get('cursor'):
+        try:
+            last_timestamp, last_id = decode_cursor(request.args['cursor'])
+            last_timestamp = datetime.fromisoformat(last_timestamp)
+        except (ValueError, TypeError):
+            return jsonify({'message': 'Invalid cursor'}), 400
+        key = db.tuple_(Trip.timestamp, Trip.id)
+        query = query.filter(key < (last_timestamp, last_id) if order == 'desc' else key > (last_timestamp, last_id))
+    
+    if order == 'desc':
+        query = query.order_by(Trip.timestamp.desc(), Trip.id.desc())
+    else:
+        query = query.order_by(Trip.timestamp.asc(), Trip.id.asc())
+    
+    if request.args.get('format') == 'ndjson':
+        rows = query.execution_options(stream_results=True, yield_per=TRIP_STREAM_BATCH_SIZE)
+        
+        def generate():
+            try:
+                for row in rows:
+                    yield json.dumps(trip_row_to_dict(row, fields)) + '\n'
+            finally:
+                db.session.remove()  # Return the streaming connection to the pool
+        
+        return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
-    return jsonify({'trips': output})
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([rows[-1].timestamp.isoformat(), rows[-1].id])
+    
+    return jsonify({
+        'trips': [trip_row_to_dict(row, fields) for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
 
-@app.route('/api/trips/<int:trip_id>', methods=['DELETE'])
+@api.route('/api/trips/<int:trip_id>', methods=['DELETE'])
 @token_required
 def delete_trip(current_user, trip_id):
     trip = Trip.query.filter_by(id=trip_id, user_id=current_user.id).first()
     if not trip:
         return jsonify({'message': 'Trip not found!'}), 404
 
+    before = trip_stats_snapshot(trip)
     db.session.delete(trip)
+    update_user_trip_stats(current_user.id, before=before, day=trip.timestamp.date())
     db.session.commit()
+    get_emergency_evaluator().forget(trip_id)
     return jsonify({'message': 'Trip deleted successfully!'})
 
-@app.route('/api/trips/<int:trip_id>', methods=['PUT'])
+@api.route('/api/trips/<int:trip_id>', methods=['PUT'])
 @token_required
 def update_trip(current_user, trip_id):
     """Update trip details (used to finalize trip data at trip end)"""
@@ -783,6 +2354,7 @@ def update_trip(current_user, trip_id):
         return jsonify({'message': 'Trip not found!'}), 404
     
     data = request.get_json()
+    before = trip_stats_snapshot(trip)
     
     # Update fields if provided
     if 'duration_seconds' in data:
@@ -792,7 +2364,7 @@ def update_trip(current_user, trip_id):
     if 'alert_count' in data:
         trip.alert_count = data['alert_count']
     
-    db.session.commit()
+    update_user_trip_stats(current_user.id, before=before, after=trip_stats_snapshot(trip), day=trip.timestamp.date())
     
     # Calculate and award points based on updated trip data
     points_earned, safety_score = calculate_trip_points(
@@ -801,20 +2373,17 @@ def update_trip(current_user, trip_id):
         trip.yawn_count
     )
     current_user.points += points_earned
-    db.session.commit()
     
     # Update streak
     trip_date = trip.timestamp.date()
     current_streak = update_user_streak(current_user.id, trip_date)
     
-    # Check and award achievements
-    newly_earned_achievements = check_and_award_achievements(current_user.id)
-    
-    # Check and award badges
-    newly_earned_badges = check_and_award_badges(current_user.id, trip)
+    # Achievements, badges and challenges are evaluated in the background
+    reward_job = enqueue_reward_job(current_user.id, trip.id)
     
-    # Update challenges
-    completed_challenges = update_user_challenges(current_user.id, trip)
+    # Trip, rollup, points, streak and the reward job are written together
+    db.session.commit()
+    dispatch_reward_job(reward_job.id)
     
     return jsonify({
         'message': 'Trip updated successfully!',
@@ -823,18 +2392,83 @@ def update_trip(current_user, trip_id):
         'total_points': current_user.points,
         'safety_score': safety_score,
         'current_streak': current_streak,
-        'new_achievements': newly_earned_achievements,
-        'new_badges': newly_earned_badges,
-        'completed_challenges': completed_challenges
+        'reward_job': {'id': reward_job.id, 'status': reward_job.status}
     })
 
-@app.route('/api/analytics/summary', methods=['GET'])
+@api.route('/api/trips/sync', methods=['POST'])
+@token_required
+def sync_trips(current_user):
+    """Upload complete or partial trips recorded offline, in one idempotent request.
+
+    Body: {"trips": [{"client_id": "<uuid>", "start_location": "...", "end_location": "...",
+    "started_at": "...", "duration_seconds": 0, "yawn_count": 0, "events": [{"alert_type":
+    "drowsy", "timestamp": "...", "idempotency_key": "..."}]}]}. The client_id identifies the
+    trip: uploading it again merges into the same trip, and events already stored are ignored,
+    so clients can retry or resend their whole outbox after losing connectivity.
+    """
+    data = request.get_json(silent=True) or {}
+    trips = data.get('trips')
+    if not isinstance(trips, list) or not trips:
+        return jsonify({'message': 'trips must be a non-empty list'}), 400
+    if len(trips) > MAX_SYNC_TRIPS:
+        return jsonify({'message': f'At most {MAX_SYNC_TRIPS} trips per request'}), 400
+    return apply_trip_sync(current_user, trips)
+
+@api.route('/api/trips/sync/<client_id>', methods=['PUT'])
+@token_required
+def sync_trip_by_client_id(current_user, client_id):
+    """Upload one trip (same record as in POST /api/trips/sync) under the client_id in the URL"""
+    return apply_trip_sync(current_user, [request.get_json(silent=True)], client_id=client_id)
+
+def apply_trip_sync(current_user, trips, client_id=None):
+    parsed = []
+    for index, data in enumerate(trips):
+        try:
+            parsed.append(parse_sync_trip(data, client_id))
+        except ValueError as e:
+            return jsonify({'message': str(e), 'index': index}), 400
+    if len({trip_client_id for trip_client_id, _, _ in parsed}) != len(parsed):
+        return jsonify({'message': 'Each client_id may appear only once per request'}), 400
+    
+    results = []
+    pending = []
+    try:
+        for trip_client_id, fields, events in parsed:
+            result, rows, old_count, reward_job = sync_trip(current_user, trip_client_id, fields, events)
+            results.append(result)
+            pending.append((result, rows, old_count, reward_job))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e), 'index': len(results)}), 400
+    except IntegrityError:
+        # A concurrent upload of the same events committed first
+        db.session.rollback()
+        return jsonify({'message': 'Conflicting concurrent upload, please retry'}), 409
+    
+    for result, rows, old_count, reward_job in pending:
+        if rows:
+            trip = db.session.get(Trip, result['trip_id'])
+            result['window_score'], result['emergency_notification_sent'] = notify_synced_alerts(
+                current_user, trip, rows, old_count
+            )
+        if reward_job:
+            dispatch_reward_job(reward_job.id)
+            result['reward_job'] = {'id': reward_job.id, 'status': reward_job.status}
+    
+    return jsonify({
+        'message': 'Trips synced',
+        'total_points': db.session.query(User.points).filter_by(id=current_user.id).scalar(),
+        'trips': results
+    })
+
+@api.route('/api/analytics/summary', methods=['GET'])
 @token_required
 def get_analytics_summary(current_user):
     """Get summary statistics for the user's trips"""
-    trips = Trip.query.filter_by(user_id=current_user.id).all()
+    stats = get_user_trip_stats(current_user.id)
     
-    if not trips:
+    if not stats.trip_count:
         return jsonify({
             'total_trips': 0,
             'total_duration': 0,
@@ -846,65 +2480,74 @@ def get_analytics_summary(current_user):
             'overall_safety_score': 100  # Perfect score when no trips
         })
     
-    total_duration = sum(trip.duration_seconds for trip in trips)
-    total_alerts = sum(trip.alert_count for trip in trips)
-    total_yawns = sum(trip.yawn_count for trip in trips)
-    
-    # Calculate overall safety score based on all trips
-    # Use average of individual trip scores for fairer calculation
-    if total_duration > 0:
-        trip_scores = []
-        for trip in trips:
-            if trip.duration_seconds > 0:
-                penalty = (trip.alert_count * 3) + (trip.yawn_count * 1)
-                trip_score = max(0, min(100, round(100 - penalty)))
-                trip_scores.append(trip_score)
-        
-        overall_safety_score = round(sum(trip_scores) / len(trip_scores)) if trip_scores else 100
-    else:
+    # Overall safety score is the average of individual trip scores (trips with duration > 0)
+    overall_safety_score = average_safety_score(stats)
+    if overall_safety_score is None:
         overall_safety_score = 100
     
     return jsonify({
-        'total_trips': len(trips),
-        'total_duration': total_duration,
-        'total_alerts': total_alerts,
-        'total_yawns': total_yawns,
-        'avg_alerts_per_trip': round(total_alerts / len(trips), 2),
-        'avg_yawns_per_trip': round(total_yawns / len(trips), 2),
-        'avg_duration_per_trip': round(total_duration / len(trips), 2),
+        'total_trips': stats.trip_count,
+        'total_duration': stats.total_duration,
+        'total_alerts': stats.total_alerts,
+        'total_yawns': stats.total_yawns,
+        'avg_alerts_per_trip': round(stats.total_alerts / stats.trip_count, 2),
+        'avg_yawns_per_trip': round(stats.total_yawns / stats.trip_count, 2),
+        'avg_duration_per_trip': round(stats.total_duration / stats.trip_count, 2),
         'overall_safety_score': overall_safety_score
     })
 
-@app.route('/api/analytics/trends', methods=['GET'])
+@api.route('/api/analytics/trends', methods=['GET'])
 @token_required
 def get_analytics_trends(current_user):
-    """Get trends data grouped by day, week, or month"""
+    """Get trends data grouped by day, week, or month.
+
+    Optional `from` / `to` (YYYY-MM-DD, inclusive) limit the range; empty periods inside
+    it are returned with zero counts and a null safety score.
+    """
     period = request.args.get('period', 'daily')  # daily, weekly, monthly
+    if period not in TREND_PERIODS:
+        return jsonify({'message': 'period must be daily, weekly or monthly'}), 400
     
-    trips = Trip.query.filter_by(user_id=current_user.id).order_by(Trip.timestamp).all()
-    
-    if not trips:
-        return jsonify({'labels': [], 'alerts': [], 'yawns': [], 'trips': [], 'safety_scores': []})
-    
-    from collections import defaultdict
-    grouped_data = defaultdict(lambda: {'alerts': 0, 'yawns': 0, 'trips': 0, 'duration': 0})
-    
-    for trip in trips:
-        if period == 'daily':
-            key = trip.timestamp.strftime('%Y-%m-%d')
-        elif period == 'weekly':
-            # Get ISO week number
-            key = trip.timestamp.strftime('%Y-W%W')
-        else:  # monthly
-            key = trip.timestamp.strftime('%Y-%m')
-        
-        grouped_data[key]['alerts'] += trip.alert_count
-        grouped_data[key]['yawns'] += trip.yawn_count
-        grouped_data[key]['trips'] += 1
-        grouped_data[key]['duration'] += trip.duration_seconds
-    
-    # Sort by date
-    sorted_keys = sorted(grouped_data.keys())
+    try:
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'message': 'from and to must be dates (YYYY-MM-DD)'}), 400
+    
+    empty = {'labels': [], 'alerts': [], 'yawns': [], 'trips': [], 'safety_scores': []}
+    
+    if date_from is None or date_to is None:
+        first_day, last_day = db.session.query(
+            db.func.min(UserDailyStats.day), db.func.max(UserDailyStats.day)
+        ).filter(UserDailyStats.user_id == current_user.id, UserDailyStats.trip_count > 0).one()
+        if first_day is None:
+            return jsonify(empty)
+        date_to = date_to or bucket_to_date(last_day)
+    
+    last_bucket = truncate_to_period(date_to, period)
+    first_bucket = truncate_to_period(date_from, period) if date_from else None
+    if first_bucket is None or count_buckets(first_bucket, last_bucket, period) > MAX_TREND_BUCKETS:
+        if date_from:
+            return jsonify({'message': f'Range spans more than {MAX_TREND_BUCKETS} {period} periods'}), 400
+        # Default range: the whole history, capped to the most recent periods
+        oldest = shift_bucket(last_bucket, period, -(MAX_TREND_BUCKETS - 1))
+        first_bucket = max(oldest, truncate_to_period(bucket_to_date(first_day), period))
+    if first_bucket > last_bucket:
+        return jsonify(empty)
+    
+    # At most one rollup row per day, however many trips the user has
+    bucket = trend_bucket_expression(UserDailyStats.day, period).label('bucket')
+    rows = db.session.query(
+        bucket,
+        db.func.sum(UserDailyStats.trip_count),
+        db.func.sum(UserDailyStats.total_alerts),
+        db.func.sum(UserDailyStats.total_yawns)
+    ).filter(
+        UserDailyStats.user_id == current_user.id,
+        UserDailyStats.day >= first_bucket,
+        UserDailyStats.day < shift_bucket(last_bucket, period, 1)
+    ).group_by(bucket).all()
+    totals = {bucket_to_date(row[0]): row[1:] for row in rows}
     
     labels = []
     alerts = []
@@ -912,23 +2555,22 @@ def get_analytics_trends(current_user):
     trip_counts = []
     safety_scores = []
     
-    for key in sorted_keys:
-        data = grouped_data[key]
-        labels.append(key)
-        alerts.append(data['alerts'])
-        yawns.append(data['yawns'])
-        trip_counts.append(data['trips'])
+    current = first_bucket
+    while current <= last_bucket:
+        trips, bucket_alerts, bucket_yawns = (int(value) for value in totals.get(current, (0, 0, 0)))
+        labels.append(current.strftime(TREND_PERIODS[period]))
+        alerts.append(int(bucket_alerts))
+        yawns.append(int(bucket_yawns))
+        trip_counts.append(trips)
         
         # Calculate average safety score for the period
-        if data['trips'] > 0:
+        if trips > 0:
             # Deduct 3 points per alert, 1 point per yawn (averaged per trip)
-            avg_alerts = data['alerts'] / data['trips']
-            avg_yawns = data['yawns'] / data['trips']
-            penalty = (avg_alerts * 3) + (avg_yawns * 1)
-            safety_score = max(0, min(100, round(100 - penalty)))
+            penalty = (int(bucket_alerts) * 3 + int(bucket_yawns)) / trips
+            safety_scores.append(max(0, min(100, round(100 - penalty))))
         else:
-            safety_score = 100
-        safety_scores.append(safety_score)
+            safety_scores.append(None)
+        current = shift_bucket(current, period, 1)
     
     return jsonify({
         'labels': labels,
@@ -938,71 +2580,64 @@ def get_analytics_trends(current_user):
         'safety_scores': safety_scores
     })
 
-@app.route('/api/leaderboard', methods=['GET'])
+@api.route('/api/leaderboard', methods=['GET'])
 @token_required
 def get_leaderboard(current_user):
-    """Get top 10 users by points and average safety score"""
-    users = User.query.all()
-    
-    leaderboard_data = []
-    for user in users:
-        trips = Trip.query.filter_by(user_id=user.id).all()
-        
-        # Calculate average safety score
-        if trips:
-            total_safety_score = 0
-            for trip in trips:
-                duration_hours = trip.duration_seconds / 3600
-                if duration_hours > 0:
-                    penalty = (trip.alert_count * 5 + trip.yawn_count * 2) / duration_hours
-                    safety_score = max(0, round(100 - penalty))
-                else:
-                    safety_score = 100
-                total_safety_score += safety_score
-            avg_safety_score = round(total_safety_score / len(trips), 1)
-        else:
-            avg_safety_score = 0
-        
-        # Generate display name from email
-        display_name = user.email.split('@')[0]
-        
-        leaderboard_data.append({
-            'user_id': user.id,
-            'display_name': display_name,
-            'points': user.points,
-            'avg_safety_score': avg_safety_score,
-            'total_trips': len(trips),
-            'is_current_user': user.id == current_user.id
-        })
-    
-    # Sort by points (descending) and get top 10
-    leaderboard_by_points = sorted(leaderboard_data, key=lambda x: x['points'], reverse=True)[:10]
-    
-    # Sort by avg safety score (descending) and get top 10
-    leaderboard_by_safety = sorted(leaderboard_data, key=lambda x: x['avg_safety_score'], reverse=True)[:10]
-    
-    return jsonify({
-        'by_points': leaderboard_by_points,
-        'by_safety_score': leaderboard_by_safety
-    })
+    """Get top users by points and average safety score, plus the caller's own rank"""
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(100, max(1, request.args.get('per_page', 10, type=int)))
+    return jsonify(build_leaderboard(current_user, page, per_page))
+
+def build_leaderboard(current_user, page=1, per_page=10):
+    offset = (page - 1) * per_page
+    
+    ensure_leaderboard_fresh()
+    own_entry = LeaderboardEntry.query.filter_by(user_id=current_user.id).first()
+    if own_entry is None:
+        # Caller registered after the last snapshot
+        ensure_leaderboard_fresh(force=True)
+        own_entry = LeaderboardEntry.query.filter_by(user_id=current_user.id).first()
+    
+    # Ranks are dense 1..N positions, so each page is an index range scan
+    by_points = LeaderboardEntry.query.filter(
+        LeaderboardEntry.points_rank > offset
+    ).order_by(LeaderboardEntry.points_rank).limit(per_page).all()
+    by_safety = LeaderboardEntry.query.filter(
+        LeaderboardEntry.safety_rank > offset
+    ).order_by(LeaderboardEntry.safety_rank).limit(per_page).all()
+    total_users = db.session.query(db.func.max(LeaderboardEntry.points_rank)).scalar() or 0
+    
+    current_user_rank = None
+    if own_entry:
+        current_user_rank = leaderboard_entry_to_dict(own_entry, own_entry.points_rank, current_user.id)
+        current_user_rank['safety_rank'] = own_entry.safety_rank
+    
+    return {
+        'by_points': [leaderboard_entry_to_dict(e, e.points_rank, current_user.id) for e in by_points],
+        'by_safety_score': [leaderboard_entry_to_dict(e, e.safety_rank, current_user.id) for e in by_safety],
+        'current_user': current_user_rank,
+        'page': page,
+        'per_page': per_page,
+        'total_users': total_users,
+        'refreshed_at': _leaderboard_refreshed_at.isoformat() if _leaderboard_refreshed_at else None
+    }
 
-@app.route('/api/achievements', methods=['GET'])
+@api.route('/api/achievements', methods=['GET'])
 @token_required
 def get_user_achievements(current_user):
     """Get all achievements and user's earned achievements"""
+    return jsonify(build_achievements(current_user))
+
+def build_achievements(current_user):
     all_achievements = Achievement.query.all()
     user_achievements = UserAchievement.query.filter_by(user_id=current_user.id).all()
     
-    earned_achievement_ids = {ua.achievement_id for ua in user_achievements}
+    earned_at_by_id = {ua.achievement_id: ua.earned_at for ua in user_achievements}
     
     achievements_list = []
     for achievement in all_achievements:
-        is_earned = achievement.id in earned_achievement_ids
-        earned_date = None
-        
-        if is_earned:
-            ua = next(ua for ua in user_achievements if ua.achievement_id == achievement.id)
-            earned_date = ua.earned_at.isoformat()
+        is_earned = achievement.id in earned_at_by_id
+        earned_date = earned_at_by_id[achievement.id].isoformat() if is_earned else None
         
         achievements_list.append({
             'id': achievement.id,
@@ -1013,43 +2648,39 @@ def get_user_achievements(current_user):
             'earned_at': earned_date
         })
     
-    return jsonify({
+    return {
         'achievements': achievements_list,
-        'total_earned': len(earned_achievement_ids),
+        'total_earned': len(earned_at_by_id),
         'total_available': len(all_achievements)
-    })
+    }
 
-@app.route('/api/user/stats', methods=['GET'])
+@api.route('/api/user/stats', methods=['GET'])
 @token_required
 def get_user_stats(current_user):
     """Get current user's points and basic stats"""
-    trips = Trip.query.filter_by(user_id=current_user.id).all()
+    return jsonify(build_user_stats(current_user))
+
+def build_user_stats(current_user):
+    stats = get_user_trip_stats(current_user.id)
     user_achievements = UserAchievement.query.filter_by(user_id=current_user.id).count()
     
-    # Calculate average safety score
-    if trips:
-        total_safety_score = 0
-        for trip in trips:
-            duration_hours = trip.duration_seconds / 3600
-            if duration_hours > 0:
-                penalty = (trip.alert_count * 5 + trip.yawn_count * 2) / duration_hours
-                safety_score = max(0, round(100 - penalty))
-            else:
-                safety_score = 100
-            total_safety_score += safety_score
-        avg_safety_score = round(total_safety_score / len(trips), 1)
+    # Average safety score across the user's trips
+    if stats.trip_count:
+        avg_safety_score = average_safety_score(stats, 1)
+        if avg_safety_score is None:
+            avg_safety_score = 100
     else:
         avg_safety_score = 0
     
-    return jsonify({
+    return {
         'points': current_user.points,
-        'total_trips': len(trips),
+        'total_trips': stats.trip_count,
         'achievements_earned': user_achievements,
         'avg_safety_score': avg_safety_score,
         'display_name': current_user.email.split('@')[0]
-    })
+    }
 
-@app.route('/api/contacts', methods=['POST'])
+@api.route('/api/contacts', methods=['POST'])
 @token_required
 def add_emergency_contact(current_user):
     """Add a new emergency contact (max 3 per user)"""
@@ -1090,7 +2721,7 @@ def add_emergency_contact(current_user):
         }
     }), 201
 
-@app.route('/api/contacts', methods=['GET'])
+@api.route('/api/contacts', methods=['GET'])
 @token_required
 def get_emergency_contacts(current_user):
     """Get all emergency contacts for the current user"""
@@ -1113,7 +2744,7 @@ def get_emergency_contacts(current_user):
         'max_allowed': 3
     })
 
-@app.route('/api/contacts/<int:contact_id>', methods=['DELETE'])
+@api.route('/api/contacts/<int:contact_id>', methods=['DELETE'])
 @token_required
 def delete_emergency_contact(current_user, contact_id):
     """Delete an emergency contact"""
@@ -1127,7 +2758,7 @@ def delete_emergency_contact(current_user, contact_id):
     
     return jsonify({'message': 'Emergency contact deleted successfully'})
 
-@app.route('/api/alert', methods=['POST'])
+@api.route('/api/alert', methods=['POST'])
 @token_required
 def log_alert(current_user):
     """Log real-time alert during trip and check if emergency notification should be sent"""
@@ -1136,8 +2767,9 @@ def log_alert(current_user):
     trip_id = data.get('trip_id')
     alert_type = data.get('alert_type')  # 'yawn' or 'drowsy'
     timestamp_str = data.get('timestamp')
+    idempotency_key = data.get('idempotency_key')
     
-    print(f"🔔 Alert received: trip_id={trip_id}, alert_type={alert_type}")
+    logger.info("Alert received", extra={'user_id': current_user.id, 'trip_id': trip_id, 'alert_type': alert_type, 'sample': True})
     
     if not trip_id:
         return jsonify({'message': 'trip_id is required'}), 400
@@ -1145,77 +2777,215 @@ def log_alert(current_user):
     # Get the trip
     trip = Trip.query.filter_by(id=trip_id, user_id=current_user.id).first()
     if not trip:
-        print(f"❌ Trip not found: {trip_id}")
+        logger.warning("Alert for unknown trip", extra={'user_id': current_user.id, 'trip_id': trip_id})
         return jsonify({'message': 'Trip not found'}), 404
     
-    # Increment the trip's alert count in real-time
-    trip.alert_count += 1
-    db.session.commit()
-    
-    current_alert_count = trip.alert_count
-    
-    print(f"📊 Current alert count for trip {trip_id}: {current_alert_count}")
+    duplicate = {
+        'message': 'Duplicate alert ignored',
+        'emergency_notification_sent': False
+    }
     
-    # Threshold: Exactly 6 alerts triggers emergency notification (first time exceeding 5)
-    # This ensures email is sent only ONCE when threshold is crossed
+    # Persist the event, then increment the trip's alert count in real-time
+    try:
+        rows, _ = record_alert_events(trip, [{
+            'alert_type': alert_type,
+            'timestamp': timestamp_str,
+            'idempotency_key': idempotency_key
+        }])
+        if not rows:
+            return jsonify({**duplicate, 'current_alert_count': trip.alert_count})
+        
+        old_alert_count, current_alert_count = increment_trip_alerts(trip, 1)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except IntegrityError:
+        # A concurrent request with the same idempotency key stored it first
+        db.session.rollback()
+        db.session.refresh(trip, ['alert_count'])
+        return jsonify({**duplicate, 'current_alert_count': trip.alert_count})
+    window_score, fired = evaluate_emergency(trip, rows, old_alert_count)
+    
+    logger.info("Alert counted", extra={'user_id': current_user.id, 'trip_id': trip_id, 'alert_count': current_alert_count,
+                                          'window_score': window_score, 'sample': True})
+    
+    # Only the alert that takes the windowed score to the threshold triggers the
+    # emergency notification, and deliveries are deduplicated per trip, so the
+    # email is sent only ONCE per trip
     emergency_notification_sent = False
     
-    if current_alert_count == 6:  # Changed from > 5 to == 6
-        print(f"⚠️ Alert threshold exceeded (6 alerts)! Sending emergency notification...")
-        
+    if fired:
         # Check if user has emergency contacts
-        contacts = EmergencyContact.query.filter_by(user_id=current_user.id).all()
-        print(f"👥 Found {len(contacts)} emergency contacts")
+        contact_count = EmergencyContact.query.filter_by(user_id=current_user.id).count()
+        logger.warning("Emergency threshold reached", extra={
+            'user_id': current_user.id, 'trip_id': trip_id, 'window_score': window_score,
+            'window_minutes': current_app.config['EMERGENCY_WINDOW_MINUTES'], 'contacts': contact_count
+        })
         
-        if not contacts:
-            print(f"❌ No emergency contacts found for user {current_user.email}")
+        if not contact_count:
             return jsonify({
                 'message': 'Alert logged, but no emergency contacts configured',
                 'emergency_notification_sent': False,
-                'current_alert_count': current_alert_count
+                'current_alert_count': current_alert_count,
+                'window_score': window_score
             })
         
-        # Send emergency notification
-        success = send_emergency_notification(
-            user=current_user,
-            alert_count=current_alert_count,
-            trip_start_location=trip.start_location,
-            trip_end_location=trip.end_location
-        )
-        emergency_notification_sent = success
+        # Queue emergency notification; delivery happens on the sender pool
+        queued = queue_emergency_notification(current_user, trip, current_alert_count)
+        emergency_notification_sent = queued > 0
         
-        if success:
-            print(f"✅ Emergency notification sent! Trip ID: {trip_id}, Alerts: {current_alert_count}")
-        else:
-            print(f"❌ Failed to send emergency notification")
-    elif current_alert_count > 6:
-        print(f"⏭️  Alert #{current_alert_count} - notification already sent at alert #6")
+        logger.info("Emergency notification queued" if queued else "No emergency notification queued (no e-mail contacts or already notified)",
+                    extra={'user_id': current_user.id, 'trip_id': trip_id, 'queued': queued, 'alert_count': current_alert_count})
     
     return jsonify({
         'message': 'Alert logged',
         'emergency_notification_sent': emergency_notification_sent,
-        'current_alert_count': current_alert_count
+        'current_alert_count': current_alert_count,
+        'window_score': window_score
     })
 
+@api.route('/api/alerts/batch', methods=['POST'])
+@token_required
+def log_alert_batch(current_user):
+    """Ingest many alert events in one request.
+
+    Body: {"trip_id": 1, "events": [{"alert_type": "drowsy", "timestamp": "...",
+    "idempotency_key": "..."}, ...]}. An event may carry its own trip_id. Events whose
+    idempotency_key was already stored for the trip are ignored, so clients can safely
+    retry a whole batch.
+    """
+    data = request.get_json() or {}
+    events = data.get('events')
+    
+    if not isinstance(events, list) or not events:
+        return jsonify({'message': 'events must be a non-empty list'}), 400
+    if len(events) > MAX_ALERT_BATCH_SIZE:
+        return jsonify({'message': f'At most {MAX_ALERT_BATCH_SIZE} events per batch'}), 400
+    
+    events_by_trip = {}
+    for event in events:
+        if not isinstance(event, dict):
+            return jsonify({'message': 'Each event must be an object'}), 400
+        trip_id = event.get('trip_id', data.get('trip_id'))
+        if not trip_id:
+            return jsonify({'message': 'trip_id is required'}), 400
+        try:
+            trip_id = int(trip_id)
+        except (TypeError, ValueError):
+            return jsonify({'message': 'trip_id must be an integer'}), 400
+        events_by_trip.setdefault(trip_id, []).append(event)
+    
+    trips = {trip.id: trip for trip in Trip.query.filter(
+        Trip.id.in_(list(events_by_trip)),
+        Trip.user_id == current_user.id
+    )}
+    missing = [trip_id for trip_id in events_by_trip if trip_id not in trips]
+    if missing:
+        return jsonify({'message': 'Trip not found', 'trip_ids': missing}), 404
+    
+    results = []
+    accepted_rows = []
+    try:
+        for trip_id, trip_events in events_by_trip.items():
+            trip = trips[trip_id]
+            rows, duplicates = record_alert_events(trip, trip_events)
+            old_count = new_count = trip.alert_count
+            if rows:
+                old_count, new_count = increment_trip_alerts(trip, len(rows))
+                accepted_rows.append((trip, rows, old_count))
+            results.append({
+                'trip_id': trip_id,
+                'accepted': len(rows),
+                'duplicates': duplicates,
+                'current_alert_count': new_count,
+                'emergency_notification_sent': False
+            })
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except IntegrityError:
+        # A concurrent retry stored some of these idempotency keys first
+        db.session.rollback()
+        return jsonify({'message': 'Conflicting concurrent batch, please retry'}), 409
+    
+    # Evaluate and notify only after the events are committed
+    for trip, rows, old_count in accepted_rows:
+        window_score, fired = evaluate_emergency(trip, rows, old_count)
+        queued = queue_emergency_notification(current_user, trip, trip.alert_count) if fired else 0
+        for result in results:
+            if result['trip_id'] == trip.id:
+                result['window_score'] = window_score
+                result['emergency_notification_sent'] = queued > 0
+    
+    return jsonify({
+        'message': 'Alerts logged',
+        'accepted': sum(r['accepted'] for r in results),
+        'duplicates': sum(r['duplicates'] for r in results),
+        'trips': results
+    })
+
+@api.route('/api/trips/<int:trip_id>/alerts', methods=['GET'])
+@token_required
+def get_trip_alerts(current_user, trip_id):
+    """Alert timeline for a trip.
+
+    Query params: since_minutes (only the last N minutes), bucket_seconds (also return
+    per-bucket counts by type) and limit (max 5000 events).
+    """
+    trip = Trip.query.filter_by(id=trip_id, user_id=current_user.id).first()
+    if not trip:
+        return jsonify({'message': 'Trip not found'}), 404
+    
+    since_minutes = request.args.get('since_minutes', type=float)
+    bucket_seconds = request.args.get('bucket_seconds', type=int)
+    limit = min(5000, max(1, request.args.get('limit', 1000, type=int)))
+    since = datetime.utcnow() - timedelta(minutes=since_minutes) if since_minutes else None
+    
+    events = get_trip_alert_timeline(trip.id, since=since, limit=limit)
+    response = {
+        'trip_id': trip.id,
+        'alert_count': trip.alert_count,
+        'events': [{
+            'id': event.id,
+            'alert_type': event.alert_type,
+            'occurred_at': event.occurred_at.isoformat()
+        } for event in events]
+    }
+    
+    if bucket_seconds and bucket_seconds > 0 and events:
+        origin = since or events[0].occurred_at
+        buckets = {}
+        for event in events:
+            index = int((event.occurred_at - origin).total_seconds() // bucket_seconds)
+            bucket = buckets.setdefault(index, {'yawn': 0, 'drowsy': 0})
+            bucket[event.alert_type] = bucket.get(event.alert_type, 0) + 1
+        response['buckets'] = [{
+            'start': (origin + timedelta(seconds=index * bucket_seconds)).isoformat(),
+            'counts': counts
+        } for index, counts in sorted(buckets.items())]
+    
+    return jsonify(response)
+
 # ==================== GAMIFICATION ENDPOINTS ====================
 
-@app.route('/api/gamification/badges', methods=['GET'])
+@api.route('/api/gamification/badges', methods=['GET'])
 @token_required
 def get_user_badges(current_user):
     """Get all badges and user's earned badges"""
+    return jsonify(build_badges(current_user))
+
+def build_badges(current_user):
     all_badges = Badge.query.filter_by(is_active=True).all()
     user_badges = UserBadge.query.filter_by(user_id=current_user.id).all()
     
-    earned_badge_ids = {ub.badge_id for ub in user_badges}
+    earned_at_by_id = {ub.badge_id: ub.earned_at for ub in user_badges}
     
     badges_list = []
     for badge in all_badges:
-        is_earned = badge.id in earned_badge_ids
-        earned_date = None
-        
-        if is_earned:
-            ub = next(ub for ub in user_badges if ub.badge_id == badge.id)
-            earned_date = ub.earned_at.isoformat()
+        is_earned = badge.id in earned_at_by_id
+        earned_date = earned_at_by_id[badge.id].isoformat() if is_earned else None
         
         badges_list.append({
             'id': badge.id,
@@ -1227,18 +2997,19 @@ def get_user_badges(current_user):
             'earned_at': earned_date
         })
     
-    return jsonify({
+    return {
         'badges': badges_list,
-        'total_earned': len(earned_badge_ids),
+        'total_earned': len(earned_at_by_id),
         'total_available': len(all_badges)
-    })
+    }
 
-@app.route('/api/gamification/challenges', methods=['GET'])
+@api.route('/api/gamification/challenges', methods=['GET'])
 @token_required
 def get_user_challenges(current_user):
     """Get all active challenges and user's progress"""
-    from datetime import datetime
-    
+    return jsonify(build_challenges(current_user))
+
+def build_challenges(current_user):
     now = datetime.utcnow()
     active_challenges = Challenge.query.filter(
         Challenge.is_active == True,
@@ -1246,12 +3017,16 @@ def get_user_challenges(current_user):
         Challenge.end_date >= now
     ).all()
     
+    progress_by_challenge = {}
+    if active_challenges:
+        progress_by_challenge = {uc.challenge_id: uc for uc in UserChallenge.query.filter(
+            UserChallenge.user_id == current_user.id,
+            UserChallenge.challenge_id.in_([challenge.id for challenge in active_challenges])
+        )}
+    
     challenges_list = []
     for challenge in active_challenges:
-        user_challenge = UserChallenge.query.filter_by(
-            user_id=current_user.id,
-            challenge_id=challenge.id
-        ).first()
+        user_challenge = progress_by_challenge.get(challenge.id)
         
         progress = user_challenge.progress if user_challenge else 0
         completed = user_challenge.completed if user_challenge else False
@@ -1271,12 +3046,15 @@ def get_user_challenges(current_user):
             'completed_at': completed_at
         })
     
-    return jsonify({'challenges': challenges_list})
+    return {'challenges': challenges_list}
 
-@app.route('/api/gamification/store', methods=['GET'])
+@api.route('/api/gamification/store', methods=['GET'])
 @token_required
 def get_store_items(current_user):
     """Get all available store items"""
+    return jsonify(build_store(current_user))
+
+def build_store(current_user):
     items = StoreItem.query.filter_by(is_active=True).all()
     
     items_list = []
@@ -1299,12 +3077,12 @@ def get_store_items(current_user):
             'in_stock': in_stock
         })
     
-    return jsonify({
+    return {
         'items': items_list,
         'user_points': current_user.points
-    })
+    }
 
-@app.route('/api/gamification/redeem', methods=['POST'])
+@api.route('/api/gamification/redeem', methods=['POST'])
 @token_required
 def redeem_store_item(current_user):
     """Redeem a store item with points"""
@@ -1351,31 +3129,39 @@ def redeem_store_item(current_user):
         'redemption_id': redemption.id
     })
 
-@app.route('/api/gamification/streak', methods=['GET'])
+@api.route('/api/gamification/streak', methods=['GET'])
 @token_required
 def get_user_streak(current_user):
     """Get user's current streak information"""
+    return jsonify(build_streak(current_user))
+
+def build_streak(current_user):
     streak = UserStreak.query.filter_by(user_id=current_user.id).first()
     
     if not streak:
-        return jsonify({
+        return {
             'current_streak': 0,
             'longest_streak': 0,
             'last_trip_date': None
-        })
+        }
     
-    return jsonify({
+    return {
         'current_streak': streak.current_streak,
         'longest_streak': streak.longest_streak,
         'last_trip_date': streak.last_trip_date.isoformat() if streak.last_trip_date else None,
         'updated_at': streak.updated_at.isoformat()
-    })
+    }
 
-@app.route('/api/gamification/redemptions', methods=['GET'])
+@api.route('/api/gamification/redemptions', methods=['GET'])
 @token_required
 def get_user_redemptions(current_user):
     """Get user's redemption history"""
-    redemptions = Redemption.query.filter_by(user_id=current_user.id).order_by(Redemption.redeemed_at.desc()).all()
+    return jsonify(build_redemptions(current_user))
+
+def build_redemptions(current_user):
+    redemptions = Redemption.query.options(db.joinedload(Redemption.store_item)).filter_by(
+        user_id=current_user.id
+    ).order_by(Redemption.redeemed_at.desc()).all()
     
     redemptions_list = []
     for redemption in redemptions:
@@ -1388,24 +3174,75 @@ def get_user_redemptions(current_user):
             'redeemed_at': redemption.redeemed_at.isoformat()
         })
     
-    return jsonify({'redemptions': redemptions_list})
+    return {'redemptions': redemptions_list}
+
+REWARDS_DASHBOARD_SECTIONS = {
+    'achievements': build_achievements,
+    'badges': build_badges,
+    'challenges': build_challenges,
+    'store': build_store,
+    'streak': build_streak,
+    'leaderboard': build_leaderboard,
+    'stats': build_user_stats,
+    'redemptions': build_redemptions
+}
+
+@api.route('/api/gamification/dashboard', methods=['GET'])
+@token_required
+def get_rewards_dashboard(current_user):
+    """Everything the Rewards page shows, in one request.
+
+    `fields` is a comma-separated subset of REWARDS_DASHBOARD_SECTIONS (default: all);
+    each section has the same shape as its standalone endpoint.
+    """
+    fields = request.args.get('fields')
+    names = [name.strip() for name in fields.split(',') if name.strip()] if fields else list(REWARDS_DASHBOARD_SECTIONS)
+    unknown = [name for name in names if name not in REWARDS_DASHBOARD_SECTIONS]
+    if unknown:
+        return jsonify({'message': f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    return jsonify({name: REWARDS_DASHBOARD_SECTIONS[name](current_user) for name in names})
+
+@api.route('/api/rewards/jobs/<int:job_id>', methods=['GET'])
+@token_required
+def get_reward_job(current_user, job_id):
+    """Poll the outcome of the reward evaluation queued by a trip save/update"""
+    job = RewardJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'message': 'Reward job not found'}), 404
+    
+    return jsonify(reward_job_to_dict(job))
+
+@api.route('/api/rewards/jobs', methods=['GET'])
+@token_required
+def get_reward_jobs(current_user):
+    """List the user's most recent reward jobs, newest first (optionally ?status=pending)"""
+    query = RewardJob.query.filter_by(user_id=current_user.id)
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    limit = min(50, max(1, request.args.get('limit', 10, type=int)))
+    jobs = query.order_by(RewardJob.id.desc()).limit(limit).all()
+    
+    return jsonify({'jobs': [reward_job_to_dict(job) for job in jobs]})
 
 # ==================== ADMIN ENDPOINTS ====================
 
-@app.route('/api/admin/stats', methods=['GET'])
+@api.route('/api/admin/stats', methods=['GET'])
 @admin_required
 def get_admin_stats(current_user):
     """Get system-wide statistics for admin dashboard"""
     total_users = User.query.count()
-    total_trips = Trip.query.count()
-    total_alerts = db.session.query(db.func.sum(Trip.alert_count)).scalar() or 0
-    total_yawns = db.session.query(db.func.sum(Trip.yawn_count)).scalar() or 0
-    total_duration = db.session.query(db.func.sum(Trip.duration_seconds)).scalar() or 0
-    
-    # Recent activity - since Trip doesn't have created_at, we'll show 0
-    # You can add created_at column to Trip later if needed
-    recent_trips = 0
+    # One row per day in the system-wide rollup, regardless of trip volume
+    total_trips, total_alerts, total_yawns, total_duration = (int(value) for value in db.session.query(
+        db.func.coalesce(db.func.sum(DailyStats.trip_count), 0),
+        db.func.coalesce(db.func.sum(DailyStats.total_alerts), 0),
+        db.func.coalesce(db.func.sum(DailyStats.total_yawns), 0),
+        db.func.coalesce(db.func.sum(DailyStats.total_duration), 0)
+    ).one())
+    
+    # Recent activity
     one_day_ago = datetime.utcnow() - timedelta(days=1)
+    recent_trips = Trip.query.filter(Trip.timestamp >= one_day_ago).count()
     try:
         recent_users = User.query.filter(User.created_at >= one_day_ago).count()
     except:
@@ -1421,54 +3258,106 @@ def get_admin_stats(current_user):
         'recent_users_24h': recent_users
     })
 
-@app.route('/api/admin/users', methods=['GET'])
+@api.route('/api/admin/users', methods=['GET'])
 @admin_required
 def get_all_users(current_user):
-    """Get all users with their statistics"""
-    users = User.query.all()
+    """List users with their statistics, one keyset-paginated page at a time.
+
+    Query params: sort (points, safety_score, trips, alerts, created_at), order (asc/desc),
+    email (prefix filter), limit (max 200) and cursor (next_cursor from the previous page).
+    """
+    sort = request.args.get('sort', 'created_at')
+    order = request.args.get('order', 'desc')
+    limit = min(200, max(1, request.args.get('limit', 50, type=int)))
+    email_prefix = request.args.get('email', '').strip()
+    
+    contacts = db.session.query(
+        EmergencyContact.user_id.label('user_id'),
+        db.func.count(EmergencyContact.id).label('contact_count')
+    ).group_by(EmergencyContact.user_id).subquery()
+    
+    sort_columns = {
+        'points': db.func.coalesce(User.points, 0),
+        'safety_score': db.case(
+            (UserTripStats.scored_trip_count > 0,
+             UserTripStats.safety_score_sum * 1.0 / UserTripStats.scored_trip_count),
+            else_=100.0
+        ),
+        'trips': db.func.coalesce(UserTripStats.trip_count, 0),
+        'alerts': db.func.coalesce(UserTripStats.total_alerts, 0),
+        'created_at': db.func.coalesce(User.created_at, datetime(1970, 1, 1))
+    }
+    if sort not in sort_columns:
+        return jsonify({'message': f"Invalid sort, expected one of: {', '.join(sort_columns)}"}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'message': 'Invalid order, expected asc or desc'}), 400
+    sort_column = sort_columns[sort]
+    
+    query = db.session.query(
+        User, UserTripStats, db.func.coalesce(contacts.c.contact_count, 0), sort_column
+    ).outerjoin(
+        UserTripStats, UserTripStats.user_id == User.id
+    ).outerjoin(
+        contacts, contacts.c.user_id == User.id
+    )
+    
+    if email_prefix:
+        query = query.filter(User.email.startswith(email_prefix, autoescape=True))
+    
+    if request.args.get('cursor'):
+        try:
+            last_value, last_id = decode_cursor(request.args['cursor'])
+            if sort == 'created_at':
+                last_value = datetime.fromisoformat(last_value)
+        except (ValueError, TypeError):
+            return jsonify({'message': 'Invalid cursor'}), 400
+        key = db.tuple_(sort_column, User.id)
+        query = query.filter(key < (last_value, last_id) if order == 'desc' else key > (last_value, last_id))
+    
+    if order == 'desc':
+        query = query.order_by(sort_column.desc(), User.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), User.id.asc())
+    
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
     users_data = []
-    for user in users:
-        trips = Trip.query.filter_by(user_id=user.id).all()
-        
-        # Calculate user stats
-        total_trips = len(trips)
-        total_alerts = sum(trip.alert_count for trip in trips)
-        total_yawns = sum(trip.yawn_count for trip in trips)
-        total_duration = sum(trip.duration_seconds for trip in trips)
-        
+    for user, stats, emergency_contacts_count, _ in rows:
         # Calculate safety score
-        if total_trips > 0:
-            trip_scores = []
-            for trip in trips:
-                if trip.duration_seconds > 0:
-                    penalty = (trip.alert_count * 3) + (trip.yawn_count * 1)
-                    trip_score = max(0, min(100, round(100 - penalty)))
-                    trip_scores.append(trip_score)
-            safety_score = round(sum(trip_scores) / len(trip_scores)) if trip_scores else 100
-        else:
+        safety_score = average_safety_score(stats)
+        if safety_score is None:
             safety_score = 100
         
-        # Get emergency contacts count
-        emergency_contacts_count = EmergencyContact.query.filter_by(user_id=user.id).count()
-        
         users_data.append({
             'id': user.id,
             'email': user.email,
             'is_admin': user.is_admin,
             'points': user.points,
             'created_at': user.created_at.isoformat() if user.created_at else None,
-            'total_trips': total_trips,
-            'total_alerts': total_alerts,
-            'total_yawns': total_yawns,
-            'total_duration': total_duration,
+            'total_trips': stats.trip_count if stats else 0,
+            'total_alerts': stats.total_alerts if stats else 0,
+            'total_yawns': stats.total_yawns if stats else 0,
+            'total_duration': stats.total_duration if stats else 0,
             'safety_score': safety_score,
             'emergency_contacts': emergency_contacts_count
         })
     
-    return jsonify({'users': users_data})
+    next_cursor = None
+    if has_more:
+        last_value = rows[-1][3]
+        if isinstance(last_value, datetime):
+            last_value = last_value.isoformat()
+        next_cursor = encode_cursor([last_value, rows[-1][0].id])
+    
+    return jsonify({
+        'users': users_data,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
 
-@app.route('/api/admin/users/<int:user_id>', methods=['GET'])
+@api.route('/api/admin/users/<int:user_id>', methods=['GET'])
 @admin_required
 def get_user_details(current_user, user_id):
     """Get detailed information about a specific user"""
@@ -1516,7 +3405,7 @@ def get_user_details(current_user, user_id):
         'emergency_contacts': contacts_data
     })
 
-@app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
+@api.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
 @admin_required
 def delete_user(current_user, user_id):
     """Delete a user and all their data"""
@@ -1529,10 +3418,11 @@ def delete_user(current_user, user_id):
     
     db.session.delete(user)
     db.session.commit()
+    auth_cache.invalidate_user(user_id)
     
     return jsonify({'message': 'User deleted successfully'})
 
-@app.route('/api/admin/users/<int:user_id>/toggle-admin', methods=['PUT'])
+@api.route('/api/admin/users/<int:user_id>/toggle-admin', methods=['PUT'])
 @admin_required
 def toggle_admin(current_user, user_id):
     """Toggle admin status for a user"""
@@ -1542,16 +3432,135 @@ def toggle_admin(current_user, user_id):
     
     user.is_admin = not user.is_admin
     db.session.commit()
+    auth_cache.invalidate_user(user_id)
     
     return jsonify({
         'message': f'User admin status updated to {user.is_admin}',
         'is_admin': user.is_admin
     })
 
+@api.route('/api/admin/auth-cache', methods=['GET'])
+@admin_required
+def get_auth_cache_stats(current_user):
+    """Hit/miss counters of this worker's token cache, for sizing AUTH_CACHE_*"""
+    return jsonify(auth_cache.stats())
+
+@api.route('/api/admin/trips/export', methods=['GET'])
+@admin_required
+def export_trips(current_user):
+    """Stream trips as CSV (default) or NDJSON with constant memory.
+
+    Query params: format (csv/ndjson), user_id, email, from / to (YYYY-MM-DD, inclusive).
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'message': 'format must be csv or ndjson'}), 400
+    try:
+        since = parse_trip_bound(request.args['from']) if request.args.get('from') else None
+        until = parse_trip_bound(request.args['to']) + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'message': 'from and to must be dates (YYYY-MM-DD)'}), 400
+    
+    rows = export_trip_rows(request.args.get('user_id', type=int), request.args.get('email'), since, until)
+    
+    def generate():
+        try:
+            yield from format_trip_export(rows, fmt)
+        finally:
+            db.session.remove()  # Return the streaming connection to the pool
+    
+    response = current_app.response_class(
+        stream_with_context(generate()), mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename=driveguard-trips.{fmt}'
+    return response
+
+@api.route('/api/admin/trips/import', methods=['POST'])
+@admin_required
+def import_trips(current_user):
+    """Bulk-load trips from the request body (CSV with a header row, or NDJSON).
+
+    The format comes from ?format= or the Content-Type; ?dry_run=1 only validates.
+    Large migrations are better run with `flask import-trips`, which has no request timeout.
+    """
+    fmt = request.args.get('format') or ('ndjson' if 'ndjson' in (request.content_type or '') else 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'message': 'format must be csv or ndjson'}), 400
+    
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        result = TripImporter(dry_run=request.args.get('dry_run') in ('1', 'true')).run(read_trip_import(stream, fmt))
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return jsonify({'message': f'Could not read the upload: {e}'}), 400
+    logger.info("Trips imported", extra={'admin_id': current_user.id, 'imported': result['imported'],
+                                         'rejected': result['rejected'], 'dry_run': result['dry_run']})
+    return jsonify(result), 200 if result['dry_run'] else 201
+
+@api.route('/api/admin/drowsiness/score', methods=['POST'])
+@admin_required
+def score_landmarks(current_user):
+    """Re-score a landmark recording with the frontend's drowsiness rules.
+
+    Body: a .npy array, or a .npz with a `landmarks` array, of shape (frames, points, 2 or 3)
+    (see drowsiness.py). Query params: width / height of the source video (default 640x480),
+    fps (adds alert times), and ear_threshold, ear_consec_frames, mar_threshold and
+    yawn_consec_frames to try other settings.
+    """
+    max_bytes = current_app.config['LANDMARK_UPLOAD_MAX_MB'] * 1024 * 1024
+    if request.content_length is None or request.content_length > max_bytes:
+        return jsonify({'message': f"Upload a recording of at most {current_app.config['LANDMARK_UPLOAD_MAX_MB']:g} MB"}), 413
+    
+    import drowsiness
+    try:
+        settings = drowsiness.Settings(**{
+            name: request.args[name] for name in drowsiness.Settings.__slots__ if name in request.args
+        })
+        width = request.args.get('width', drowsiness.FRAME_WIDTH, type=int)
+        height = request.args.get('height', drowsiness.FRAME_HEIGHT, type=int)
+        fps = request.args.get('fps', type=float)
+        landmarks = drowsiness.load_recording(io.BytesIO(request.get_data()))
+        detection = drowsiness.score_frames(landmarks, settings, width, height)
+    except (ValueError, OSError, EOFError) as e:
+        return jsonify({'message': f'Could not score the recording: {e}'}), 400
+    
+    return jsonify(drowsiness.summarize(detection, settings, fps))
+
+@api.route('/api/admin/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics of this worker. Admin token, or `Authorization: Bearer METRICS_TOKEN` for scrapers"""
+    import hmac
+    import instrumentation
+
+    metrics_token = current_app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not (metrics_token and hmac.compare_digest(authorization, f'Bearer {metrics_token}')):
+        current_user, error = authenticate_request()
+        if error:
+            return error
+        if not current_user.is_admin:
+            return jsonify({'message': 'Admin access required!'}), 403
+
+    cache = auth_cache.stats()
+    pool = db.engine.pool
+    series = [
+        ('driveguard_instrumentation_enabled', 'gauge', 'Whether per-request metrics are being recorded',
+         int(current_app.config['INSTRUMENTATION_ENABLED'])),
+        ('driveguard_auth_cache_hits_total', 'counter', 'Token lookups answered from the cache', cache['hits']),
+        ('driveguard_auth_cache_misses_total', 'counter', 'Token lookups that decoded the JWT', cache['misses']),
+        ('driveguard_auth_cache_entries', 'gauge', 'Tokens currently cached', cache['size']),
+        ('driveguard_emergency_tracked_trips', 'gauge', 'Trips with an in-memory alert window',
+         get_emergency_evaluator().active_trips()),
+    ]
+    if hasattr(pool, 'checkedout'):
+        series.append(('driveguard_db_pool_checked_out', 'gauge', 'Pooled connections in use', pool.checkedout()))
+    return current_app.response_class(instrumentation.render_prometheus(series),
+                                      mimetype='text/plain; version=0.0.4')
+
 # --- Main Entry Point ---
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port)
+    create_app().run(host="0.0.0.0", port=port)
 
 
 
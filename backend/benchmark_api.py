@@ -0,0 +1,289 @@
+"""
+API load benchmark.
+
+Seeds a synthetic dataset into a scratch database, then drives the real Flask
+endpoints with concurrent clients and reports, per endpoint, the p50/p95/p99
+latency, throughput and SQL queries per request. Query counts do not depend
+on the dataset size unless an endpoint has an N+1, so --check compares them
+with QUERY_BUDGETS and exits 1 when one is exceeded.
+
+    python benchmark_api.py                                  # temporary SQLite file
+    python benchmark_api.py --users 2000 --clients 16 --requests 500
+    python benchmark_api.py --scenario leaderboard --scenario admin_users
+    python benchmark_api.py --check                          # CI: fail on query regressions
+    python benchmark_api.py --database-url postgresql://.../scratch
+
+Only point --database-url at a scratch database: it must be empty and is filled
+with generated users and trips.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Most queries one request of each scenario may run
+QUERY_BUDGETS = {
+    'trip_save': 40,
+    'alert': 12,
+    'trip_history': 3,
+    'trip_sync': 50,  # One complete trip with five alerts
+    'leaderboard': 8,  # Includes the occasional snapshot rebuild
+    'analytics_summary': 4,
+    'analytics_trends': 4,
+    'rewards_dashboard': 20,
+    'admin_users': 6,
+    'admin_stats': 6,
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Scratch database (default: a temporary SQLite file)')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--trips-per-user', type=int, default=50)
+    parser.add_argument('--contacts-per-user', type=int, default=2)
+    parser.add_argument('--badges', type=int, default=20, help='Badges defined; each user has earned about a third')
+    parser.add_argument('--challenges', type=int, default=30, help='Challenges defined; a quarter are active')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--scenario', action='append', choices=sorted(QUERY_BUDGETS),
+                        help='Run only these scenarios (repeatable)')
+    parser.add_argument('--reward-processing', default='inline', choices=('inline', 'thread', 'queue'),
+                        help='REWARD_PROCESSING for trip saves (inline counts the reward queries too)')
+    parser.add_argument('--check', action='store_true', help='Exit 1 when a scenario exceeds its query budget')
+    parser.add_argument('--json', metavar='PATH', help='Also write the results as JSON')
+    return parser.parse_args()
+
+args = parse_args()
+# Environment must be set before the app is imported
+if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+else:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='driveguard-load-'), 'load.db')
+os.environ['REWARD_PROCESSING'] = args.reward_processing
+os.environ['NOTIFICATION_TRANSPORT'] = 'memory'  # Emergency e-mails are recorded, never sent
+os.environ.setdefault('DB_POOL_SIZE', str(args.clients + 2))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')  # The alert path logs every request at INFO
+
+import jwt
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import (create_app, db, User, Trip, Badge, UserBadge, Challenge, UserChallenge, StoreItem,
+                 EmergencyContact, BADGE_METRICS, seed_default_achievements, rebuild_user_trip_stats,
+                 rebuild_daily_stats)
+
+
+# --- Dataset ---
+# Seeded rules cycle through every criteria_type the reward engine evaluates, so trip
+# saves pay for real badge and challenge evaluation; criteria_value grows per cycle
+BADGE_CRITERIA = sorted(BADGE_METRICS)
+BADGE_CRITERIA_STEP = {'long_safe_trip': 1800, 'streak_days': 3}  # Seconds and days; other rules count trips
+CHALLENGE_CRITERIA = {'zero_alert_trips': 5, 'daily_trip': 1}
+
+def seed(options):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    password = generate_password_hash('benchmark')  # Hashing is slow; every user shares one
+
+    db.session.execute(db.insert(User), [
+        {'email': f'load{i}@example.com', 'password': password, 'points': rng.randint(0, 5000),
+         'is_admin': i == 0, 'created_at': now - timedelta(days=rng.randint(0, 365))}
+        for i in range(options.users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+    db.session.execute(db.insert(Trip), [
+        {'user_id': user_id, 'start_location': 'Home', 'end_location': 'Work',
+         'duration_seconds': rng.randint(300, 7200), 'yawn_count': rng.randint(0, 6),
+         'alert_count': rng.randint(0, 4), 'timestamp': now - timedelta(minutes=rng.randint(0, 180 * 24 * 60))}
+        for user_id in user_ids for _ in range(options.trips_per_user)
+    ])
+    db.session.execute(db.insert(EmergencyContact), [
+        {'user_id': user_id, 'name': f'Contact {n}', 'email': f'contact{n}.{user_id}@example.com',
+         'notification_type': 'email', 'created_at': now}
+        for user_id in user_ids for n in range(options.contacts_per_user)
+    ])
+
+    seed_default_achievements()
+    if options.badges:
+        db.session.execute(db.insert(Badge), [
+            {'name': f'Load badge {i}', 'description': '-', 'icon': '🏅', 'criteria_type': criteria,
+             'criteria_value': (i // len(BADGE_CRITERIA) + 1) * BADGE_CRITERIA_STEP.get(criteria, 5),
+             'points_reward': 25, 'is_active': True, 'created_at': now}
+            for i, criteria in ((i, BADGE_CRITERIA[i % len(BADGE_CRITERIA)]) for i in range(options.badges))
+        ])
+    if options.challenges:
+        db.session.execute(db.insert(Challenge), [
+            {'name': f'Load challenge {i}', 'description': '-', 'challenge_type': 'weekly',
+             'criteria_type': criteria, 'criteria_value': CHALLENGE_CRITERIA[criteria], 'points_reward': 50,
+             'is_active': i % 4 == 0, 'start_date': now - timedelta(days=3), 'end_date': now + timedelta(days=4),
+             'created_at': now}
+            for i, criteria in ((i, list(CHALLENGE_CRITERIA)[i // 4 % len(CHALLENGE_CRITERIA)])
+                                for i in range(options.challenges))
+        ])
+    db.session.execute(db.insert(StoreItem), [
+        {'name': f'Load item {i}', 'description': '-', 'icon': '🎁', 'points_cost': 100 * (i + 1),
+         'category': 'feature', 'stock': -1, 'is_active': True, 'created_at': now}
+        for i in range(5)
+    ])
+
+    badge_ids = [row[0] for row in db.session.query(Badge.id)]
+    challenge_ids = [row[0] for row in db.session.query(Challenge.id).filter(Challenge.is_active == True)]
+    if badge_ids:
+        db.session.execute(db.insert(UserBadge), [
+            {'user_id': user_id, 'badge_id': badge_id, 'earned_at': now}
+            for user_id in user_ids for badge_id in rng.sample(badge_ids, len(badge_ids) // 3)
+        ])
+    if challenge_ids:
+        db.session.execute(db.insert(UserChallenge), [
+            {'user_id': user_id, 'challenge_id': challenge_id, 'progress': rng.randint(0, 4), 'completed': False}
+            for user_id in user_ids for challenge_id in challenge_ids
+        ])
+
+    for user_id in user_ids:
+        rebuild_user_trip_stats(user_id)
+    rebuild_daily_stats()
+    db.session.commit()
+
+    latest_trips = dict(db.session.query(Trip.user_id, db.func.max(Trip.id)).group_by(Trip.user_id))
+    return user_ids, latest_trips
+
+
+# --- Scenarios ---
+# name -> (method, path, body); path and body are built per request from the user and their latest trip
+SCENARIOS = {
+    'trip_save': lambda rng, trip_id: ('POST', '/api/trips', {
+        'start_location': 'Home', 'end_location': 'Work', 'duration_seconds': rng.randint(300, 3600),
+        'yawn_count': rng.randint(0, 3), 'alert_count': rng.randint(0, 2)}),
+    'alert': lambda rng, trip_id: ('POST', '/api/alert', {
+        'trip_id': trip_id, 'alert_type': rng.choice(('yawn', 'drowsy'))}),
+    'trip_history': lambda rng, trip_id: ('GET', '/api/trips?limit=50', None),
+    'trip_sync': lambda rng, trip_id: ('POST', '/api/trips/sync', {'trips': [{
+        'client_id': str(uuid.UUID(int=rng.getrandbits(128))), 'start_location': 'Home', 'end_location': 'Work',
+        'duration_seconds': rng.randint(300, 3600), 'yawn_count': rng.randint(0, 3),
+        'events': [{'alert_type': rng.choice(('yawn', 'drowsy')), 'idempotency_key': str(index)} for index in range(5)]}]}),
+    'leaderboard': lambda rng, trip_id: ('GET', '/api/leaderboard', None),
+    'analytics_summary': lambda rng, trip_id: ('GET', '/api/analytics/summary', None),
+    'analytics_trends': lambda rng, trip_id: ('GET', '/api/analytics/trends?period=weekly', None),
+    'rewards_dashboard': lambda rng, trip_id: ('GET', '/api/gamification/dashboard', None),
+    'admin_users': lambda rng, trip_id: ('GET', '/api/admin/users', None),
+    'admin_stats': lambda rng, trip_id: ('GET', '/api/admin/stats', None),
+}
+ADMIN_SCENARIOS = {'admin_users', 'admin_stats'}
+
+
+class QueryCounter:
+    """Counts SQL statements per thread, so concurrent requests are told apart"""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *_):
+        if getattr(self._local, 'active', False):
+            self._local.count += 1
+
+    @contextlib.contextmanager
+    def measure(self):
+        self._local.active, self._local.count = True, 0
+        try:
+            yield self._local
+        finally:
+            self._local.active = False
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(flask_app, counter, name, tokens, admin_token, latest_trips, options):
+    clients = threading.local()
+    user_ids = list(tokens)
+
+    def one_request(index):
+        rng = random.Random(index)
+        user_id = user_ids[index % len(user_ids)]
+        method, path, body = SCENARIOS[name](rng, latest_trips.get(user_id))
+        token = admin_token if name in ADMIN_SCENARIOS else tokens[user_id]
+        if not hasattr(clients, 'client'):
+            clients.client = flask_app.test_client()
+
+        start = time.perf_counter()
+        with counter.measure() as measured:
+            response = clients.client.open(path, method=method, json=body, headers={'x-access-token': token})
+        return (time.perf_counter() - start) * 1000, measured.count, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.clients) as pool:
+        results = list(pool.map(one_request, range(options.requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(result[0] for result in results)
+    queries = [result[1] for result in results]
+    return {
+        'requests': len(results),
+        'errors': sum(1 for result in results if result[2] >= 400),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'throughput_rps': round(len(results) / wall, 1),
+        'queries_mean': round(statistics.mean(queries), 1),
+        'queries_max': max(queries),
+        'query_budget': QUERY_BUDGETS[name],
+    }
+
+
+if __name__ == '__main__':
+    flask_app = create_app()
+    with flask_app.app_context():
+        db.create_all()
+        if User.query.first() is not None:
+            print("❌ Database is not empty; use a scratch database")
+            sys.exit(1)
+
+        print(f"🔄 Seeding {args.users} users x {args.trips_per_user} trips...")
+        seeded_at = time.perf_counter()
+        user_ids, latest_trips = seed(args)
+        print(f"✅ Seeded in {time.perf_counter() - seeded_at:.1f}s")
+        counter = QueryCounter(db.engine)
+
+    expires = datetime.utcnow() + timedelta(hours=1)
+    tokens = {user_id: jwt.encode({'id': user_id, 'exp': expires}, flask_app.config['SECRET_KEY'], algorithm="HS256")
+              for user_id in user_ids[1:] or user_ids}
+    admin_token = jwt.encode({'id': user_ids[0], 'exp': expires}, flask_app.config['SECRET_KEY'], algorithm="HS256")
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        print(f"🚗 {name}: {args.requests} requests from {args.clients} clients")
+        results[name] = run_scenario(flask_app, counter, name, tokens, admin_token, latest_trips, args)
+
+    print(f"\n{'scenario':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'max':>6}{'budget':>8}{'errors':>8}")
+    over_budget = []
+    for name, result in results.items():
+        flag = ''
+        if result['queries_max'] > result['query_budget']:
+            over_budget.append(name)
+            flag = '  ❌'
+        print(f"{name:<20}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+              f"{result['throughput_rps']:>9.1f}{result['queries_mean']:>9.1f}{result['queries_max']:>6}"
+              f"{result['query_budget']:>8}{result['errors']:>8}{flag}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'dataset': {'users': args.users, 'trips_per_user': args.trips_per_user,
+                                   'clients': args.clients, 'requests': args.requests},
+                       'results': results}, f, indent=2)
+
+    if over_budget:
+        print(f"\n❌ Over query budget: {', '.join(over_budget)}")
+        if args.check:
+            sys.exit(1)
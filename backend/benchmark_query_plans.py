@@ -0,0 +1,178 @@
+"""
+Query plan benchmark for the index migration.
+
+Seeds a scratch database, then runs the hot endpoint queries with the managed
+indexes dropped and again with them created, printing each query plan and the
+average time per query.
+
+    python benchmark_query_plans.py                 # temporary SQLite file
+    python benchmark_query_plans.py --database-url postgresql://.../scratch
+
+Only point --database-url at a scratch database: tables are created, filled and
+the indexes are dropped and recreated.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Scratch database (default: a temporary SQLite file)')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--trips-per-user', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50, help='Executions per query when timing')
+    return parser.parse_args()
+
+args = parse_args()
+# DATABASE_URL must be set before the app is imported
+if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+else:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='driveguard-bench-'), 'bench.db')
+
+from app import (app, db, User, Trip, Achievement, UserAchievement, EmergencyContact, Badge, UserBadge,
+                 Challenge, UserChallenge, StoreItem, Redemption)
+from migration_add_indexes import create_indexes, drop_indexes
+
+
+def seed(users, trips_per_user):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    db.session.execute(db.insert(User), [
+        {'email': f'bench{i}@example.com', 'password': 'x', 'points': rng.randint(0, 5000), 'created_at': now}
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id)]
+    db.session.execute(db.insert(Trip), [
+        {'user_id': user_id, 'start_location': 'A', 'end_location': 'B',
+         'duration_seconds': rng.randint(60, 7200), 'yawn_count': rng.randint(0, 5),
+         'alert_count': rng.randint(0, 5), 'timestamp': now - timedelta(minutes=rng.randint(0, 525600))}
+        for user_id in user_ids for _ in range(trips_per_user)
+    ])
+
+    db.session.execute(db.insert(Achievement), [
+        {'name': f'Achievement {i}', 'description': '-', 'icon': '*', 'criteria_type': 'trip_count', 'criteria_value': i}
+        for i in range(20)
+    ])
+    db.session.execute(db.insert(Badge), [
+        {'name': f'Badge {i}', 'description': '-', 'icon': '*', 'criteria_type': 'trip_count',
+         'criteria_value': i, 'points_reward': 10, 'is_active': True, 'created_at': now}
+        for i in range(20)
+    ])
+    db.session.execute(db.insert(Challenge), [
+        {'name': f'Challenge {i}', 'description': '-', 'challenge_type': 'weekly', 'criteria_type': 'trip_count',
+         'criteria_value': 5, 'points_reward': 50, 'is_active': i % 4 == 0,
+         'start_date': now - timedelta(days=i * 7 + 7), 'end_date': now - timedelta(days=i * 7) + timedelta(days=7),
+         'created_at': now}
+        for i in range(200)
+    ])
+    db.session.execute(db.insert(StoreItem), [
+        {'name': f'Item {i}', 'description': '-', 'icon': '*', 'points_cost': 100, 'category': 'feature',
+         'stock': -1, 'is_active': True, 'created_at': now}
+        for i in range(10)
+    ])
+    achievement_ids = [row[0] for row in db.session.query(Achievement.id)]
+    badge_ids = [row[0] for row in db.session.query(Badge.id)]
+    challenge_ids = [row[0] for row in db.session.query(Challenge.id)]
+    item_ids = [row[0] for row in db.session.query(StoreItem.id)]
+
+    db.session.execute(db.insert(UserAchievement), [
+        {'user_id': user_id, 'achievement_id': achievement_id, 'earned_at': now}
+        for user_id in user_ids for achievement_id in rng.sample(achievement_ids, 8)
+    ])
+    db.session.execute(db.insert(UserBadge), [
+        {'user_id': user_id, 'badge_id': badge_id, 'earned_at': now}
+        for user_id in user_ids for badge_id in rng.sample(badge_ids, 8)
+    ])
+    db.session.execute(db.insert(UserChallenge), [
+        {'user_id': user_id, 'challenge_id': challenge_id, 'progress': 1, 'completed': False}
+        for user_id in user_ids for challenge_id in rng.sample(challenge_ids, 20)
+    ])
+    db.session.execute(db.insert(Redemption), [
+        {'user_id': user_id, 'store_item_id': rng.choice(item_ids), 'points_spent': 100,
+         'redeemed_at': now - timedelta(days=rng.randint(0, 365)), 'status': 'completed'}
+        for user_id in user_ids for _ in range(5)
+    ])
+    db.session.execute(db.insert(EmergencyContact), [
+        {'user_id': user_id, 'name': 'Contact', 'email': 'c@example.com', 'notification_type': 'email', 'created_at': now}
+        for user_id in user_ids for _ in range(2)
+    ])
+    db.session.commit()
+    return user_ids, challenge_ids
+
+
+def hot_queries(user_id, challenge_ids):
+    """The filters used by the trip, analytics, rewards and admin endpoints"""
+    now = datetime.utcnow()
+    return [
+        ('trips of a user by time', db.select(Trip).where(Trip.user_id == user_id).order_by(Trip.timestamp)),
+        ('admin trips in last 24h', db.select(db.func.count(Trip.id)).where(Trip.timestamp >= now - timedelta(days=1))),
+        ('earned achievements', db.select(UserAchievement).where(UserAchievement.user_id == user_id)),
+        ('earned badges', db.select(UserBadge).where(UserBadge.user_id == user_id)),
+        ('challenge progress', db.select(UserChallenge).where(
+            UserChallenge.user_id == user_id, UserChallenge.challenge_id.in_(challenge_ids[:10]))),
+        ('redemption history', db.select(Redemption).where(
+            Redemption.user_id == user_id).order_by(Redemption.redeemed_at.desc())),
+        ('active challenges', db.select(Challenge).where(
+            Challenge.is_active == True, Challenge.start_date <= now, Challenge.end_date >= now)),
+        ('emergency contact count', db.select(db.func.count(EmergencyContact.id)).where(
+            EmergencyContact.user_id == user_id)),
+    ]
+
+
+def explain(statement):
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'sqlite':
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), compiled.params).fetchall()
+    return [row[0] for row in rows]
+
+
+def measure(statement, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.session.execute(statement).all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run_pass(label, queries, repeat):
+    print(f"\n{'=' * 60}\n{label}\n{'=' * 60}")
+    timings = {}
+    for name, statement in queries:
+        timings[name] = measure(statement, repeat)
+        print(f"\n{name}: {timings[name]:.3f} ms")
+        for line in explain(statement):
+            print(f"    {line}")
+    return timings
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        if User.query.first() is not None:
+            print("❌ Database is not empty; use a scratch database")
+            sys.exit(1)
+
+        print(f"🔄 Seeding {args.users} users x {args.trips_per_user} trips...")
+        user_ids, challenge_ids = seed(args.users, args.trips_per_user)
+        queries = hot_queries(user_ids[len(user_ids) // 2], challenge_ids)
+
+        drop_indexes()
+        db.session.execute(db.text('ANALYZE'))
+        before = run_pass('Before: without the index pack', queries, args.repeat)
+
+        create_indexes()
+        db.session.execute(db.text('ANALYZE'))
+        after = run_pass('After: with the index pack', queries, args.repeat)
+
+        print(f"\n{'=' * 60}\n{'query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for name, _ in queries:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f"{name:<28}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x")
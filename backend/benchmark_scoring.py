@@ -0,0 +1,149 @@
+"""
+Drowsiness scoring benchmark.
+
+Generates synthetic landmark sessions (open eyes with blinks, drowsy
+episodes, yawns and frames where no face is found), scores them with the
+vectorized detector in drowsiness.py and reports CPU throughput in frames per
+second. A prefix of every session is also run through the frame-by-frame
+reference port of TripMonitor.js; any frame where the two disagree is reported
+and the script exits 1.
+
+    python benchmark_scoring.py                          # 1M frames
+    python benchmark_scoring.py --frames 5000000 --runs 5
+    python benchmark_scoring.py --mesh                   # full 478-point frames
+    python benchmark_scoring.py --json
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import drowsiness
+
+# Synthetic face geometry (normalized image coordinates)
+EYE_WIDTH = 0.06
+MOUTH_WIDTH = 0.12
+MESH_LANDMARKS = 478
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=1_000_000, help='Frames per session (default 1M)')
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs; the best is reported')
+    parser.add_argument('--reference-frames', type=int, default=20_000,
+                        help='Frames checked against the reference implementation (default 20k)')
+    parser.add_argument('--mesh', action='store_true', help='Generate full face meshes instead of the 20 scored points')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    return parser.parse_args()
+
+
+# --- Synthetic sessions ---
+def _episodes(rng, frames, rate, min_length, max_length):
+    """Boolean mask with episodes starting at `rate` per frame and lasting min..max frames"""
+    starts = np.flatnonzero(rng.random(frames) < rate)
+    lengths = rng.integers(min_length, max_length + 1, size=starts.size)
+    delta = np.zeros(frames + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, np.minimum(starts + lengths, frames), -1)
+    return np.cumsum(delta[:-1]) > 0
+
+def _place_eye(points, offset, x, y, opening):
+    """Six eye points in calculateEAR order: corners 0/3, upper lid 1/2, lower lid 5/4"""
+    half = opening / 2
+    third = EYE_WIDTH / 3
+    for index, (dx, dy) in enumerate(((0, 0), (third, -1), (2 * third, -1), (EYE_WIDTH, 0), (2 * third, 1), (third, 1))):
+        points[:, offset + index, 0] = x + dx
+        points[:, offset + index, 1] = y + dy * half
+
+def synthetic_session(frames, seed=7, width=drowsiness.FRAME_WIDTH, height=drowsiness.FRAME_HEIGHT):
+    """(frames, 20, 2) float32 landmarks in SCORED_LANDMARKS order, with NaN frames for lost faces"""
+    rng = np.random.default_rng(seed)
+    ear = rng.normal(0.3, 0.03, frames)
+    ear[_episodes(rng, frames, 0.01, 2, 8)] = 0.08            # Blinks
+    ear[_episodes(rng, frames, 0.001, 5, 60)] = 0.12          # Drowsy eye closures
+    mar = np.abs(rng.normal(0.3, 0.1, frames))
+    mar[_episodes(rng, frames, 0.002, 3, 45)] = 0.95          # Yawns
+    ear += rng.normal(0, 0.005, frames)  # Jitter around the thresholds
+
+    # EAR = opening * height / (EYE_WIDTH * width) with the pixel scaling of calculateDistance
+    opening = ear * EYE_WIDTH * width / height
+    points = np.empty((frames, len(drowsiness.SCORED_LANDMARKS), 2))
+    drift = rng.normal(0, 0.002, (frames, 1))
+    _place_eye(points, 0, 0.55, 0.4, opening)
+    _place_eye(points, 6, 0.35, 0.4, opening)
+
+    # MAR = 3 * gap / (2 * MOUTH_WIDTH) in pixels: three equal vertical gaps over the mouth width
+    gap = mar * 2 * MOUTH_WIDTH * width / (3 * height)
+    x0, y0 = 0.44, 0.65
+    for index, (dx, dy) in enumerate(((0, 0), (0.25, -1), (0.5, -1), (0.75, -1), (1, 0), (0.75, 1), (0.5, 1), (0.25, 1))):
+        points[:, 12 + index, 0] = x0 + dx * MOUTH_WIDTH
+        points[:, 12 + index, 1] = y0 + dy * gap / 2
+    points += drift[:, :, None]
+
+    points[_episodes(rng, frames, 0.0005, 1, 30)] = np.nan   # Face not found
+    return points.astype(np.float32)
+
+def as_mesh(points, seed=7):
+    """Embed the 20 scored points in full MESH_LANDMARKS-point frames"""
+    mesh = np.random.default_rng(seed).random((points.shape[0], MESH_LANDMARKS, 3), dtype=np.float32)
+    mesh[:, drowsiness.SCORED_LANDMARKS, :2] = points
+    mesh[np.isnan(points).any(axis=(1, 2))] = np.nan
+    return mesh
+
+
+# --- Checks ---
+def compare(vectorized, reference, frames):
+    """Frame indices where the two detections disagree on any decision"""
+    mismatched = np.zeros(frames, dtype=bool)
+    for name in ('face', 'alarm', 'drowsy', 'yawn'):
+        mismatched |= getattr(vectorized, name)[:frames] != getattr(reference, name)
+    return np.flatnonzero(mismatched)
+
+def main():
+    args = parse_args()
+    points = synthetic_session(args.frames, args.seed)
+    landmarks = as_mesh(points, args.seed) if args.mesh else points
+
+    timings = []
+    for _ in range(max(1, args.runs)):
+        started = time.perf_counter()
+        detection = drowsiness.score_frames(landmarks)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+
+    checked = min(args.reference_frames, args.frames)
+    started = time.perf_counter()
+    reference = drowsiness.score_reference(landmarks[:checked])
+    reference_seconds = time.perf_counter() - started
+    mismatches = compare(detection, reference, checked)
+
+    summary = drowsiness.summarize(detection)
+    results = {
+        'frames': args.frames,
+        'landmarks_per_frame': landmarks.shape[1],
+        'best_seconds': round(best, 4),
+        'frames_per_second': round(args.frames / best),
+        'reference_frames_per_second': round(checked / reference_seconds) if reference_seconds else None,
+        'drowsy_alerts': summary['drowsy_alerts'],
+        'yawns': summary['yawns'],
+        'checked_frames': checked,
+        'mismatched_frames': int(mismatches.size),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"🧮 {args.frames:,} frames x {landmarks.shape[1]} landmarks, best of {len(timings)} runs")
+        print(f"   vectorized: {best * 1000:.1f} ms ({results['frames_per_second']:,} frames/s)")
+        print(f"   reference:  {results['reference_frames_per_second']:,} frames/s over {checked:,} frames")
+        print(f"   {summary['drowsy_alerts']} drowsiness alerts, {summary['yawns']} yawns")
+        if mismatches.size:
+            print(f"❌ {mismatches.size} frames differ from the reference, first at frame {mismatches[0]}")
+        else:
+            print(f"✅ Identical decisions on all {checked:,} checked frames")
+    return 1 if mismatches.size else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
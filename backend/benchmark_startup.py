@@ -0,0 +1,100 @@
+"""
+Startup time benchmark.
+
+Starts fresh interpreters and times the phases a gunicorn worker or CLI tool
+goes through: importing app.py, create_app(), and the first request (a login
+that reaches the database). Run it before and after a change to spot
+import-time regressions.
+
+    python benchmark_startup.py                   # 5 runs, median per phase
+    python benchmark_startup.py --runs 10 --importtime 15
+    python benchmark_startup.py --max-import-ms 800   # exit 1 when slower (CI)
+
+Each run uses its own temporary SQLite database, so no real database is touched.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+# Runs in the child interpreter; prints one JSON line of phase timings in ms
+PROBE = r'''
+import json, time
+start = time.perf_counter()
+import app as appmod
+imported = time.perf_counter()
+flask_app = appmod.create_app()
+created = time.perf_counter()
+with flask_app.app_context():
+    appmod.db.create_all()
+client = flask_app.test_client()
+ready = time.perf_counter()
+response = client.post('/api/login', json={'email': 'nobody@example.com', 'password': 'x'})
+first_request = time.perf_counter()
+assert response.status_code == 401, response.status_code
+print(json.dumps({
+    'import': (imported - start) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first_request': (first_request - ready) * 1000,
+}))
+'''
+
+PHASES = ('import', 'create_app', 'first_request')
+
+
+def run_probe(extra_args=()):
+    scratch = tempfile.mkdtemp(prefix='driveguard-startup-')
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(scratch, 'startup.db'))
+    result = subprocess.run([sys.executable, *extra_args, '-c', PROBE], cwd=basedir, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        raise SystemExit("❌ Startup probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, top):
+    """Packages by total self import time from `python -X importtime`"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue  # Column header
+        root = name.strip().split('.')[0]
+        packages[root] = packages.get(root, 0) + int(own)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='Also list the N packages with the most import time')
+    parser.add_argument('--max-import-ms', type=float, help='Fail when the median import time exceeds this')
+    args = parser.parse_args()
+
+    samples = [run_probe()[0] for _ in range(max(1, args.runs))]
+    medians = {phase: statistics.median(sample[phase] for sample in samples) for phase in PHASES}
+
+    print(f"{'phase':<16}{'median ms':>12}{'min ms':>10}{'max ms':>10}   ({len(samples)} runs)")
+    for phase in PHASES:
+        values = [sample[phase] for sample in samples]
+        print(f"{phase:<16}{medians[phase]:>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+    print(f"{'total':<16}{sum(medians.values()):>12.1f}")
+
+    if args.importtime:
+        _, stderr = run_probe(('-X', 'importtime'))
+        print(f"\n{'package':<28}{'import ms':>10}")
+        for name, microseconds in slowest_imports(stderr, args.importtime):
+            print(f"{name:<28}{microseconds / 1000:>10.1f}")
+
+    if args.max_import_ms is not None and medians['import'] > args.max_import_ms:
+        print(f"\n❌ Import took {medians['import']:.1f} ms (limit {args.max_import_ms:.0f} ms)")
+        sys.exit(1)
@@ -0,0 +1,277 @@
+"""
+Drowsiness threshold calibration by replaying recorded landmark sessions.
+
+Replays recorded face-mesh landmark sessions through the detector in
+drowsiness.py for a grid of settings, so thresholds can be tuned without
+rebuilding the frontend and driving around. Each EAR threshold x
+closed-eye frame count, and each MAR threshold x open-mouth frame count, is
+scored over every session. The drowsiness and yawn rules are independent, so
+the two grids are swept separately rather than as one product.
+
+Sessions are .npy files (memory-mapped, so they can be larger than RAM) or
+.npz files with a `landmarks` array, in the format drowsiness.py describes.
+Store the 20 scored points as float32 for the most compact recordings. The
+work runs on a process pool in two stages:
+  1. EAR/MAR features are extracted once per session, in chunks, into
+     scratch .npy files.
+  2. Every worker memory-maps those files and replays its share of the grid.
+
+With --labels, each setting is also compared with hand-labelled events, given
+as a CSV with the columns session (file name without extension), type
+(drowsy or yawn), start_frame and end_frame. An alert matches a label when it
+falls inside the labelled frames, widened by --tolerance frames. Precision is
+the share of alerts that match a label; recall is the share of labels with at
+least one alert.
+
+    python calibrate_thresholds.py recordings/
+    python calibrate_thresholds.py recordings/ --labels labels.csv --fps 30
+    python calibrate_thresholds.py a.npy b.npy --ear-thresholds 0.15:0.25:0.01 --ear-frames 5,10,15,20
+    python calibrate_thresholds.py recordings/ --workers 8 --json results.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+
+import drowsiness
+
+FEATURE_CHUNK_FRAMES = 100_000  # Frames converted to features at a time (bounds memory per worker)
+EVENT_TYPES = ('drowsy', 'yawn')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sessions', nargs='+', help='.npy/.npz recordings, or directories of them')
+    parser.add_argument('--labels', help='CSV of labelled events: session,type,start_frame,end_frame')
+    parser.add_argument('--tolerance', type=int, default=15, help='Frames an alert may fall outside its label (default 15)')
+    parser.add_argument('--ear-thresholds', default='0.14:0.26:0.01', help='List (a,b,c) or range (start:stop:step)')
+    parser.add_argument('--ear-frames', default='5:30:5')
+    parser.add_argument('--mar-thresholds', default='0.55:0.95:0.05')
+    parser.add_argument('--yawn-frames', default='4:20:2')
+    parser.add_argument('--width', type=int, default=drowsiness.FRAME_WIDTH, help='Video width of the recordings')
+    parser.add_argument('--height', type=int, default=drowsiness.FRAME_HEIGHT)
+    parser.add_argument('--fps', type=float, help='Frame rate of the recordings, to report alerts per hour')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes (default: one per core)')
+    parser.add_argument('--top', type=int, default=15, help='Rows shown per grid (default 15)')
+    parser.add_argument('--json', metavar='PATH', help='Write every result to PATH as JSON')
+    return parser.parse_args()
+
+def parse_grid(text, kind):
+    """'0.1,0.2' or an inclusive 'start:stop:step' range"""
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        values = [start + index * step for index in range(count)]
+    else:
+        values = [float(part) for part in text.split(',')]
+    return sorted({int(round(value)) if kind is int else round(value, 6) for value in values})
+
+
+# --- Inputs ---
+def find_sessions(paths):
+    """{session name: path} for the given files and the recordings inside given directories"""
+    sessions = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(('.npy', '.npz')))
+        elif os.path.isfile(path) and path.endswith(('.npy', '.npz')):
+            files = [path]
+        else:
+            raise ValueError(f'{path} is not a .npy/.npz recording or a directory')
+        for file in files:
+            name = os.path.splitext(os.path.basename(file))[0]
+            if name in sessions:
+                raise ValueError(f'two sessions are named {name}: {sessions[name]} and {file}')
+            sessions[name] = file
+    if not sessions:
+        raise ValueError('no .npy or .npz recordings found')
+    return sessions
+
+def load_labels(path, sessions):
+    """{session: {type: (starts, ends)}} with labels sorted by start frame"""
+    intervals = {}
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = {'session', 'type', 'start_frame', 'end_frame'} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f'{path} lacks the columns {", ".join(sorted(missing))}')
+        for line, row in enumerate(reader, start=2):
+            session, kind = row['session'], row['type']
+            if session not in sessions:
+                raise ValueError(f'{path}:{line}: unknown session {session}')
+            if kind not in EVENT_TYPES:
+                raise ValueError(f'{path}:{line}: type must be drowsy or yawn')
+            start, end = int(row['start_frame']), int(row['end_frame'])
+            intervals.setdefault(session, {}).setdefault(kind, []).append((start, max(start, end)))
+
+    labels = {}
+    for session, kinds in intervals.items():
+        for kind, pairs in kinds.items():
+            pairs.sort()
+            labels.setdefault(session, {})[kind] = (np.array([start for start, _ in pairs]),
+                                                     np.array([end for _, end in pairs]))
+    return labels
+
+
+# --- Stage 1: features ---
+def extract_features(job):
+    """Write a session's EAR, MAR and face rows to a (3, frames) float64 .npy. Returns (frames, face frames)"""
+    path, output, width, height = job
+    landmarks = drowsiness.load_recording(path, mmap_mode='r')
+    frames = landmarks.shape[0]
+    features = np.lib.format.open_memmap(output, mode='w+', dtype=np.float64, shape=(3, frames))
+    for start in range(0, frames, FEATURE_CHUNK_FRAMES):
+        chunk = slice(start, start + FEATURE_CHUNK_FRAMES)
+        features[0, chunk], features[1, chunk], features[2, chunk] = drowsiness.compute_features(
+            landmarks[chunk], width, height
+        )
+    face_frames = int(features[2].sum())
+    features.flush()
+    return frames, face_frames
+
+
+# --- Stage 2: replay ---
+_sessions = None
+_labels = None
+_tolerance = 0
+
+def init_worker(feature_paths, labels, tolerance):
+    global _sessions, _labels, _tolerance
+    _sessions = {}
+    for name, path in feature_paths.items():
+        features = np.load(path, mmap_mode='r')
+        _sessions[name] = (features[0], features[1], features[2].astype(bool))
+    _labels = labels
+    _tolerance = tolerance
+
+def match_events(events, starts, ends, tolerance):
+    """(alerts inside a widened label, labels with at least one alert)"""
+    if not starts.size:
+        return 0, 0
+    low, high = starts - tolerance, ends + tolerance
+    # Latest label starting at or before each alert; the running maximum of the ends
+    # also covers an earlier, longer label that overlaps it
+    label = np.searchsorted(low, events, side='right') - 1
+    reach = np.maximum.accumulate(high)
+    matched = int(np.count_nonzero((label >= 0) & (events <= reach[np.maximum(label, 0)])))
+    hits = np.searchsorted(events, high, side='right') - np.searchsorted(events, low, side='left')
+    return matched, int(np.count_nonzero(hits))
+
+def replay(setting):
+    """Totals over every session for one (type, threshold, frames) setting"""
+    kind, threshold, consec_frames = setting
+    result = {'type': kind, 'threshold': threshold, 'frames': consec_frames,
+              'alerts': 0, 'matched_alerts': 0, 'labels': 0, 'recalled_labels': 0}
+    for name, (ear, mar, face) in _sessions.items():
+        if kind == 'drowsy':
+            _, mask = drowsiness.drowsy_alerts(ear, face, threshold, consec_frames)
+        else:
+            mask = drowsiness.yawns(mar, face, threshold, consec_frames)
+        events = np.flatnonzero(mask)
+        result['alerts'] += events.size
+
+        starts, ends = _labels.get(name, {}).get(kind, (np.empty(0, int), np.empty(0, int)))
+        matched, recalled = match_events(events, starts, ends, _tolerance)
+        result['matched_alerts'] += matched
+        result['labels'] += starts.size
+        result['recalled_labels'] += recalled
+    return result
+
+
+# --- Report ---
+def add_scores(result, hours):
+    alerts, labels = result['alerts'], result['labels']
+    result['alerts_per_hour'] = round(alerts / hours, 1) if hours else None
+    if labels:
+        precision = result['matched_alerts'] / alerts if alerts else 0.0
+        recall = result['recalled_labels'] / labels
+        result['precision'] = round(precision, 4)
+        result['recall'] = round(recall, 4)
+        result['f1'] = round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0
+    return result
+
+def is_frontend_setting(result):
+    if result['type'] == 'drowsy':
+        return result['threshold'] == drowsiness.EAR_THRESHOLD and result['frames'] == drowsiness.EAR_CONSEC_FRAMES
+    return result['threshold'] == drowsiness.MAR_THRESHOLD and result['frames'] == drowsiness.YAWN_CONSEC_FRAMES
+
+def print_grid(kind, results, top):
+    rows = [result for result in results if result['type'] == kind]
+    labelled = any(result['labels'] for result in rows)
+    if labelled:
+        rows.sort(key=lambda result: (-result['f1'], -result['recall'], result['alerts']))
+    shown = rows[:top] + [result for result in rows[top:] if is_frontend_setting(result)]
+
+    metric, count = ('EAR <', 'closed frames') if kind == 'drowsy' else ('MAR >', 'open frames')
+    print(f"\n{'😴 Drowsiness' if kind == 'drowsy' else '🥱 Yawns'} ({len(rows)} settings"
+          f"{', best F1 first' if labelled else ''}; * = current frontend setting)")
+    header = f"   {metric:>7} {count:>14} {'alerts':>8} {'per hour':>9}"
+    if labelled:
+        header += f" {'precision':>10} {'recall':>7} {'f1':>6}"
+    print(header)
+    for result in shown:
+        per_hour = '-' if result['alerts_per_hour'] is None else f"{result['alerts_per_hour']:.1f}"
+        line = (f"{'*' if is_frontend_setting(result) else ' ':>2} {result['threshold']:>7.3f} "
+                f"{result['frames']:>14} {result['alerts']:>8} {per_hour:>9}")
+        if labelled:
+            line += f" {result['precision']:>10.3f} {result['recall']:>7.3f} {result['f1']:>6.3f}"
+        print(line)
+
+def main():
+    args = parse_args()
+    try:
+        sessions = find_sessions(args.sessions)
+        labels = load_labels(args.labels, sessions) if args.labels else {}
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    grid = ([('drowsy', threshold, frames) for threshold, frames in product(
+                parse_grid(args.ear_thresholds, float), parse_grid(args.ear_frames, int))]
+            + [('yawn', threshold, frames) for threshold, frames in product(
+                parse_grid(args.mar_thresholds, float), parse_grid(args.yawn_frames, int))])
+    workers = max(1, args.workers or 1)
+
+    with tempfile.TemporaryDirectory(prefix='driveguard-calibration-') as scratch:
+        started = time.perf_counter()
+        feature_paths = {name: os.path.join(scratch, f'{index}.npy') for index, name in enumerate(sessions)}
+        jobs = [(path, feature_paths[name], args.width, args.height) for name, path in sessions.items()]
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                counts = list(pool.map(extract_features, jobs))
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not read a recording: {e}")
+            return 1
+        total_frames = sum(frames for frames, _ in counts)
+        print(f"🎞️  {len(sessions)} sessions, {total_frames:,} frames "
+              f"({sum(face for _, face in counts):,} with a face), features in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(feature_paths, labels, args.tolerance)) as pool:
+            results = list(pool.map(replay, grid, chunksize=max(1, len(grid) // (workers * 4))))
+        elapsed = time.perf_counter() - started
+        print(f"🔁 {len(grid)} settings replayed on {workers} workers in {elapsed:.1f}s "
+              f"({len(grid) * total_frames / elapsed / 1e6:,.0f}M frame-settings/s)")
+
+    hours = total_frames / args.fps / 3600 if args.fps else None
+    results = [add_scores(result, hours) for result in results]
+    for kind in EVENT_TYPES:
+        print_grid(kind, results, args.top)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'sessions': list(sessions), 'frames': total_frames, 'fps': args.fps,
+                       'tolerance': args.tolerance, 'results': results}, f, indent=2)
+        print(f"\n💾 Wrote {len(results)} results to {args.json}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
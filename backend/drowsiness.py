@@ -0,0 +1,259 @@
+"""
+Vectorized drowsiness scoring for recorded MediaPipe face-mesh landmarks.
+
+Server-side port of the detector in frontend/src/components/TripMonitor.js:
+eye aspect ratio (EAR) and mouth aspect ratio (MAR) per frame, then the same
+consecutive-frame rules for the drowsiness alarm and yawns. The whole
+recording is scored with array operations instead of a per-frame loop, and
+`score_reference` keeps the frame-by-frame port the vectorized version is
+checked against (test_drowsiness.py, benchmark_scoring.py).
+
+Recordings are float arrays of shape (frames, landmarks, 2 or 3) holding
+normalized x, y (and the unused z) of either the full mesh (468 or 478
+points) or just the 20 points in SCORED_LANDMARKS. Frames without a face are
+NaN. Requires numpy (requirements.txt); app.py imports this module lazily.
+"""
+import math
+
+import numpy as np
+
+# Keep in sync with TripMonitor.js
+EAR_THRESHOLD = 0.2
+EAR_CONSEC_FRAMES = 15
+MAR_THRESHOLD = 0.75
+YAWN_CONSEC_FRAMES = 10
+# The browser asks getUserMedia for 640x480; distances are measured in pixels
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+
+# Face-mesh indices, in the order the aspect ratio formulas use them
+LEFT_EYE = (362, 385, 387, 263, 373, 380)
+RIGHT_EYE = (33, 160, 158, 133, 153, 144)
+MOUTH = (61, 76, 62, 292, 291, 306, 409, 324)
+SCORED_LANDMARKS = LEFT_EYE + RIGHT_EYE + MOUTH
+MIN_MESH_LANDMARKS = 468
+
+
+class Settings:
+    """Detection thresholds; the defaults are the frontend's"""
+    __slots__ = ('ear_threshold', 'ear_consec_frames', 'mar_threshold', 'yawn_consec_frames')
+
+    def __init__(self, ear_threshold=EAR_THRESHOLD, ear_consec_frames=EAR_CONSEC_FRAMES,
+                 mar_threshold=MAR_THRESHOLD, yawn_consec_frames=YAWN_CONSEC_FRAMES):
+        self.ear_threshold = float(ear_threshold)
+        self.ear_consec_frames = int(ear_consec_frames)
+        self.mar_threshold = float(mar_threshold)
+        self.yawn_consec_frames = int(yawn_consec_frames)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Detection:
+    """Per-frame detector output; boolean arrays are one entry per frame"""
+    __slots__ = ('ear', 'mar', 'face', 'alarm', 'drowsy', 'yawn')
+
+    def __init__(self, ear, mar, face, alarm, drowsy, yawn):
+        self.ear = ear
+        self.mar = mar
+        self.face = face
+        self.alarm = alarm     # Alarm sounding after this frame
+        self.drowsy = drowsy   # A drowsiness alert was raised on this frame
+        self.yawn = yawn       # A yawn was counted on this frame
+
+
+# --- Loading ---
+NPY_MAGIC = b'\x93NUMPY'
+NPZ_MAGIC = b'PK\x03\x04'
+
+def _read_magic(f):
+    magic = f.read(len(NPY_MAGIC))
+    f.seek(-len(magic), 1)
+    if not magic.startswith((NPY_MAGIC, NPZ_MAGIC)):
+        raise ValueError('not a .npy or .npz file')
+    return magic
+
+def load_recording(source, mmap_mode=None):
+    """Landmarks from a .npy file, or the `landmarks` array of a .npz (path or seekable file object).
+
+    `mmap_mode` ('r') memory-maps a .npy path instead of reading it; .npz files are always read.
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        with open(source, 'rb') as f:
+            if _read_magic(f) == NPY_MAGIC and mmap_mode:
+                return np.load(source, mmap_mode=mmap_mode, allow_pickle=False)
+            return load_recording(f)
+    _read_magic(source)
+    data = np.load(source, allow_pickle=False)
+    if isinstance(data, np.lib.npyio.NpzFile):
+        with data:
+            if 'landmarks' not in data:
+                raise ValueError('.npz recordings must contain a "landmarks" array')
+            data = data['landmarks']
+    return data
+
+def select_landmarks(landmarks):
+    """(frames, 20, 2) x/y of SCORED_LANDMARKS as float64; raises ValueError on other shapes"""
+    landmarks = np.asarray(landmarks)
+    if landmarks.ndim != 3 or landmarks.shape[2] not in (2, 3) or not np.issubdtype(landmarks.dtype, np.number):
+        raise ValueError('landmarks must be a numeric array of shape (frames, points, 2 or 3)')
+    if landmarks.shape[1] == len(SCORED_LANDMARKS):
+        points = landmarks[:, :, :2]
+    elif landmarks.shape[1] >= MIN_MESH_LANDMARKS:
+        points = landmarks[:, SCORED_LANDMARKS, :2]
+    else:
+        raise ValueError(f'expected {len(SCORED_LANDMARKS)} or at least {MIN_MESH_LANDMARKS} landmarks per frame')
+    return points.astype(np.float64)
+
+
+# --- Features ---
+def _distance(x, y, i, j):
+    """Pixel distance between landmarks i and j of every frame"""
+    dx = x[i] - x[j]
+    dy = y[i] - y[j]
+    return np.sqrt(dx * dx + dy * dy)
+
+def _ratio(numerator, denominator):
+    """numerator / denominator, 0 where the denominator is 0 (as calculateEAR/MAR do)"""
+    out = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+def _eye_aspect_ratio(x, y, offset):
+    a = _distance(x, y, offset + 1, offset + 5)
+    b = _distance(x, y, offset + 2, offset + 4)
+    c = _distance(x, y, offset + 0, offset + 3)
+    return _ratio(a + b, 2.0 * c)
+
+def compute_features(landmarks, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """EAR, MAR and face-present arrays (one entry per frame)"""
+    points = select_landmarks(landmarks)
+    face = np.isfinite(points).all(axis=(1, 2))
+    # One contiguous row per landmark, in pixels; calculateDistance also scales before subtracting
+    x = np.ascontiguousarray(points[:, :, 0].T) * width
+    y = np.ascontiguousarray(points[:, :, 1].T) * height
+    if not face.all():
+        x[:, ~face] = 0.0
+        y[:, ~face] = 0.0
+
+    ear = (_eye_aspect_ratio(x, y, 0) + _eye_aspect_ratio(x, y, 6)) / 2.0
+    a = _distance(x, y, 13, 19)
+    b = _distance(x, y, 14, 18)
+    c = _distance(x, y, 15, 17)
+    mar = _ratio(a + b + c, 2.0 * _distance(x, y, 12, 16))
+    return ear, mar, face
+
+
+# --- Detection ---
+def _run_lengths(active, reset):
+    """Per frame: `active` frames counted since the last `reset` frame (other frames keep the count)"""
+    counted = np.cumsum(active)
+    return counted - np.maximum.accumulate(np.where(reset, counted, 0))
+
+def drowsy_alerts(ear, face, threshold=EAR_THRESHOLD, consec_frames=EAR_CONSEC_FRAMES):
+    """(alarm, alerts) boolean arrays: alarm sounding after each frame, and frames raising an alert"""
+    closed = face & (ear < threshold)
+    closed_run = _run_lengths(closed, face & ~closed)
+    alarm = closed & (closed_run >= consec_frames)
+    alerts = alarm.copy()
+    alerts[1:] &= ~alarm[:-1]  # Raised when the alarm starts, not while it keeps sounding
+    return alarm, alerts
+
+def yawns(mar, face, threshold=MAR_THRESHOLD, consec_frames=YAWN_CONSEC_FRAMES):
+    """Boolean array of the frames on which a yawn is counted"""
+    open_mouth = face & (mar > threshold)
+    open_run = _run_lengths(open_mouth, face & ~open_mouth)
+    return open_mouth & (open_run == max(consec_frames, 1))  # Once per yawn
+
+def detect(ear, mar, face, settings=None):
+    """Apply the frontend's consecutive-frame rules to whole feature arrays.
+
+    Frames without a face stop the alarm but, as in TripMonitor.js, neither reset
+    the closed-eye and open-mouth counters nor re-arm the yawn detector.
+    """
+    settings = settings or Settings()
+    alarm, drowsy = drowsy_alerts(ear, face, settings.ear_threshold, settings.ear_consec_frames)
+    yawn = yawns(mar, face, settings.mar_threshold, settings.yawn_consec_frames)
+    return Detection(ear, mar, face, alarm, drowsy, yawn)
+
+def score_frames(landmarks, settings=None, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    ear, mar, face = compute_features(landmarks, width, height)
+    return detect(ear, mar, face, settings)
+
+def summarize(detection, settings=None, fps=None):
+    """JSON-ready totals and the frame (and, given fps, the time) of every alert"""
+    settings = settings or Settings()
+    events = [{'frame': int(frame), 'type': 'drowsy'} for frame in np.flatnonzero(detection.drowsy)]
+    events += [{'frame': int(frame), 'type': 'yawn'} for frame in np.flatnonzero(detection.yawn)]
+    events.sort(key=lambda event: event['frame'])
+    if fps:
+        for event in events:
+            event['seconds'] = round(event['frame'] / fps, 3)
+
+    face_frames = int(detection.face.sum())
+    return {
+        'frames': int(detection.face.size),
+        'face_frames': face_frames,
+        'drowsy_alerts': int(detection.drowsy.sum()),
+        'yawns': int(detection.yawn.sum()),
+        'alarm_frames': int(detection.alarm.sum()),
+        'mean_ear': round(float(detection.ear[detection.face].mean()), 4) if face_frames else None,
+        'mean_mar': round(float(detection.mar[detection.face].mean()), 4) if face_frames else None,
+        'settings': settings.as_dict(),
+        'events': events
+    }
+
+
+# --- Reference ---
+def score_reference(landmarks, settings=None, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """Frame-by-frame port of TripMonitor.js onResults, for checking `detect`. Returns a Detection"""
+    settings = settings or Settings()
+    points = select_landmarks(landmarks).tolist()
+    frames = len(points)
+    ear_out, mar_out = np.zeros(frames), np.zeros(frames)
+    face_out, alarm_out, drowsy_out, yawn_out = (np.zeros(frames, dtype=bool) for _ in range(4))
+
+    def distance(p1, p2):
+        dx = p1[0] * width - p2[0] * width
+        dy = p1[1] * height - p2[1] * height
+        return math.sqrt(dx * dx + dy * dy)
+
+    def eye_ratio(eye):
+        a, b, c = distance(eye[1], eye[5]), distance(eye[2], eye[4]), distance(eye[0], eye[3])
+        return 0 if c == 0 else (a + b) / (2.0 * c)
+
+    def mouth_ratio(mouth):
+        a, b, c = distance(mouth[1], mouth[7]), distance(mouth[2], mouth[6]), distance(mouth[3], mouth[5])
+        d = distance(mouth[0], mouth[4])
+        return 0 if d == 0 else (a + b + c) / (2.0 * d)
+
+    ear_counter = yawn_counter = 0
+    is_alarming = is_yawning = False
+    for index, frame in enumerate(points):
+        if any(value != value for point in frame for value in point):  # NaN: no face found
+            is_alarming = False
+            continue
+        ear = (eye_ratio(frame[0:6]) + eye_ratio(frame[6:12])) / 2.0
+        mar = mouth_ratio(frame[12:20])
+        face_out[index], ear_out[index], mar_out[index] = True, ear, mar
+
+        if ear < settings.ear_threshold:
+            ear_counter += 1
+            if ear_counter >= settings.ear_consec_frames:
+                if not is_alarming:
+                    drowsy_out[index] = True
+                is_alarming = True
+        else:
+            is_alarming = False
+            ear_counter = 0
+        if mar > settings.mar_threshold:
+            yawn_counter += 1
+            if yawn_counter >= settings.yawn_consec_frames and not is_yawning:
+                yawn_out[index] = True
+                is_yawning = True
+        else:
+            is_yawning = False
+            yawn_counter = 0
+        alarm_out[index] = is_alarming
+
+    return Detection(ear_out, mar_out, face_out, alarm_out, drowsy_out, yawn_out)
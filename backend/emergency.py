@@ -0,0 +1,117 @@
+"""
+Sliding-window emergency evaluator.
+
+Decides when a trip's alerts are dense enough to notify emergency contacts:
+the weighted sum of alerts inside the last `window_seconds` (measured on the
+alerts' own timestamps) reaching `threshold`. Each active trip keeps a small
+ring buffer in memory with a running score, so an alert costs O(1) amortised.
+
+The buffer is only trusted while it has seen every alert of the trip. Callers
+pass the trip's alert count from before the new alerts; when it does not match
+(first alert in this process, or another worker logged alerts) the window is
+reloaded from the database through the `loader` callback.
+"""
+import threading
+from bisect import insort
+from collections import OrderedDict, deque
+from datetime import timedelta
+
+EPSILON = 1e-9
+
+
+class TripWindow:
+    __slots__ = ('events', 'score', 'seen', 'triggered')
+
+    def __init__(self):
+        self.events = deque()  # (occurred_at, weight), oldest first
+        self.score = 0.0
+        self.seen = 0  # Lifetime alerts of the trip accounted for
+        self.triggered = False
+
+
+class SlidingWindowEvaluator:
+    def __init__(self, window_seconds, threshold, weights=None, default_weight=1.0,
+                 max_events=256, max_trips=10000):
+        """`window_seconds` of 0 keeps the whole trip in the window (lifetime count)"""
+        self.window = timedelta(seconds=window_seconds) if window_seconds > 0 else None
+        self.threshold = threshold
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.max_events = max_events
+        self.max_trips = max_trips
+        self._trips = OrderedDict()  # trip_id -> TripWindow, least recently used first
+        self._lock = threading.Lock()
+
+    def weight(self, alert_type):
+        return self.weights.get(alert_type, self.default_weight)
+
+    def observe(self, trip_id, events, seen_before, loader):
+        """Account for new alerts of a trip. Returns (window_score, fired).
+
+        `events` are (occurred_at, alert_type) pairs already stored by the caller;
+        `seen_before` is the trip's alert count before them. `loader(trip_id, since)`
+        returns the stored (occurred_at, alert_type) pairs at or after `since`
+        (None for the whole trip), including `events`. `fired` is True only for
+        the call that first takes the score to the threshold.
+        """
+        with self._lock:
+            window = self._trips.get(trip_id)
+            if window is not None and window.seen == seen_before:
+                self._trips.move_to_end(trip_id)
+                for occurred_at, alert_type in events:
+                    self._add(window, occurred_at, self.weight(alert_type))
+            else:
+                window = self._reload(trip_id, window, events, loader)
+            window.seen = seen_before + len(events)
+
+            self._expire(window)
+            fired = window.score >= self.threshold - EPSILON and not window.triggered
+            if fired:
+                window.triggered = True
+            return round(window.score, 6), fired
+
+    def forget(self, trip_id):
+        with self._lock:
+            self._trips.pop(trip_id, None)
+
+    def active_trips(self):
+        return len(self._trips)
+
+    def _reload(self, trip_id, window, events, loader):
+        """Rebuild a trip's window from the database (cold start or another worker wrote)"""
+        triggered = window.triggered if window is not None else False
+        window = TripWindow()
+        window.triggered = triggered
+
+        since = None
+        if self.window is not None and events:
+            since = max(occurred_at for occurred_at, _ in events) - self.window
+        for occurred_at, alert_type in sorted(loader(trip_id, since), key=lambda pair: pair[0]):
+            self._add(window, occurred_at, self.weight(alert_type))
+
+        self._trips[trip_id] = window
+        self._trips.move_to_end(trip_id)
+        while len(self._trips) > self.max_trips:
+            self._trips.popitem(last=False)
+        return window
+
+    def _add(self, window, occurred_at, weight):
+        entry = (occurred_at, weight)
+        if not window.events or occurred_at >= window.events[-1][0]:
+            window.events.append(entry)
+        else:
+            # Late (offline) alert: keep the buffer ordered
+            insort(window.events, entry)
+        window.score += weight
+        if len(window.events) > self.max_events:
+            window.score -= window.events.popleft()[1]
+
+    def _expire(self, window):
+        """Drop alerts older than the window, relative to the newest alert"""
+        if self.window is None or not window.events:
+            return
+        cutoff = window.events[-1][0] - self.window
+        while window.events and window.events[0][0] < cutoff:
+            window.score -= window.events.popleft()[1]
+        if not window.events:
+            window.score = 0.0
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts in this directory.
+
+    GUNICORN_WORKER_CLASS   sync (default), gthread or gevent
+    WEB_CONCURRENCY         worker processes (default 2)
+    GUNICORN_THREADS        threads per worker for gthread (default 4)
+    GUNICORN_WORKER_CONNECTIONS  concurrent greenlets per worker for gevent (default 100)
+    GUNICORN_TIMEOUT        seconds before a silent worker is restarted (default 120)
+
+The database pool in app.py sizes itself from the same variables
+(see default_pool_size), so keep them in one place, e.g. the Render dashboard.
+gevent is not in requirements.txt: `pip install gevent psycogreen` to use it.
+"""
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+if worker_class == 'gevent':
+    # Patch before the app (and its locks and sockets) is imported by --preload
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()  # Let psycopg2 yield to other greenlets while waiting on PostgreSQL
+    except ImportError:
+        print("⚠️ psycogreen not installed: PostgreSQL queries will block the gevent worker")
+
+chdir = os.path.dirname(os.path.abspath(__file__))  # So `app:app` resolves from any working directory
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# Import the app once in the master; workers fork from it
+preload_app = True
@@ -0,0 +1,194 @@
+"""
+Per-request SQL and timing instrumentation.
+
+When enabled (INSTRUMENTATION_ENABLED=true), every request records its wall
+time, the number of SQL statements it ran and their total database time. The
+figures are returned in X-Query-Count / X-DB-Time-Ms / Server-Timing response
+headers, aggregated per endpoint for the Prometheus endpoint in app.py, and
+requests slower than SLOW_REQUEST_MS are logged with the statements they ran.
+
+Aggregates live in this process only: each gunicorn worker reports its own
+series, which Prometheus sums across scrape targets. When disabled nothing is
+hooked, so there is no per-request cost.
+"""
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('driveguard.slow_requests')  # Configured by logging_setup.py
+
+# Upper bounds (seconds) of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_RECORDED_STATEMENTS = 100  # Per request, for the slow request log
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'errors', 'wall_seconds', 'db_seconds', 'queries', 'max_queries', 'buckets')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0  # 5xx responses
+        self.wall_seconds = 0.0
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class RequestMetrics:
+    """Per (method, endpoint) aggregates, shared by every request thread of the worker"""
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, endpoint, status, wall_seconds, db_seconds, queries):
+        with self._lock:
+            stats = self._endpoints.get((method, endpoint))
+            if stats is None:
+                stats = self._endpoints[(method, endpoint)] = EndpointStats()
+            stats.requests += 1
+            stats.errors += status >= 500
+            stats.wall_seconds += wall_seconds
+            stats.db_seconds += db_seconds
+            stats.queries += queries
+            stats.max_queries = max(stats.max_queries, queries)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if wall_seconds <= bound:
+                    stats.buckets[index] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (stats.requests, stats.errors, stats.wall_seconds, stats.db_seconds,
+                          stats.queries, stats.max_queries, list(stats.buckets))
+                    for key, stats in self._endpoints.items()}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+metrics = RequestMetrics()
+
+
+# --- Hooks ---
+def init_app(app, engines):
+    """Hook the request lifecycle of `app` and the cursor events of `engines`"""
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _start_request():
+    g.instrumentation = {'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0, 'statements': []}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context: a failed statement never reaches
+    # after_cursor_execute, so nothing may be left behind on the pooled connection
+    context._dg_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._dg_query_start
+    if not has_request_context():
+        return  # Background workers and CLI commands
+    state = g.get('instrumentation')
+    if state is None:
+        return
+    state['queries'] += 1
+    state['db_seconds'] += elapsed
+    if len(state['statements']) < MAX_RECORDED_STATEMENTS:
+        state['statements'].append((elapsed, statement))
+
+
+def _finish_request(response):
+    state = g.pop('instrumentation', None)
+    if state is None:
+        return response
+    wall_seconds = time.perf_counter() - state['start']
+    endpoint = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+    metrics.record(request.method, endpoint, response.status_code, wall_seconds, state['db_seconds'], state['queries'])
+
+    response.headers['X-Query-Count'] = str(state['queries'])
+    response.headers['X-DB-Time-Ms'] = f"{state['db_seconds'] * 1000:.2f}"
+    response.headers['Server-Timing'] = (f"db;dur={state['db_seconds'] * 1000:.2f}, "
+                                         f"total;dur={wall_seconds * 1000:.2f}")
+
+    slow_ms = current_app.config['SLOW_REQUEST_MS']
+    if slow_ms and wall_seconds * 1000 >= slow_ms:
+        log_slow_request(endpoint, response.status_code, wall_seconds, state)
+    return response
+
+
+def log_slow_request(endpoint, status, wall_seconds, state):
+    statements = [{'ms': round(elapsed * 1000, 2), 'sql': ' '.join(statement.split())[:300]}
+                  for elapsed, statement in state['statements']]
+    logger.warning("Slow request", extra={
+        'method': request.method, 'endpoint': endpoint, 'status': status,
+        'duration_ms': round(wall_seconds * 1000, 1), 'queries': state['queries'],
+        'db_ms': round(state['db_seconds'] * 1000, 1), 'statements': statements,
+    })
+
+
+# --- Prometheus exposition ---
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus(extra_series=()):
+    """Text exposition format 0.0.4. `extra_series` adds (name, type, help, value) process-wide series"""
+    snapshot = metrics.snapshot()
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('driveguard_http_requests_total', 'counter', 'Requests served, by endpoint')
+    for (method, endpoint), (requests, *_) in sorted(snapshot.items()):
+        lines.append(f'driveguard_http_requests_total{_labels(method=method, endpoint=endpoint)} {requests}')
+
+    family('driveguard_http_server_errors_total', 'counter', 'Requests answered with a 5xx status')
+    for (method, endpoint), (_, errors, *_) in sorted(snapshot.items()):
+        lines.append(f'driveguard_http_server_errors_total{_labels(method=method, endpoint=endpoint)} {errors}')
+
+    family('driveguard_http_request_duration_seconds', 'histogram', 'Wall time per request')
+    for (method, endpoint), (requests, _, wall, _, _, _, buckets) in sorted(snapshot.items()):
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, buckets):
+            cumulative += count
+            lines.append(f'driveguard_http_request_duration_seconds_bucket'
+                         f'{_labels(method=method, endpoint=endpoint, le=bound)} {cumulative}')
+        lines.append(f'driveguard_http_request_duration_seconds_bucket'
+                     f'{_labels(method=method, endpoint=endpoint, le="+Inf")} {requests}')
+        lines.append(f'driveguard_http_request_duration_seconds_sum{_labels(method=method, endpoint=endpoint)} {wall:.6f}')
+        lines.append(f'driveguard_http_request_duration_seconds_count{_labels(method=method, endpoint=endpoint)} {requests}')
+
+    family('driveguard_db_queries_total', 'counter', 'SQL statements run while serving requests')
+    for (method, endpoint), (_, _, _, _, queries, _, _) in sorted(snapshot.items()):
+        lines.append(f'driveguard_db_queries_total{_labels(method=method, endpoint=endpoint)} {queries}')
+
+    family('driveguard_db_query_seconds_total', 'counter', 'Database time while serving requests')
+    for (method, endpoint), (_, _, _, db_seconds, _, _, _) in sorted(snapshot.items()):
+        lines.append(f'driveguard_db_query_seconds_total{_labels(method=method, endpoint=endpoint)} {db_seconds:.6f}')
+
+    family('driveguard_db_queries_per_request_max', 'gauge', 'Most SQL statements a single request ran')
+    for (method, endpoint), (_, _, _, _, _, max_queries, _) in sorted(snapshot.items()):
+        lines.append(f'driveguard_db_queries_per_request_max{_labels(method=method, endpoint=endpoint)} {max_queries}')
+
+    for name, kind, help_text, value in extra_series:
+        family(name, kind, help_text)
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
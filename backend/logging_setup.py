@@ -0,0 +1,138 @@
+"""
+Structured logging for the API.
+
+Everything under the `driveguard` logger goes through a QueueHandler: the
+request thread only formats the record's context and puts it on an in-memory
+queue, and a QueueListener thread writes it to stdout. Each line is JSON
+(LOG_FORMAT=json, the default) or plain text (LOG_FORMAT=text) and carries the
+request id plus any `extra` fields such as user_id and trip_id.
+
+High-volume records are logged with `extra={'sample': True}`; only
+LOG_SAMPLE_RATE of them are kept (warnings and errors always are).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+LOGGER_NAME = 'driveguard'
+
+# Attributes every LogRecord has; anything else came in through `extra`
+RESERVED_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id', 'sample'}
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in RESERVED_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(extra_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        if not getattr(record, 'request_id', None):
+            record.request_id = '-'
+        line = super().format(record)
+        fields = extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+class ContextFilter(logging.Filter):
+    """Runs on the calling thread: stamps the request id and applies sampling"""
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if getattr(record, 'sample', False) and record.levelno < logging.WARNING:
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                return False
+        record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+def configure_logging(app):
+    """Install the queue handler once per process and add request ids to `app`"""
+    global _handler, _listener
+
+    app.before_request(_assign_request_id)
+    app.after_request(_return_request_id)
+
+    with _lock:
+        if _handler is not None:
+            return
+        formatter = TextFormatter() if app.config['LOG_FORMAT'] == 'text' else JsonFormatter()
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(formatter)
+
+        _handler = QueueHandler(queue.SimpleQueue())
+        _handler.addFilter(ContextFilter(app.config['LOG_SAMPLE_RATE']))
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(app.config['LOG_LEVEL'])
+        logger.addHandler(_handler)
+        logger.propagate = False
+
+
+def _stop_listener():
+    """Flush what is still queued before the process exits"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_after_fork():
+    """The listener thread does not survive fork (gunicorn --preload); start a fresh one"""
+    global _listener
+    if _handler is None:
+        return
+    _handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _assign_request_id():
+    # Honour an id set by the load balancer so lines can be joined across services
+    g.request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16])[:64]
+
+
+def _return_request_id(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    return response
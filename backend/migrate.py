@@ -0,0 +1,242 @@
+"""
+Versioned database migrations.
+
+Every schema change is a numbered step in STEPS. Applied steps are recorded in
+the schema_version table, so booting against a current database costs one
+SELECT and never imports the app. Pending steps run under a lock
+(pg_advisory_lock on PostgreSQL, a lock row elsewhere) so workers that boot
+together apply each step exactly once.
+
+    python migrate.py            # apply pending steps
+    python migrate.py --status   # list steps and whether they are applied
+
+Steps are idempotent, so databases already migrated by the older per-feature
+scripts (run_migration.py, run_emergency_migration.py, run_schema_migration.py,
+the .sql files and migration_add_gamification_enhanced.py) are adopted safely.
+New schema changes are added as a new step at the end of STEPS.
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool
+
+load_dotenv()
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+LOCK_KEY = 720_431_001  # pg_advisory_lock key reserved for migrations
+LOCK_TIMEOUT = timedelta(minutes=5)
+LOCK_STALE_AFTER = timedelta(minutes=10)  # A lock row this old was left by a crashed run
+
+metadata = MetaData()
+schema_version = Table(
+    'schema_version', metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+schema_migration_lock = Table(
+    'schema_migration_lock', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('acquired_at', DateTime, nullable=False),
+)
+
+STEPS = []
+
+def step(version, description):
+    def register(func):
+        STEPS.append((version, description, func))
+        return func
+    return register
+
+def database_url():
+    """Same resolution as app.py, without importing it"""
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        return url.replace("postgres://", "postgresql://", 1)
+    os.makedirs(os.path.join(basedir, 'instance'), exist_ok=True)
+    return 'sqlite:///' + os.path.join(basedir, 'instance', 'driveguard.db')
+
+
+# --- Steps ---
+def create_tables(*models):
+    """Create missing tables and any of their indexes that are missing"""
+    from app import db
+    for model in models:
+        model.__table__.create(db.engine, checkfirst=True)
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def add_missing_columns(table_name, columns):
+    """ALTER TABLE ADD COLUMN for each (name, DDL type) the table lacks"""
+    from app import db
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+    for name, ddl in columns:
+        if name not in existing:
+            db.session.execute(text(f'ALTER TABLE "{table_name}" ADD COLUMN {name} {ddl}'))
+            print(f"✅ Added {name} column to {table_name}")
+    db.session.commit()
+
+@step(1, "Core user and trip tables")
+def create_core_tables():
+    from app import User, Trip
+    create_tables(User, Trip)
+
+@step(2, "User points, admin flag and created_at columns")
+def add_user_columns():
+    from app import db
+    false = '0' if db.engine.dialect.name == 'sqlite' else 'FALSE'
+    add_missing_columns('user', [
+        ('points', 'INTEGER DEFAULT 0'),
+        ('is_admin', f'BOOLEAN DEFAULT {false}'),
+        ('created_at', 'TIMESTAMP'),  # SQLite cannot add a column with a CURRENT_TIMESTAMP default
+    ])
+    db.session.execute(text('UPDATE "user" SET points = 0 WHERE points IS NULL'))
+    db.session.execute(text('UPDATE "user" SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL'))
+    db.session.commit()
+
+@step(3, "Achievements")
+def create_achievements():
+    from app import Achievement, UserAchievement, seed_default_achievements
+    create_tables(Achievement, UserAchievement)
+    seed_default_achievements()
+
+@step(4, "Emergency contacts")
+def create_emergency_contacts():
+    from app import EmergencyContact
+    create_tables(EmergencyContact)
+
+@step(5, "Badges, challenges, store items and streaks")
+def create_gamification():
+    import migration_add_gamification_enhanced as gamification
+    gamification.run_migration()
+    gamification.seed_initial_data()
+
+@step(6, "Trip rollups, leaderboard, reward jobs, notifications and alert events")
+def create_derived():
+    import migration_add_gamification_enhanced as gamification
+    gamification.create_derived_tables()
+
+@step(7, "Index pack and unique award constraints")
+def add_indexes():
+    import migration_add_indexes
+    migration_add_indexes.run_migration()
+
+@step(8, "Backfill trip and daily rollups")
+def backfill_rollups():
+    import migration_add_gamification_enhanced as gamification
+    gamification.backfill_trip_stats()
+
+@step(9, "Client ids for offline trip sync")
+def create_trip_uploads():
+    from app import TripUpload
+    create_tables(TripUpload)
+
+@step(10, "Claim time for emergency e-mail deliveries")
+def add_notification_claimed_at():
+    add_missing_columns('notification_delivery', [('claimed_at', 'TIMESTAMP')])
+
+
+# --- Runner ---
+def applied_versions(connection):
+    if not inspect(connection).has_table('schema_version'):
+        return set()
+    return {row[0] for row in connection.execute(schema_version.select().with_only_columns(schema_version.c.version))}
+
+def pending_steps(engine):
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [entry for entry in STEPS if entry[0] not in applied]
+
+@contextmanager
+def migration_lock(engine):
+    """Hold the cluster-wide migration lock for the duration of the block"""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': LOCK_KEY})
+            try:
+                yield
+            finally:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+        return
+
+    # Other databases: whoever inserts the single lock row holds the lock
+    deadline = datetime.utcnow() + LOCK_TIMEOUT
+    while True:
+        try:
+            with engine.begin() as connection:
+                connection.execute(schema_migration_lock.insert().values(id=1, acquired_at=datetime.utcnow()))
+            break
+        except IntegrityError:
+            with engine.begin() as connection:
+                connection.execute(schema_migration_lock.delete().where(
+                    schema_migration_lock.c.acquired_at < datetime.utcnow() - LOCK_STALE_AFTER
+                ))
+            if datetime.utcnow() > deadline:
+                raise RuntimeError("Timed out waiting for the migration lock")
+            time.sleep(1)
+    try:
+        yield
+    finally:
+        with engine.begin() as connection:
+            connection.execute(schema_migration_lock.delete())
+
+def upgrade():
+    """Apply pending steps in order. Returns the number applied"""
+    engine = create_engine(database_url(), poolclass=NullPool)
+    try:
+        if not pending_steps(engine):
+            print(f"✅ Database schema is current (version {STEPS[-1][0]})")
+            return 0
+
+        metadata.create_all(engine)
+        with migration_lock(engine):
+            # Another worker may have applied them while we waited
+            pending = pending_steps(engine)
+            if not pending:
+                print(f"✅ Database schema is current (version {STEPS[-1][0]})")
+                return 0
+
+            from app import app
+            with app.app_context():
+                for version, description, func in pending:
+                    print(f"📦 Applying migration {version}: {description}")
+                    func()
+                    with engine.begin() as connection:
+                        connection.execute(schema_version.insert().values(
+                            version=version, description=description, applied_at=datetime.utcnow()
+                        ))
+            print(f"✅ Applied {len(pending)} migrations (now at version {STEPS[-1][0]})")
+            return len(pending)
+    finally:
+        engine.dispose()
+
+def status():
+    engine = create_engine(database_url(), poolclass=NullPool)
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    engine.dispose()
+    for version, description, _ in STEPS:
+        print(f"{'✅' if version in applied else '⏳'} {version:>3}  {description}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply DriveGuard database migrations")
+    parser.add_argument('--status', action='store_true', help='List migrations and whether they are applied')
+    options = parser.parse_args()
+
+    if options.status:
+        status()
+    else:
+        try:
+            upgrade()
+        except Exception as e:
+            print(f"❌ Migration failed: {e}")
+            sys.exit(1)
@@ -1,3 +1,4 @@
+-- Applied automatically by backend/migrate.py (step 2); kept for running by hand in a database console
 -- Add is_admin and created_at columns to user table
 ALTER TABLE user ADD COLUMN is_admin BOOLEAN DEFAULT FALSE;
 ALTER TABLE user ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
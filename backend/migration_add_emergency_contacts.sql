@@ -1,3 +1,4 @@
+-- Applied automatically by backend/migrate.py (step 4); kept for running by hand in a database console
 -- Migration: Add Emergency Contact Feature
 -- Run this on your Render PostgreSQL database
 
@@ -1,3 +1,4 @@
+-- Applied automatically by backend/migrate.py (step 2-3); kept for running by hand in a database console
 -- Migration: Add Gamification Features (Rewards & Achievements)
 -- Run this on your Render PostgreSQL database
 
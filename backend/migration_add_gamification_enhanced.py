@@ -5,9 +5,12 @@ Creates tables and seeds initial data for:
 - Challenges (weekly, daily challenges)
 - Store Items (rewards to redeem)
 - User Streaks
+- Per-user trip stats rollup (backfilled from existing trips) and leaderboard snapshot
 """
-from app import app, db
+from app import (app, db, User, UserTripStats, UserDailyStats, DailyStats, LeaderboardEntry, RewardJob,
+                 NotificationDelivery, AlertEvent, rebuild_user_trip_stats, rebuild_daily_stats, refresh_leaderboard)
 from sqlalchemy import text
+import migration_add_indexes
 import sys
 
 def run_migration():
@@ -334,11 +337,58 @@ def seed_initial_data():
             db.session.rollback()
             sys.exit(1)
 
+def create_derived_tables():
+    """Tables owned by the app itself (rollups, snapshots, job queues)"""
+    with app.app_context():
+        try:
+            for model in (UserTripStats, UserDailyStats, DailyStats, LeaderboardEntry, RewardJob,
+                          NotificationDelivery, AlertEvent):
+                model.__table__.create(db.engine, checkfirst=True)
+                # Indexes added after a table was first created
+                for index in model.__table__.indexes:
+                    index.create(db.engine, checkfirst=True)
+            print("✅ Derived tables created")
+            
+        except Exception as e:
+            print(f"❌ Error creating derived tables: {e}")
+            sys.exit(1)
+
+def backfill_trip_stats():
+    with app.app_context():
+        try:
+            print("\n📊 Backfilling per-user trip stats...")
+            
+            missing = db.session.query(User.id).outerjoin(
+                UserTripStats, UserTripStats.user_id == User.id
+            ).filter(UserTripStats.id == None).all()
+            
+            for (user_id,) in missing:
+                rebuild_user_trip_stats(user_id)
+            
+            db.session.commit()
+            print(f"✅ Built trip stats for {len(missing)} users")
+            
+            if DailyStats.query.first() is None:
+                days = rebuild_daily_stats()
+                db.session.commit()
+                print(f"✅ Built daily stats for {days} days")
+            
+            refresh_leaderboard()
+            print("✅ Leaderboard snapshot refreshed")
+            
+        except Exception as e:
+            print(f"❌ Error backfilling trip stats: {e}")
+            db.session.rollback()
+            sys.exit(1)
+
 if __name__ == '__main__':
     print("=" * 60)
     print("Enhanced Gamification Migration")
     print("=" * 60)
     run_migration()
     seed_initial_data()
+    create_derived_tables()
+    migration_add_indexes.run_migration()
+    backfill_trip_stats()
     print("\n✅ Migration complete! Restart your Flask server.")
     print("=" * 60)
@@ -0,0 +1,76 @@
+"""
+Index Migration Script
+Adds the indexes and unique constraints declared on the models to an existing
+database (SQLite or PostgreSQL):
+- Trips by user and time, and by time alone (trends, admin 24h count)
+- Emergency contacts, redemptions and active challenges lookups
+- One UserAchievement / UserBadge / UserChallenge row per user and item
+
+Unique constraints are created as unique indexes, which both dialects can add
+to an existing table. Duplicate award rows left by earlier concurrent trip
+saves are removed first.
+"""
+from app import app, db, Trip, UserAchievement, EmergencyContact, UserBadge, Challenge, UserChallenge, Redemption
+import sys
+
+INDEXED_MODELS = (Trip, UserAchievement, EmergencyContact, UserBadge, Challenge, UserChallenge, Redemption)
+
+# model, unique key columns, ordering that puts the row to keep first
+DEDUPLICATE = (
+    (UserAchievement, ('user_id', 'achievement_id'), (UserAchievement.id,)),
+    (UserBadge, ('user_id', 'badge_id'), (UserBadge.id,)),
+    (UserChallenge, ('user_id', 'challenge_id'),
+     (UserChallenge.completed.desc(), UserChallenge.progress.desc(), UserChallenge.id)),
+)
+
+def index_pack():
+    """Every index this migration manages"""
+    return [index for model in INDEXED_MODELS for index in model.__table__.indexes]
+
+def remove_duplicate_awards():
+    removed = 0
+    for model, key_names, keep_order in DEDUPLICATE:
+        keys = [getattr(model, name) for name in key_names]
+        duplicated = db.session.query(*keys).group_by(*keys).having(db.func.count(model.id) > 1).all()
+        for values in duplicated:
+            rows = model.query.filter(*[key == value for key, value in zip(keys, values)]).order_by(*keep_order).all()
+            for row in rows[1:]:
+                db.session.delete(row)
+                removed += 1
+    db.session.commit()
+    return removed
+
+def create_indexes():
+    for index in index_pack():
+        index.create(db.engine, checkfirst=True)
+
+def drop_indexes():
+    """Used by benchmark_query_plans.py to measure the 'before' plans"""
+    for index in index_pack():
+        index.drop(db.engine, checkfirst=True)
+
+def run_migration():
+    with app.app_context():
+        try:
+            print("🔄 Adding indexes...")
+
+            removed = remove_duplicate_awards()
+            if removed:
+                print(f"🧹 Removed {removed} duplicate award rows")
+
+            create_indexes()
+            print(f"✅ {len(index_pack())} indexes in place")
+
+        except Exception as e:
+            print(f"❌ Error adding indexes: {e}")
+            db.session.rollback()
+            sys.exit(1)
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Index Migration")
+    print("=" * 60)
+    run_migration()
+    print("\n" + "=" * 60)
+    print("✅ Index migration completed successfully!")
+    print("=" * 60)
@@ -0,0 +1,81 @@
+"""
+Email transports for emergency notifications.
+
+SendGrid delivers in production. The console and memory transports stand in
+for it locally and in tests (NOTIFICATION_TRANSPORT=console or memory), so
+the dispatcher in app.py can be exercised without network access.
+"""
+import os
+import threading
+
+
+class DeliveryError(Exception):
+    """Raised by a transport when a message was not accepted"""
+
+
+class SendGridTransport:
+    name = 'sendgrid'
+
+    def __init__(self, api_key, sender_email):
+        # Imported lazily so the app (and CLI tools) start without loading SendGrid
+        from sendgrid import SendGridAPIClient
+
+        self.client = SendGridAPIClient(api_key)
+        self.sender_email = sender_email
+
+    def send(self, to_email, subject, html_content):
+        from sendgrid.helpers.mail import Mail
+
+        message = Mail(
+            from_email=self.sender_email,
+            to_emails=to_email,
+            subject=subject,
+            html_content=html_content
+        )
+        response = self.client.send(message)
+        if response.status_code not in (200, 202):
+            raise DeliveryError(f"SendGrid returned status {response.status_code}")
+
+
+class ConsoleTransport:
+    """Prints messages instead of sending them (local development)"""
+    name = 'console'
+
+    def send(self, to_email, subject, html_content):
+        print(f"📧 [console transport] To: {to_email} | Subject: {subject}")
+
+
+class MemoryTransport:
+    """Records messages in memory; `fail_next` makes the next N sends raise (tests)"""
+    name = 'memory'
+
+    def __init__(self):
+        self.sent = []
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    def send(self, to_email, subject, html_content):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                raise DeliveryError("Simulated delivery failure")
+            self.sent.append({'to': to_email, 'subject': subject, 'html': html_content})
+
+
+def create_transport(name=None):
+    """Build the transport named by NOTIFICATION_TRANSPORT.
+
+    Defaults to SendGrid when SENDGRID_API_KEY is set. Returns None when nothing
+    is configured.
+    """
+    name = name or os.environ.get('NOTIFICATION_TRANSPORT')
+    api_key = os.environ.get('SENDGRID_API_KEY')
+
+    if name == 'console':
+        return ConsoleTransport()
+    if name == 'memory':
+        return MemoryTransport()
+    if name in (None, '', 'sendgrid') and api_key:
+        sender_email = os.environ.get('SENDGRID_SENDER_EMAIL', 'noreply@driveguard.com')
+        return SendGridTransport(api_key, sender_email)
+    return None
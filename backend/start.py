@@ -1,36 +1,21 @@
 """
 Startup script for Render deployment
-Runs migration before starting the Flask app
+Applies pending migrations before starting the Flask app
 """
 import subprocess
-import sys
 import os
 
 def run_migration():
-    """Run the gamification migration script"""
+    """Apply pending database migrations (a single version check when the schema is current)"""
     print("🚀 Starting backend deployment...")
-    print("📦 Running database migration...")
+    print("📦 Checking database migrations...")
     
     try:
-        # Run migration script
-        result = subprocess.run(
-            [sys.executable, 'migration_add_gamification_enhanced.py'],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        print(result.stdout)
-        
-        if result.returncode == 0:
-            print("✅ Migration completed successfully!")
-        else:
-            print(f"⚠️ Migration returned code {result.returncode}")
-            print(result.stderr)
-            print("Continuing to start app...")
-            
-    except subprocess.TimeoutExpired:
-        print("⚠️ Migration timed out, continuing to start app...")
+        from migrate import upgrade
+        upgrade()
+    except SystemExit as e:
+        print(f"⚠️ Migration exited with code {e.code}")
+        print("Continuing to start app...")
     except Exception as e:
         print(f"⚠️ Migration error: {e}")
         print("Continuing to start app...")
@@ -39,14 +24,10 @@ def start_app():
     """Start the Flask application using gunicorn"""
     print("🔥 Starting Flask application...")
     
-    port = os.environ.get('PORT', '10000')
-    
-    # Start gunicorn
+    # Bind address, worker model, timeout and preloading come from gunicorn.conf.py
     subprocess.run([
         'gunicorn',
-        '--bind', f'0.0.0.0:{port}',
-        '--workers', '2',
-        '--timeout', '120',
+        '--config', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'),
         'app:app'
     ])
 
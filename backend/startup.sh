@@ -1,13 +1,13 @@
 #!/bin/bash
 
 # Startup script for Render deployment
-# This runs the migration and then starts the Flask app
+# This applies pending migrations and then starts the Flask app
 
 echo "🚀 Starting backend deployment..."
 
-# Run database migration
-echo "📦 Running database migration..."
-python migration_add_gamification_enhanced.py
+# Apply pending database migrations (near-instant when the schema is current)
+echo "📦 Checking database migrations..."
+python migrate.py
 
 # Check migration exit code
 if [ $? -eq 0 ]; then
@@ -18,4 +18,5 @@ fi
 
 # Start the Flask application
 echo "🔥 Starting Flask application..."
-gunicorn --bind 0.0.0.0:$PORT app:app
+# Bind address, worker model, timeout and preloading come from gunicorn.conf.py
+gunicorn --config gunicorn.conf.py app:app
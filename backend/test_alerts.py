@@ -0,0 +1,91 @@
+"""
+Checks for alert ingestion (POST /api/alert and /api/alerts/batch): retried
+keys are recognized as stored, and events that cannot be stored are rejected.
+
+Drives the real endpoints against a throwaway SQLite database. Run with
+`python test_alerts.py` (or pytest).
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from app import AlertEvent, Trip, create_app, db
+
+
+@contextmanager
+def make_client():
+    with tempfile.TemporaryDirectory() as scratch:
+        flask_app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(scratch, 'test.db'),
+                                'REWARD_PROCESSING': 'inline', 'LOG_LEVEL': 'WARNING'})
+        try:
+            with flask_app.app_context():
+                db.create_all()
+            client = flask_app.test_client()
+            client.post('/api/register', json={'email': 'driver@example.com', 'password': 'secret'})
+            token = client.post('/api/login', json={'email': 'driver@example.com', 'password': 'secret'}).get_json()['token']
+            headers = {'x-access-token': token}
+            trip = {'start_location': 'Home', 'end_location': 'Work', 'duration_seconds': 600, 'alert_count': 0, 'yawn_count': 0}
+            trip_id = client.post('/api/trips', json=trip, headers=headers).get_json()['trip_id']
+            yield flask_app, client, headers, trip_id
+        finally:
+            with flask_app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+def stored_alerts(flask_app, trip_id):
+    with flask_app.app_context():
+        return AlertEvent.query.filter_by(trip_id=trip_id).count(), db.session.get(Trip, trip_id).alert_count
+
+
+def test_single_alert_retry_is_a_duplicate():
+    with make_client() as (flask_app, client, headers, trip_id):
+        alert = {'trip_id': trip_id, 'alert_type': 'drowsy', 'idempotency_key': 'k' * 80}
+        assert client.post('/api/alert', json=alert, headers=headers).get_json()['message'] == 'Alert logged'
+        assert client.post('/api/alert', json=alert, headers=headers).get_json()['message'] == 'Duplicate alert ignored'
+        assert stored_alerts(flask_app, trip_id) == (1, 1)
+
+
+def test_single_alert_rejects_unknown_alert_types():
+    with make_client() as (flask_app, client, headers, trip_id):
+        for alert_type in ('sneeze', 'x' * 300, 5):
+            response = client.post('/api/alert', json={'trip_id': trip_id, 'alert_type': alert_type}, headers=headers)
+            assert response.status_code == 400, alert_type
+        assert stored_alerts(flask_app, trip_id) == (0, 0)
+
+
+def test_batch_retry_with_long_and_numeric_keys():
+    with make_client() as (flask_app, client, headers, trip_id):
+        batch = {'trip_id': str(trip_id), 'events': [{'alert_type': 'yawn', 'idempotency_key': 'k' * 80},
+                                                     {'idempotency_key': 7}]}
+        first = client.post('/api/alerts/batch', json=batch, headers=headers)
+        retry = client.post('/api/alerts/batch', json=batch, headers=headers)
+        assert (first.status_code, first.get_json()['accepted']) == (200, 2)
+        assert (retry.status_code, retry.get_json()['duplicates']) == (200, 2)
+        assert stored_alerts(flask_app, trip_id) == (2, 2)
+
+
+def test_batch_rejects_unknown_alert_types():
+    with make_client() as (flask_app, client, headers, trip_id):
+        for alert_type in ('sneeze', 'x' * 300, 5, ['drowsy']):
+            events = [{'alert_type': 'drowsy', 'idempotency_key': 'a'}, {'alert_type': alert_type}]
+            response = client.post('/api/alerts/batch', json={'trip_id': trip_id, 'events': events}, headers=headers)
+            assert response.status_code == 400, alert_type
+            assert 'alert_type' in response.get_json()['message']
+        # Nothing from a rejected batch is stored
+        assert stored_alerts(flask_app, trip_id) == (0, 0)
+
+
+def test_batch_rejects_bad_trip_ids():
+    with make_client() as (_, client, headers, _trip_id):
+        for trip_id in ('x', [1], {'id': 1}):
+            response = client.post('/api/alerts/batch', json={'trip_id': trip_id, 'events': [{}]}, headers=headers)
+            assert response.status_code == 400, trip_id
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n{len(tests)} checks passed")
@@ -0,0 +1,56 @@
+"""
+Checks for the threshold calibration replay, run in-process (no pool).
+Run with `python test_calibrate_thresholds.py` (or pytest).
+"""
+import os
+import tempfile
+
+import numpy as np
+
+import calibrate_thresholds as calibration
+import drowsiness
+from benchmark_scoring import synthetic_session
+
+
+def test_parse_grid_ranges_and_lists():
+    assert calibration.parse_grid('0.1:0.3:0.1', float) == [0.1, 0.2, 0.3]
+    assert calibration.parse_grid('5:20:5', int) == [5, 10, 15, 20]
+    assert calibration.parse_grid('15,5,15', int) == [5, 15]
+
+
+def test_match_events_with_tolerance_and_overlaps():
+    starts, ends = np.array([10, 12, 100]), np.array([50, 20, 110])
+    events = np.array([5, 30, 60, 75, 105])
+    # With 10 frames of tolerance 5, 30 and 60 fall in the widened first label (30 after
+    # the nested 12-20 one, which 5 and 30 also recall); 75 matches nothing
+    assert calibration.match_events(events, starts, ends, tolerance=10) == (4, 3)
+    assert calibration.match_events(events, starts, ends, tolerance=0) == (2, 2)
+    assert calibration.match_events(np.array([], dtype=int), starts, ends, 0) == (0, 0)
+
+
+def test_replay_counts_match_the_scorer():
+    points = synthetic_session(20000, seed=21)
+    with tempfile.TemporaryDirectory() as scratch:
+        recording, features = os.path.join(scratch, 'trip.npy'), os.path.join(scratch, 'features.npy')
+        np.save(recording, points)
+        frames, _ = calibration.extract_features((recording, features, 640, 480))
+        assert frames == len(points)
+
+        detection = drowsiness.score_frames(points)
+        drowsy_frames = np.flatnonzero(detection.drowsy)
+        labels = {'trip': {'drowsy': (drowsy_frames[:5] - 14, drowsy_frames[:5] + 5)}}
+        calibration.init_worker({'trip': features}, labels, tolerance=0)
+
+        drowsy = calibration.replay(('drowsy', drowsiness.EAR_THRESHOLD, drowsiness.EAR_CONSEC_FRAMES))
+        yawn = calibration.replay(('yawn', drowsiness.MAR_THRESHOLD, drowsiness.YAWN_CONSEC_FRAMES))
+    assert drowsy['alerts'] == drowsy_frames.size and yawn['alerts'] == detection.yawn.sum()
+    assert (drowsy['matched_alerts'], drowsy['labels'], drowsy['recalled_labels']) == (5, 5, 5)
+    assert yawn['labels'] == 0
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n{len(tests)} checks passed")
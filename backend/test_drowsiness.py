@@ -0,0 +1,113 @@
+"""
+Checks for the vectorized drowsiness scorer against the frontend's rules.
+
+Feature arrays are built by hand for the consecutive-frame rules; synthetic
+sessions from benchmark_scoring.py compare it with the frame-by-frame port.
+Run with `python test_drowsiness.py` (or pytest).
+"""
+import io
+
+import numpy as np
+
+import drowsiness
+from benchmark_scoring import as_mesh, synthetic_session
+
+OPEN, CLOSED = 0.3, 0.1
+QUIET, YAWNING = 0.3, 0.9
+
+
+def run(ear, mar=None, face=None):
+    ear = np.asarray(ear, dtype=float)
+    mar = np.full(ear.size, QUIET) if mar is None else np.asarray(mar, dtype=float)
+    face = np.ones(ear.size, dtype=bool) if face is None else np.asarray(face, dtype=bool)
+    return drowsiness.detect(ear, mar, face)
+
+
+def test_alarm_raises_one_alert_per_closure():
+    ear = [OPEN] * 5 + [CLOSED] * 40 + [OPEN] + [CLOSED] * 20
+    detection = run(ear)
+    assert list(np.flatnonzero(detection.drowsy)) == [5 + 14, 46 + 14]
+    assert detection.alarm.sum() == (40 - 14) + (20 - 14)
+
+
+def test_short_closures_do_not_alert():
+    ear = ([CLOSED] * 14 + [OPEN]) * 10
+    assert not run(ear).drowsy.any()
+
+
+def test_lost_face_stops_alarm_but_keeps_counter():
+    # TripMonitor.js only silences the alarm when no face is found, so the next
+    # closed frame starts it again and counts a new alert
+    ear = [CLOSED] * 20 + [0] + [CLOSED] * 3
+    face = [True] * 20 + [False] + [True] * 3
+    detection = run(ear, face=face)
+    assert list(np.flatnonzero(detection.drowsy)) == [14, 21]
+
+
+def test_yawn_counted_once_per_open_mouth():
+    mar = [YAWNING] * 30 + [QUIET] + [YAWNING] * 9 + [QUIET] + [YAWNING] * 10
+    detection = run([OPEN] * len(mar), mar=mar)
+    assert list(np.flatnonzero(detection.yawn)) == [9, 50]
+
+
+def test_lost_face_does_not_rearm_yawn():
+    mar = [YAWNING] * 12 + [0] + [YAWNING] * 12
+    face = [True] * 12 + [False] + [True] * 12
+    detection = run([OPEN] * len(mar), mar=mar, face=face)
+    assert list(np.flatnonzero(detection.yawn)) == [9]
+
+
+def test_matches_reference_frame_for_frame():
+    points = synthetic_session(30000, seed=11)
+    vectorized, reference = drowsiness.score_frames(points), drowsiness.score_reference(points)
+    for name in ('ear', 'mar', 'face', 'alarm', 'drowsy', 'yawn'):
+        assert np.array_equal(getattr(vectorized, name), getattr(reference, name)), name
+    assert vectorized.drowsy.any() and vectorized.yawn.any()
+
+
+def test_matches_reference_with_other_settings():
+    points = synthetic_session(10000, seed=12)
+    settings = drowsiness.Settings(ear_threshold=0.25, ear_consec_frames=5, mar_threshold=0.6, yawn_consec_frames=0)
+    vectorized = drowsiness.score_frames(points, settings, width=1280, height=720)
+    reference = drowsiness.score_reference(points, settings, width=1280, height=720)
+    for name in ('alarm', 'drowsy', 'yawn'):
+        assert np.array_equal(getattr(vectorized, name), getattr(reference, name)), name
+
+
+def test_full_mesh_scores_like_scored_points():
+    points = synthetic_session(2000, seed=13)
+    compact, mesh = drowsiness.score_frames(points), drowsiness.score_frames(as_mesh(points))
+    assert np.array_equal(compact.drowsy, mesh.drowsy)
+    assert np.array_equal(compact.ear, mesh.ear)
+
+
+def test_rejects_other_shapes():
+    for bad in (np.zeros((10, 20)), np.zeros((10, 100, 3)), np.zeros((10, 20, 4)), np.array([[['a', 'b']]])):
+        try:
+            drowsiness.select_landmarks(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f'accepted shape {bad.shape}')
+
+
+def test_loads_npy_and_npz():
+    points = synthetic_session(100, seed=14)
+    for save in (np.save, lambda buffer, array: np.savez_compressed(buffer, landmarks=array)):
+        buffer = io.BytesIO()
+        save(buffer, points)
+        buffer.seek(0)
+        assert np.array_equal(drowsiness.load_recording(buffer), points, equal_nan=True)
+
+
+def test_summary_reports_event_times():
+    summary = drowsiness.summarize(run([OPEN] * 5 + [CLOSED] * 20), fps=10)
+    assert summary['drowsy_alerts'] == 1 and summary['yawns'] == 0
+    assert summary['events'] == [{'frame': 19, 'type': 'drowsy', 'seconds': 1.9}]
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n{len(tests)} checks passed")
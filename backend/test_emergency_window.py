@@ -0,0 +1,115 @@
+"""
+Deterministic checks for the sliding-window emergency evaluator.
+
+Runs without a database: a dict of stored alerts stands in for the AlertEvent
+table. Run with `python test_emergency_window.py` (or pytest).
+"""
+from datetime import datetime, timedelta
+
+from emergency import SlidingWindowEvaluator
+
+START = datetime(2025, 1, 1, 8, 0, 0)
+
+
+class FakeStore:
+    """Stored alerts per trip plus the trip's lifetime alert count"""
+
+    def __init__(self):
+        self.alerts = {}
+        self.loads = 0
+
+    def log(self, evaluator, trip_id, minute, alert_type='drowsy'):
+        stored = self.alerts.setdefault(trip_id, [])
+        seen_before = len(stored)
+        event = (START + timedelta(minutes=minute), alert_type)
+        stored.append(event)
+        return evaluator.observe(trip_id, [event], seen_before, self.load)
+
+    def load(self, trip_id, since):
+        self.loads += 1
+        return [event for event in self.alerts.get(trip_id, []) if since is None or event[0] >= since]
+
+
+def make_evaluator(**overrides):
+    options = dict(window_seconds=10 * 60, threshold=6, weights={'yawn': 0.5, 'drowsy': 1})
+    options.update(overrides)
+    return SlidingWindowEvaluator(**options)
+
+
+def test_fires_once_when_burst_reaches_threshold():
+    evaluator, store = make_evaluator(), FakeStore()
+    results = [store.log(evaluator, 1, minute) for minute in range(8)]
+    assert [fired for _, fired in results] == [False] * 5 + [True, False, False]
+    assert results[5][0] == 6
+
+
+def test_sparse_alerts_never_fire():
+    evaluator, store = make_evaluator(), FakeStore()
+    # One alert every 3 minutes: at most 4 inside any 10 minute window
+    results = [store.log(evaluator, 1, minute) for minute in range(0, 60, 3)]
+    assert not any(fired for _, fired in results)
+    assert max(score for score, _ in results) == 4
+
+
+def test_yawns_weigh_less_than_drowsy_alerts():
+    evaluator, store = make_evaluator(), FakeStore()
+    results = [store.log(evaluator, 1, minute * 0.5, 'yawn') for minute in range(11)]
+    assert not any(fired for _, fired in results)
+    assert store.log(evaluator, 1, 5.5, 'yawn') == (6, True)
+
+
+def test_window_slides_on_alert_timestamps():
+    evaluator, store = make_evaluator(), FakeStore()
+    for minute in range(5):
+        store.log(evaluator, 1, minute)
+    # The first five alerts have left the window twenty minutes later
+    assert store.log(evaluator, 1, 20) == (1, False)
+
+
+def test_reloads_when_another_worker_logged_alerts():
+    evaluator, other_worker, store = make_evaluator(), make_evaluator(), FakeStore()
+    for minute in range(3):
+        store.log(evaluator, 1, minute)
+    for minute in range(3, 5):
+        store.log(other_worker, 1, minute)
+    loads = store.loads
+    assert store.log(evaluator, 1, 5) == (6, True)
+    assert store.loads == loads + 1
+
+
+def test_buffer_hits_skip_the_database():
+    evaluator, store = make_evaluator(), FakeStore()
+    for minute in range(10):
+        store.log(evaluator, 1, minute)
+    assert store.loads == 1  # Only the cold start
+
+
+def test_late_alerts_are_ordered_into_the_window():
+    evaluator, store = make_evaluator(), FakeStore()
+    store.log(evaluator, 1, 30)
+    # Reported late, but more than ten minutes before the newest alert
+    assert store.log(evaluator, 1, 5) == (1, False)
+    assert store.log(evaluator, 1, 25) == (2, False)
+
+
+def test_zero_window_counts_the_whole_trip():
+    evaluator, store = make_evaluator(window_seconds=0, weights={}), FakeStore()
+    results = [store.log(evaluator, 1, minute * 30) for minute in range(6)]
+    assert results[-1] == (6, True)
+
+
+def test_trips_are_independent_and_bounded():
+    evaluator, store = make_evaluator(max_trips=2), FakeStore()
+    for trip_id in (1, 2, 3):
+        store.log(evaluator, trip_id, 0)
+    assert evaluator.active_trips() == 2
+    evaluator.forget(3)
+    assert evaluator.active_trips() == 1
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n{len(tests)} checks passed")
@@ -0,0 +1,155 @@
+"""
+Checks for the emergency e-mail dispatcher: retries with backoff, one e-mail
+per contact per trip, and reclaiming interrupted deliveries.
+
+Uses a throwaway SQLite database and the in-memory transport from
+notifications.py, so nothing is sent. Run with `python test_notifications.py`
+(or pytest).
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import app as driveguard
+from app import EmergencyContact, NotificationDelivery, Trip, User, create_app, db
+from notifications import MemoryTransport
+
+
+class RecordingClock:
+    """Stands in for the time module in app.py so backoff sleeps are recorded, not slept"""
+
+    def __init__(self):
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+@contextmanager
+def make_app(**config):
+    with tempfile.TemporaryDirectory() as scratch:
+        options = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(scratch, 'test.db'),
+                   'NOTIFY_MAX_ATTEMPTS': 3, 'NOTIFY_RETRY_BASE_SECONDS': 2, 'LOG_LEVEL': 'WARNING'}
+        options.update(config)
+        flask_app = create_app(options)
+        transport = MemoryTransport()
+        driveguard._notification_transport = transport
+        try:
+            with flask_app.app_context():
+                db.create_all()
+                user = User(email='driver@example.com', password='x')
+                db.session.add(user)
+                db.session.flush()
+                db.session.add_all([
+                    Trip(user_id=user.id, start_location='Home', end_location='Work', duration_seconds=600),
+                    EmergencyContact(user_id=user.id, name='Sam', email='sam@example.com', notification_type='email'),
+                    EmergencyContact(user_id=user.id, name='Alex', email='alex@example.com', notification_type='both'),
+                ])
+                db.session.commit()
+            yield flask_app, transport
+        finally:
+            driveguard._notification_transport = None
+            with flask_app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+def add_delivery(status='pending', claimed_at=None, contact_id=1):
+    delivery = NotificationDelivery(user_id=1, trip_id=1, contact_id=contact_id, recipient=f'{contact_id}@example.com',
+                                    subject='Alert', body='<p>Alert</p>', status=status, claimed_at=claimed_at)
+    db.session.add(delivery)
+    db.session.commit()
+    return delivery.id
+
+
+def wait_for_deliveries(timeout=5):
+    deadline = time.monotonic() + timeout
+    while NotificationDelivery.query.filter(NotificationDelivery.status.in_(['pending', 'sending'])).count():
+        assert time.monotonic() < deadline, 'deliveries still queued'
+        db.session.commit()  # End the read transaction so the next count sees the senders' writes
+        time.sleep(0.02)
+
+
+def with_clock(func, *args):
+    clock, real_time = RecordingClock(), driveguard.time
+    driveguard.time = clock
+    try:
+        return func(*args), clock.sleeps
+    finally:
+        driveguard.time = real_time
+
+
+def test_retries_with_exponential_backoff():
+    with make_app() as (flask_app, transport):
+        transport.fail_next = 2
+        with flask_app.app_context():
+            delivery_id = add_delivery()
+            status, sleeps = with_clock(driveguard.deliver_notification, delivery_id)
+            delivery = db.session.get(NotificationDelivery, delivery_id)
+            assert (status, delivery.attempts, delivery.last_error) == ('sent', 3, None)
+        assert sleeps == [2, 4]
+        assert [message['to'] for message in transport.sent] == ['1@example.com']
+
+
+def test_gives_up_after_max_attempts():
+    with make_app(NOTIFY_MAX_ATTEMPTS=2) as (flask_app, transport):
+        transport.fail_next = 5
+        with flask_app.app_context():
+            delivery_id = add_delivery()
+            status, sleeps = with_clock(driveguard.deliver_notification, delivery_id)
+            delivery = db.session.get(NotificationDelivery, delivery_id)
+            assert (status, delivery.attempts) == ('failed', 2)
+            assert 'Simulated' in delivery.last_error
+        assert sleeps == [2] and transport.sent == []
+
+
+def test_claimed_delivery_is_not_sent_twice():
+    with make_app() as (flask_app, transport):
+        with flask_app.app_context():
+            delivery_id = add_delivery()
+            assert driveguard.deliver_notification(delivery_id) == 'sent'
+            assert driveguard.deliver_notification(delivery_id) is None
+        assert len(transport.sent) == 1
+
+
+def test_each_contact_is_notified_once_per_trip():
+    with make_app(NOTIFY_RETRY_BASE_SECONDS=0) as (flask_app, transport):
+        with flask_app.app_context():
+            user, trip = db.session.get(User, 1), db.session.get(Trip, 1)
+            assert driveguard.queue_emergency_notification(user, trip, 6) == 2
+            wait_for_deliveries()
+            assert driveguard.queue_emergency_notification(user, trip, 9) == 0
+
+            second_trip = Trip(user_id=user.id, start_location='Work', end_location='Home', duration_seconds=600)
+            db.session.add(second_trip)
+            db.session.commit()
+            assert driveguard.queue_emergency_notification(user, second_trip, 6) == 2
+            wait_for_deliveries()
+            assert NotificationDelivery.query.count() == 4
+        assert sorted(message['to'] for message in transport.sent) == ['alex@example.com'] * 2 + ['sam@example.com'] * 2
+
+
+def test_command_reclaims_only_stale_sends():
+    with make_app() as (flask_app, transport):
+        with flask_app.app_context():
+            now = datetime.utcnow()
+            pending = add_delivery(contact_id=1)
+            live = add_delivery('sending', now - timedelta(seconds=30), contact_id=2)
+            orphaned = add_delivery('sending', now - driveguard.NOTIFICATION_STALE_AFTER - timedelta(minutes=1), contact_id=3)
+
+        result = flask_app.test_cli_runner().invoke(args=['deliver-notifications'])
+        assert 'Sent 2 of 2' in result.output, result.output
+        with flask_app.app_context():
+            statuses = {row.id: row.status for row in NotificationDelivery.query}
+        assert statuses == {pending: 'sent', live: 'sending', orphaned: 'sent'}
+        assert sorted(message['to'] for message in transport.sent) == ['1@example.com', '3@example.com']
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n{len(tests)} checks passed")
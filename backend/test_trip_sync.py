@@ -0,0 +1,131 @@
+"""
+Checks for offline trip sync (POST /api/trips/sync): retries change nothing,
+partial uploads merge, and events are deduplicated by their keys.
+
+Drives the real endpoint against a throwaway SQLite database. Run with
+`python test_trip_sync.py` (or pytest).
+"""
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from app import Trip, User, calculate_trip_points, create_app, db
+
+STARTED = '2025-01-01T08:00:00Z'
+
+
+@contextmanager
+def make_client():
+    with tempfile.TemporaryDirectory() as scratch:
+        flask_app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(scratch, 'test.db'),
+                                'REWARD_PROCESSING': 'inline', 'LOG_LEVEL': 'WARNING'})
+        try:
+            with flask_app.app_context():
+                db.create_all()
+            client = flask_app.test_client()
+            client.post('/api/register', json={'email': 'driver@example.com', 'password': 'secret'})
+            token = client.post('/api/login', json={'email': 'driver@example.com', 'password': 'secret'}).get_json()['token']
+            yield flask_app, client, {'x-access-token': token}
+        finally:
+            with flask_app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+def trip(client_id, events=(), **fields):
+    record = {'client_id': client_id, 'start_location': 'Home', 'end_location': 'Work', 'started_at': STARTED,
+              'duration_seconds': 0, 'yawn_count': 0, 'events': list(events)}
+    record.update(fields)
+    return record
+
+
+def alert(minute, alert_type='drowsy', key=None):
+    event = {'alert_type': alert_type, 'timestamp': f'2025-01-01T08:{minute:02d}:00Z'}
+    if key:
+        event['idempotency_key'] = key
+    return event
+
+
+def sync(client, headers, *trips):
+    response = client.post('/api/trips/sync', json={'trips': list(trips)}, headers=headers)
+    return response.status_code, response.get_json()
+
+
+def test_retry_changes_nothing():
+    with make_client() as (flask_app, client, headers):
+        record = trip(str(uuid.uuid4()), [alert(1, key='a'), alert(2, 'yawn', key='b')], duration_seconds=1800, yawn_count=1)
+        status, first = sync(client, headers, record)
+        assert status == 200
+        assert (first['trips'][0]['created'], first['trips'][0]['accepted_events'], first['trips'][0]['alert_count']) == (True, 2, 2)
+
+        status, retry = sync(client, headers, record)
+        result = retry['trips'][0]
+        assert status == 200 and result['trip_id'] == first['trips'][0]['trip_id']
+        assert (result['created'], result['accepted_events'], result['duplicate_events']) == (False, 0, 2)
+        assert (result['alert_count'], result['points_earned']) == (2, 0)
+        assert retry['total_points'] == first['total_points']
+        with flask_app.app_context():
+            assert Trip.query.count() == 1
+
+
+def test_partial_uploads_merge():
+    with make_client() as (flask_app, client, headers):
+        client_id = str(uuid.uuid4())
+        _, first = sync(client, headers, trip(client_id, [alert(1, key='a')], duration_seconds=600))
+
+        # The finished trip resends the first event with a new one; counters only grow
+        _, second = sync(client, headers, trip(client_id, [alert(1, key='a'), alert(9, key='b')],
+                                               duration_seconds=3600, yawn_count=2, end_location='Office'))
+        result = second['trips'][0]
+        assert (result['accepted_events'], result['duplicate_events'], result['alert_count']) == (1, 1, 2)
+
+        # A stale partial upload arriving late does not shrink the trip
+        _, late = sync(client, headers, trip(client_id, duration_seconds=900, yawn_count=1, end_location='Office'))
+        assert late['trips'][0]['points_earned'] == 0
+
+        points, _ = calculate_trip_points(3600, 2, 2)
+        assert first['trips'][0]['points_earned'] + result['points_earned'] == points
+        with flask_app.app_context():
+            stored = db.session.get(Trip, result['trip_id'])
+            assert (stored.duration_seconds, stored.yawn_count, stored.alert_count, stored.end_location) == (3600, 2, 2, 'Office')
+            assert User.query.one().points == late['total_points'] == points
+
+
+def test_unkeyed_events_are_keyed_by_type_and_time():
+    with make_client() as (_, client, headers):
+        record = trip(str(uuid.uuid4()), [alert(1), alert(2), alert(1, 'yawn')])
+        _, first = sync(client, headers, record)
+        assert (first['trips'][0]['accepted_events'], first['trips'][0]['duplicate_events']) == (3, 0)
+        _, retry = sync(client, headers, record)
+        assert (retry['trips'][0]['accepted_events'], retry['trips'][0]['duplicate_events']) == (0, 3)
+
+
+def test_rejects_events_that_cannot_be_keyed_or_stored():
+    with make_client() as (_, client, headers):
+        keyed = trip(str(uuid.uuid4()), [alert(1, key='a')])
+        for events in ([{'alert_type': 'drowsy'}, {'alert_type': 'drowsy'}],
+                       [{'alert_type': 'drowsy', 'timestamp': 'yesterday'}],
+                       [alert(1, 'x' * 300, key='c')]):
+            status, body = sync(client, headers, keyed, trip(str(uuid.uuid4()), events))
+            assert (status, body['index']) == (400, 1), body
+        # Nothing from a rejected request is stored
+        status, body = sync(client, headers, keyed)
+        assert body['trips'][0]['created']
+
+
+def test_put_uses_client_id_from_url():
+    with make_client() as (_, client, headers):
+        client_id = str(uuid.uuid4())
+        response = client.put(f'/api/trips/sync/{client_id}', json=trip('ignored', [alert(3, key='a')]), headers=headers)
+        assert response.status_code == 200
+        assert response.get_json()['trips'][0]['client_id'] == client_id
+        assert client.put('/api/trips/sync/not-a-uuid', json=trip(None), headers=headers).status_code == 400
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n{len(tests)} checks passed")
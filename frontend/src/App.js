@@ -7,12 +7,25 @@ import './App.css';
 
 // Use environment variable for the API URL, with a fallback for local development
 const API_URL = process.env.REACT_APP_API_URL || 'http://127.0.0.1:5000';
+const TRIP_PAGE_SIZE = 20;
 
 function App() {
     const [token, setToken] = useState(localStorage.getItem('token'));
     const [view, setView] = useState('login');
     const [trips, setTrips] = useState([]);
     const [isLoadingTrips, setIsLoadingTrips] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [isLoadingMoreTrips, setIsLoadingMoreTrips] = useState(false);
+
+    // Trips arrive newest first, one page at a time; older pages are loaded on demand
+    const fetchTripPage = async (cursor) => {
+        const storedToken = localStorage.getItem('token');
+        const res = await axios.get(`${API_URL}/api/trips`, {
+            headers: { 'x-access-token': storedToken },
+            params: { limit: TRIP_PAGE_SIZE, ...(cursor ? { cursor } : {}) }
+        });
+        return res.data;
+    };
 
     const fetchTrips = async () => {
         const storedToken = localStorage.getItem('token');
@@ -20,11 +33,10 @@ function App() {
 
         setIsLoadingTrips(true);
         try {
-            const res = await axios.get(`${API_URL}/api/trips`, {
-                headers: { 'x-access-token': storedToken }
-            });
-            if (res.data && Array.isArray(res.data.trips)) {
-                setTrips(res.data.trips.reverse());
+            const data = await fetchTripPage(null);
+            if (data && Array.isArray(data.trips)) {
+                setTrips(data.trips);
+                setNextCursor(data.next_cursor);
             }
         } catch (error) {
             console.error("Could not fetch trips", error);
@@ -36,6 +48,21 @@ function App() {
         }
     };
 
+    const loadMoreTrips = async () => {
+        if (!nextCursor || isLoadingMoreTrips) return;
+
+        setIsLoadingMoreTrips(true);
+        try {
+            const data = await fetchTripPage(nextCursor);
+            setTrips(previous => [...previous, ...data.trips]);
+            setNextCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Could not fetch more trips", error);
+        } finally {
+            setIsLoadingMoreTrips(false);
+        }
+    };
+
     useEffect(() => {
         if (token) {
             fetchTrips();
@@ -51,11 +78,13 @@ function App() {
         localStorage.removeItem('token');
         setToken(null);
         setTrips([]);
+        setNextCursor(null);
         setView('login');
     };
 
     if (token) {
-        return <Home trips={trips} isLoadingTrips={isLoadingTrips} onLogout={handleLogout} refreshTrips={fetchTrips} />;
+        return <Home trips={trips} isLoadingTrips={isLoadingTrips} onLogout={handleLogout} refreshTrips={fetchTrips}
+                     hasMoreTrips={Boolean(nextCursor)} isLoadingMoreTrips={isLoadingMoreTrips} onLoadMoreTrips={loadMoreTrips} />;
     }
 
     switch (view) {
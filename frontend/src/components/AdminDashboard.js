@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 
 const API_BASE_URL = process.env.REACT_APP_API_BASE_URL;
@@ -9,25 +9,53 @@ const AdminDashboard = ({ onBack }) => {
     const [selectedUser, setSelectedUser] = useState(null);
     const [loading, setLoading] = useState(true);
     const [searchTerm, setSearchTerm] = useState('');
-    const [sortBy, setSortBy] = useState('safety_score'); // safety_score, trips, alerts
+    const [sortBy, setSortBy] = useState('safety_score'); // safety_score, trips, alerts, points, created_at
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const isFirstRender = useRef(true);
 
     useEffect(() => {
         fetchAdminData();
     }, []);
 
+    // Search and sort run on the server; refetch the first page when they change
+    useEffect(() => {
+        if (isFirstRender.current) {
+            isFirstRender.current = false;
+            return;
+        }
+        const timer = setTimeout(() => {
+            fetchUsers().catch((error) => console.error('Error fetching users:', error));
+        }, 300);
+        return () => clearTimeout(timer);
+    }, [searchTerm, sortBy]);
+
+    const fetchUsers = async (cursor = null) => {
+        const token = localStorage.getItem('token');
+        const params = { sort: sortBy, limit: 50 };
+        if (searchTerm) params.email = searchTerm;
+        if (cursor) params.cursor = cursor;
+
+        const response = await axios.get(`${API_BASE_URL}/api/admin/users`, {
+            headers: { 'x-access-token': token },
+            params
+        });
+        setUsers(prev => (cursor ? [...prev, ...response.data.users] : response.data.users));
+        setNextCursor(response.data.next_cursor);
+    };
+
     const fetchAdminData = async () => {
         setLoading(true);
         try {
             const token = localStorage.getItem('token');
             const headers = { 'x-access-token': token };
 
-            const [statsRes, usersRes] = await Promise.all([
+            const [statsRes] = await Promise.all([
                 axios.get(`${API_BASE_URL}/api/admin/stats`, { headers }),
-                axios.get(`${API_BASE_URL}/api/admin/users`, { headers })
+                fetchUsers()
             ]);
 
             setStats(statsRes.data);
-            setUsers(usersRes.data.users);
         } catch (error) {
             console.error('Error fetching admin data:', error);
             if (error.response?.status === 403) {
@@ -39,6 +67,17 @@ const AdminDashboard = ({ onBack }) => {
         }
     };
 
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            await fetchUsers(nextCursor);
+        } catch (error) {
+            console.error('Error fetching more users:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleViewUser = async (userId) => {
         try {
             const token = localStorage.getItem('token');
@@ -99,17 +138,6 @@ const AdminDashboard = ({ onBack }) => {
         return '#e74c3c';
     };
 
-    const filteredUsers = users.filter(user =>
-        user.email.toLowerCase().includes(searchTerm.toLowerCase())
-    );
-
-    const sortedUsers = [...filteredUsers].sort((a, b) => {
-        if (sortBy === 'safety_score') return b.safety_score - a.safety_score;
-        if (sortBy === 'trips') return b.total_trips - a.total_trips;
-        if (sortBy === 'alerts') return b.total_alerts - a.total_alerts;
-        return 0;
-    });
-
     if (loading) {
         return <div style={styles.loading}>Loading admin dashboard...</div>;
     }
@@ -246,11 +274,11 @@ const AdminDashboard = ({ onBack }) => {
             {/* Users List */}
             <div style={styles.usersSection}>
                 <div style={styles.usersHeader}>
-                    <h2>All Users ({users.length})</h2>
+                    <h2>All Users ({stats ? stats.total_users : users.length})</h2>
                     <div style={styles.controls}>
                         <input
                             type="text"
-                            placeholder="Search by email..."
+                            placeholder="Search by email prefix..."
                             value={searchTerm}
                             onChange={(e) => setSearchTerm(e.target.value)}
                             style={styles.searchInput}
@@ -263,12 +291,14 @@ const AdminDashboard = ({ onBack }) => {
                             <option value="safety_score">Sort by Safety Score</option>
                             <option value="trips">Sort by Trips</option>
                             <option value="alerts">Sort by Alerts</option>
+                            <option value="points">Sort by Points</option>
+                            <option value="created_at">Sort by Newest</option>
                         </select>
                     </div>
                 </div>
 
                 <div style={styles.usersGrid}>
-                    {sortedUsers.map(user => (
+                    {users.map(user => (
                         <div key={user.id} style={styles.userCard} onClick={() => handleViewUser(user.id)}>
                             <div style={styles.userCardHeader}>
                                 <h3>{user.email}</h3>
@@ -317,6 +347,14 @@ const AdminDashboard = ({ onBack }) => {
                         </div>
                     ))}
                 </div>
+
+                {nextCursor && (
+                    <div style={styles.loadMoreContainer}>
+                        <button onClick={handleLoadMore} disabled={loadingMore} style={styles.actionButton}>
+                            {loadingMore ? 'Loading...' : 'Load more users'}
+                        </button>
+                    </div>
+                )}
             </div>
         </div>
     );
@@ -431,6 +469,10 @@ const styles = {
         gridTemplateColumns: 'repeat(auto-fill, minmax(350px, 1fr))',
         gap: '20px'
     },
+    loadMoreContainer: {
+        textAlign: 'center',
+        marginTop: '20px'
+    },
     userCard: {
         padding: '20px',
         background: 'rgba(255,255,255,0.05)',
@@ -1,4 +1,4 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useEffect } from 'react';
 import TripMonitor from './TripMonitor';
 import Analytics from './Analytics';
 import Rewards from './Rewards';
@@ -19,7 +19,7 @@ const AlertIcon = () => <svg width="24" height="24" viewBox="0 0 24 24" fill="no
 
 
 // Home now receives isLoadingTrips prop
-const Home = ({ trips, isLoadingTrips, onLogout, refreshTrips }) => {
+const Home = ({ trips, isLoadingTrips, onLogout, refreshTrips, hasMoreTrips, isLoadingMoreTrips, onLoadMoreTrips }) => {
     const [view, setView] = useState('dashboard');
     const [userLocation, setUserLocation] = useState('your location');
 
@@ -34,27 +34,26 @@ const Home = ({ trips, isLoadingTrips, onLogout, refreshTrips }) => {
         });
     }, []);
 
-    const lifetimeStats = useMemo(() => {
-        const totalDuration = trips.reduce((acc, trip) => acc + trip.duration_seconds, 0);
-        const totalAlerts = trips.reduce((acc, trip) => acc + trip.alert_count, 0);
-        const totalYawns = trips.reduce((acc, trip) => acc + trip.yawn_count, 0);
-        const hours = Math.floor(totalDuration / 3600);
-        const minutes = Math.floor((totalDuration % 3600) / 60);
-        return { totalTrips: trips.length, totalHours: hours, totalMinutes: minutes, totalAlerts, totalYawns };
-    }, [trips]);
+    // Lifetime totals come from the server rollup, since only the newest page of trips is loaded
+    const [summary, setSummary] = useState(null);
 
-    const safetyScore = useMemo(() => {
-        if (trips.length === 0) return 100;
-        
-        // Calculate average of individual trip scores (matching backend logic)
-        const tripScores = trips.map(trip => {
-            const penalty = (trip.alert_count * 3) + (trip.yawn_count * 1);
-            return Math.max(0, Math.min(100, Math.round(100 - penalty)));
-        });
-        
-        return Math.round(tripScores.reduce((sum, score) => sum + score, 0) / tripScores.length);
+    useEffect(() => {
+        const token = localStorage.getItem('token');
+        axios.get(`${API_BASE_URL}/api/analytics/summary`, { headers: { 'x-access-token': token } })
+            .then(res => setSummary(res.data))
+            .catch(error => console.error("Could not fetch trip summary", error));
     }, [trips]);
 
+    const totalDuration = summary ? summary.total_duration : 0;
+    const lifetimeStats = {
+        totalTrips: summary ? summary.total_trips : 0,
+        totalHours: Math.floor(totalDuration / 3600),
+        totalMinutes: Math.floor((totalDuration % 3600) / 60),
+        totalAlerts: summary ? summary.total_alerts : 0,
+        totalYawns: summary ? summary.total_yawns : 0
+    };
+    const safetyScore = summary ? summary.overall_safety_score : 100;
+
     const handleTripEnd = () => {
         setView('dashboard');
         refreshTrips();
@@ -161,6 +160,11 @@ const Home = ({ trips, isLoadingTrips, onLogout, refreshTrips }) => {
                             ) : (
                                 <p>Your trip history will appear here.</p>
                             )}
+                            {!isLoadingTrips && hasMoreTrips && (
+                                <button onClick={onLoadMoreTrips} disabled={isLoadingMoreTrips} style={styles.loadMoreButton}>
+                                    {isLoadingMoreTrips ? 'Loading...' : 'Load older trips'}
+                                </button>
+                            )}
                         </div>
                     </div>
                 </div>
@@ -352,6 +356,15 @@ const styles = {
         color: '#bdc3c7',
         fontSize: '0.9rem',
     },
+    loadMoreButton: {
+        width: '100%',
+        background: 'rgba(255, 255, 255, 0.05)',
+        border: '1px solid rgba(255, 255, 255, 0.1)',
+        color: 'inherit',
+        padding: '10px',
+        borderRadius: '10px',
+        cursor: 'pointer'
+    },
     deleteButton: {
         background: 'rgba(255, 82, 82, 0.1)',
         border: '1px solid rgba(255, 82, 82, 0.2)',
@@ -46,25 +46,17 @@ const Rewards = ({ onBack }) => {
             const token = localStorage.getItem('token');
             const headers = { 'x-access-token': token };
 
-            const [achievementsRes, badgesRes, challengesRes, storeRes, streakRes, leaderboardRes, statsRes, redemptionsRes] = await Promise.all([
-                axios.get(`${API_BASE_URL}/api/achievements`, { headers }),
-                axios.get(`${API_BASE_URL}/api/gamification/badges`, { headers }),
-                axios.get(`${API_BASE_URL}/api/gamification/challenges`, { headers }),
-                axios.get(`${API_BASE_URL}/api/gamification/store`, { headers }),
-                axios.get(`${API_BASE_URL}/api/gamification/streak`, { headers }),
-                axios.get(`${API_BASE_URL}/api/leaderboard`, { headers }),
-                axios.get(`${API_BASE_URL}/api/user/stats`, { headers }),
-                axios.get(`${API_BASE_URL}/api/gamification/redemptions`, { headers })
-            ]);
+            // One request for every section of the page
+            const { data } = await axios.get(`${API_BASE_URL}/api/gamification/dashboard`, { headers });
 
-            setAchievements(achievementsRes.data.achievements);
-            setBadges(badgesRes.data.badges);
-            setChallenges(challengesRes.data.challenges);
-            setStoreItems(storeRes.data.items);
-            setStreak(streakRes.data);
-            setLeaderboard(leaderboardRes.data);
-            setUserStats(statsRes.data);
-            setRedemptions(redemptionsRes.data.redemptions);
+            setAchievements(data.achievements.achievements);
+            setBadges(data.badges.badges);
+            setChallenges(data.challenges.challenges);
+            setStoreItems(data.store.items);
+            setStreak(data.streak);
+            setLeaderboard(data.leaderboard);
+            setUserStats(data.stats);
+            setRedemptions(data.redemptions.redemptions);
         } catch (error) {
             console.error('Error fetching rewards data:', error);
         } finally {
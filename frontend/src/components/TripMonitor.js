@@ -1,14 +1,14 @@
 import React, { useRef, useEffect, useState, useCallback } from 'react';
-import axios from 'axios';
 import { FaceMesh } from '@mediapipe/face_mesh';
 import { GoogleMap, useJsApiLoader, Autocomplete, DirectionsRenderer, Marker } from '@react-google-maps/api';
-const API_BASE_URL = process.env.REACT_APP_API_BASE_URL;
+import { newClientId, startTrip, recordAlert, endTrip, flushTrips } from '../tripSync';
 // --- Configuration ---
 const EAR_THRESHOLD = 0.2;
 const EAR_CONSEC_FRAMES = 15;
 const MAR_THRESHOLD = 0.75;
 const YAWN_CONSEC_FRAMES = 10;
 const DEFAULT_MAP_CENTER = { lat: 13.0827, lng: 80.2707 }; // Default to Chennai
+const ALERT_SYNC_DELAY_MS = 2000; // Alerts raised within this delay go up in one request
 
 const TripMonitor = ({ onTripEnd }) => {
     const videoRef = useRef(null);
@@ -35,8 +35,9 @@ const TripMonitor = ({ onTripEnd }) => {
     const [currentPosition, setCurrentPosition] = useState(null);
     const [currentHeading, setCurrentHeading] = useState(0);
     
-    // Emergency Contact Alert System - using ref for immediate access
-    const currentTripIdRef = useRef(null);
+    // Emergency Contact Alert System - using refs for immediate access
+    const currentTripIdRef = useRef(null); // Client-generated id of the trip in the sync outbox
+    const alertSyncTimerRef = useRef(null);
     const [alertTimestamps, setAlertTimestamps] = useState([]);
     const [notificationSent, setNotificationSent] = useState(false);
 
@@ -96,34 +97,27 @@ const TripMonitor = ({ onTripEnd }) => {
     };
     
     // Emergency Contact Alert System Functions
-    const sendAlertToBackend = async (alertType) => {
+    const syncTrips = async () => {
+        const results = await flushTrips();
+        if (results.some(result => result.emergency_notification_sent)) {
+            console.log('🚨 EMERGENCY NOTIFICATION WAS SENT!');
+            setNotificationSent(true);
+        }
+    };
+    
+    const sendAlertToBackend = (alertType) => {
         if (!currentTripIdRef.current) {
-            console.warn('⚠️ No trip ID yet, cannot send alert to backend');
+            console.warn('⚠️ No trip in progress, cannot record alert');
             return;
         }
         
-        console.log(`🔔 Sending alert to backend: trip_id=${currentTripIdRef.current}, type=${alertType}`);
-        
-        try {
-            const token = localStorage.getItem('token');
-            const response = await axios.post(
-                `${API_BASE_URL}/api/alert`,
-                {
-                    trip_id: currentTripIdRef.current,
-                    alert_type: alertType,
-                    timestamp: new Date().toISOString()
-                },
-                { headers: { 'x-access-token': token } }
-            );
-            
-            console.log('✅ Alert sent successfully:', response.data);
-            
-            if (response.data.emergency_notification_sent && !notificationSent) {
-                console.log('🚨 EMERGENCY NOTIFICATION WAS SENT!');
-                setNotificationSent(true);
-            }
-        } catch (error) {
-            console.error('❌ Error sending alert to backend:', error);
+        // Stored locally first, so the alert survives losing signal
+        recordAlert(currentTripIdRef.current, alertType);
+        if (!alertSyncTimerRef.current) {
+            alertSyncTimerRef.current = setTimeout(() => {
+                alertSyncTimerRef.current = null;
+                syncTrips();
+            }, ALERT_SYNC_DELAY_MS);
         }
     };
     
@@ -177,6 +171,12 @@ const TripMonitor = ({ onTripEnd }) => {
             triggerAlarm(false);
         }
     }, []);
+    // Upload trips left in the outbox by an earlier session, and retry whenever the network returns
+    useEffect(() => {
+        syncTrips();
+        window.addEventListener('online', syncTrips);
+        return () => window.removeEventListener('online', syncTrips);
+    }, []);
     useEffect(() => {
         const loadResources = async () => {
             try {
@@ -238,34 +238,11 @@ const TripMonitor = ({ onTripEnd }) => {
         setAlertTimestamps([]);
         setNotificationSent(false);
         
-        // Create trip record immediately to get trip_id
-        try {
-            const token = localStorage.getItem('token');
-            const tripData = { 
-                start_location: startLocationRef.current.value, 
-                end_location: endLocationRef.current.value, 
-                duration_seconds: 0, // Will be updated at trip end
-                yawn_count: 0, 
-                alert_count: 0 
-            };
-            
-            console.log('🚗 Creating trip...', tripData);
-            
-            const response = await axios.post(`${API_BASE_URL}/api/trips`, tripData, { 
-                headers: { 'x-access-token': token } 
-            });
-            
-            console.log('✅ Trip created:', response.data);
-            
-            if (response.data.trip_id) {
-                currentTripIdRef.current = response.data.trip_id;
-                console.log(`📝 Trip ID stored in ref: ${currentTripIdRef.current}`);
-            } else {
-                console.error('❌ No trip_id in response!');
-            }
-        } catch (error) { 
-            console.error("❌ Failed to create trip", error); 
-        }
+        // Record the trip locally and upload it when the network allows
+        currentTripIdRef.current = newClientId();
+        startTrip(currentTripIdRef.current, startLocationRef.current.value, endLocationRef.current.value);
+        console.log(`🚗 Trip started: ${currentTripIdRef.current}`);
+        syncTrips();
     
         // This function handles the device's compass heading (for mobile)
         const handleDeviceOrientation = (event) => {
@@ -311,22 +288,12 @@ const TripMonitor = ({ onTripEnd }) => {
         
         const duration_seconds = Math.round((Date.now() - startTime) / 1000);
         
-        // Update the existing trip with final data
-        // Note: alert_count is already updated in real-time by /api/alert endpoint
+        // Final upload with the trip's duration; alert_count is derived from the uploaded alerts
         if (currentTripIdRef.current) {
-            try {
-                const token = localStorage.getItem('token');
-                const updateData = { 
-                    duration_seconds, 
-                    yawn_count: yawnCount
-                    // alert_count is NOT sent - it's already tracked in real-time
-                };
-                await axios.put(`${API_BASE_URL}/api/trips/${currentTripIdRef.current}`, updateData, { 
-                    headers: { 'x-access-token': token } 
-                });
-            } catch (error) { 
-                console.error("Failed to update trip", error); 
-            }
+            clearTimeout(alertSyncTimerRef.current);
+            alertSyncTimerRef.current = null;
+            endTrip(currentTripIdRef.current, duration_seconds, yawnCount);
+            await syncTrips(); // So the trip list shown next includes this trip when online
         }
         
         // Clear the trip ID ref
@@ -0,0 +1,148 @@
+import axios from 'axios';
+
+// Offline-first trip upload: every trip lives in a localStorage outbox until the
+// backend has acknowledged it, and is sent with POST /api/trips/sync. Uploads are
+// idempotent (keyed by the trip's client_id and each alert's idempotency_key), so
+// a failed or repeated flush is always safe to retry.
+const API_BASE_URL = process.env.REACT_APP_API_BASE_URL;
+const OUTBOX_KEY = 'tripOutbox';
+const REJECTED_KEY = 'tripOutboxRejected'; // Trips the backend refused (400); kept for inspection, never resent
+const MAX_TRIPS_PER_SYNC = 20; // Matches MAX_SYNC_TRIPS on the backend
+
+let flushing = null;
+let flushAgain = false;
+
+const readOutbox = () => {
+    try {
+        return JSON.parse(localStorage.getItem(OUTBOX_KEY)) || {};
+    } catch (error) {
+        return {};
+    }
+};
+
+const writeOutbox = (outbox) => localStorage.setItem(OUTBOX_KEY, JSON.stringify(outbox));
+
+// Move a trip the backend will never accept out of the outbox, so the trips behind it can drain
+const setAside = (clientId, reason) => {
+    const outbox = readOutbox();
+    const trip = outbox[clientId];
+    if (!trip) return;
+    delete outbox[clientId];
+    writeOutbox(outbox);
+
+    let rejected;
+    try {
+        rejected = JSON.parse(localStorage.getItem(REJECTED_KEY)) || {};
+    } catch (error) {
+        rejected = {};
+    }
+    rejected[clientId] = { ...trip, rejectedReason: reason };
+    localStorage.setItem(REJECTED_KEY, JSON.stringify(rejected));
+};
+
+export const newClientId = () => {
+    if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+    return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, (c) => {
+        const r = (Math.random() * 16) | 0;
+        return (c === 'x' ? r : (r & 0x3) | 0x8).toString(16);
+    });
+};
+
+export const startTrip = (clientId, startLocation, endLocation) => {
+    const outbox = readOutbox();
+    outbox[clientId] = {
+        client_id: clientId,
+        start_location: startLocation,
+        end_location: endLocation,
+        started_at: new Date().toISOString(),
+        duration_seconds: 0,
+        yawn_count: 0,
+        events: [],
+        nextEvent: 0,
+        ended: false
+    };
+    writeOutbox(outbox);
+};
+
+export const recordAlert = (clientId, alertType) => {
+    const outbox = readOutbox();
+    const trip = outbox[clientId];
+    if (!trip) return;
+    trip.events.push({
+        alert_type: alertType,
+        timestamp: new Date().toISOString(),
+        idempotency_key: `${clientId}:${trip.nextEvent}`
+    });
+    trip.nextEvent += 1;
+    writeOutbox(outbox);
+};
+
+export const endTrip = (clientId, durationSeconds, yawnCount) => {
+    const outbox = readOutbox();
+    const trip = outbox[clientId];
+    if (!trip) return;
+    trip.duration_seconds = durationSeconds;
+    trip.yawn_count = yawnCount;
+    trip.ended = true;
+    writeOutbox(outbox);
+};
+
+const sendPending = async () => {
+    const token = localStorage.getItem('token');
+    const pending = Object.values(readOutbox()).slice(0, MAX_TRIPS_PER_SYNC);
+    if (!token || pending.length === 0) return [];
+
+    const trips = pending.map(({ nextEvent, ended, ...trip }) => trip);
+    let response;
+    try {
+        response = await axios.post(`${API_BASE_URL}/api/trips/sync`, { trips }, {
+            headers: { 'x-access-token': token }
+        });
+    } catch (error) {
+        // A 400 names the trip it refused; anything else (offline, 5xx) is retried later
+        const body = error.response && error.response.status === 400 ? error.response.data || {} : {};
+        if (!Number.isInteger(body.index) || !trips[body.index]) throw error;
+        console.warn(`🚫 Trip ${trips[body.index].client_id} was rejected and set aside:`, body.message);
+        setAside(trips[body.index].client_id, body.message);
+        flushAgain = true; // Send the rest of the batch
+        return [];
+    }
+
+    // Alerts may have been recorded while the request was in flight: only drop what was sent
+    const outbox = readOutbox();
+    trips.forEach((sent, index) => {
+        const trip = outbox[sent.client_id];
+        if (!trip) return;
+        const sentKeys = new Set(sent.events.map((event) => event.idempotency_key));
+        trip.events = trip.events.filter((event) => !sentKeys.has(event.idempotency_key));
+        // Keep a trip that ended mid-request: its final duration has not been sent yet
+        if (pending[index].ended && trip.events.length === 0) delete outbox[sent.client_id];
+    });
+    writeOutbox(outbox);
+    return response.data.trips;
+};
+
+const flushUntilDone = async () => {
+    let results = [];
+    do {
+        flushAgain = false;
+        try {
+            results = results.concat(await sendPending());
+        } catch (error) {
+            console.warn('📴 Trip sync failed, will retry:', error.message);
+            break;
+        }
+    } while (flushAgain);
+    return results;
+};
+
+// Upload everything in the outbox; resolves to the per-trip results ([] when offline).
+// A call made while a flush is in flight makes that flush send again when it finishes.
+export const flushTrips = () => {
+    if (flushing) {
+        flushAgain = true;
+        return flushing;
+    }
+    flushing = flushUntilDone().finally(() => { flushing = null; });
+    return flushing;
+};